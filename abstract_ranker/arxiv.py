@@ -1,86 +1,351 @@
 from datetime import datetime, timedelta
-from typing import Generator, List
+from typing import Any, Callable, Generator, Iterable, Iterator, List, Optional, Set
+import functools
+import inspect
 import logging
+import queue
+import threading
 import arxiv
-from joblib import Memory
 from pathlib import Path
 
-from abstract_ranker.config import CACHE_DIR
+from abstract_ranker import config
+from abstract_ranker.arxiv_store import (
+    ArxivPaper,
+    paper_from_result,
+    read_shard,
+    shard_path,
+    write_shard,
+)
 from abstract_ranker.data_model import Contribution
+from abstract_ranker.tracing import span
 
-memory_arxiv = Memory(CACHE_DIR / "arxiv", verbose=0)
 
+def _feed_total(feed: Any) -> Optional[int]:
+    "The total number of results in a parsed page (arxiv 4.x, or 2.x and 3.x)"
+    total = getattr(getattr(feed, "header", None), "total_results", None)
+    if total is None:
+        total = getattr(getattr(feed, "feed", None), "opensearch_totalresults", None)
+    return int(total) if total is not None else None
 
-@memory_arxiv.cache
-def load_arxiv_abstract(
-    topic_list: List[str], what_day: datetime
-) -> List[arxiv.Result]:
-    """Loads and returns basic info from the archive for a set
-    of topics.
+
+@functools.lru_cache(maxsize=None)
+def _page_reporting_client(client_class: type) -> Optional[type]:
+    """A subclass of `client_class` (`arxiv.Client`) that reports each search's total
+    number of results as its first page arrives. The arxiv package does not expose
+    that total, so this overrides the client's private `_parse_feed`. It has the
+    signature `_parse_feed(url, first_page=True, ...)` in arxiv 2.x to 4.x. With a
+    release where it differs, there is no subclass, and the totals are estimated
+    from the shards as they finish instead.
 
     Args:
-        topic_list (List[str]): A list of topics to search for
+        client_class (type): The arxiv client class
+
+    Returns:
+        Optional[type]: The subclass, or None if this arxiv's client can't be hooked.
+    """
+    try:
+        parameters = list(
+            inspect.signature(getattr(client_class, "_parse_feed")).parameters
+        )
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if parameters[:3] != ["self", "url", "first_page"]:
+        logging.debug("Unknown arxiv client version - result totals are estimated")
+        return None
+
+    class PageReportingClient(client_class):  # type: ignore
+        def __init__(self, on_first_page: Callable[[int], None], **kwargs):
+            super().__init__(**kwargs)
+            self._on_first_page = on_first_page
+
+        def _parse_feed(self, url: str, first_page: bool = True, *args, **kwargs):
+            # The client waits out the delay between requests in here too.
+            with span("arxiv.fetch_page", url=url):
+                feed = super()._parse_feed(url, first_page, *args, **kwargs)
+            if first_page:
+                total = _feed_total(feed)
+                if total is not None:
+                    self._on_first_page(total)
+            return feed
+
+    return PageReportingClient
+
+
+def _arxiv_client(on_first_page: Callable[[int], None]) -> arxiv.Client:
+    """A client tuned for paging through a whole day, that reports the total number
+    of results of each search (see `_page_reporting_client`) if it can.
+
+    Args:
+        on_first_page (Callable[[int], None]): Called with the total number of
+            results as each search's first page arrives.
 
     Returns:
-        Dict: The JSON info for the arXiv abstract
+        arxiv.Client: The client.
     """
-    assert len(topic_list) > 0, "No topics provided"
+    settings = {
+        "page_size": config.arxiv_page_size,
+        "delay_seconds": config.arxiv_delay_seconds,
+    }
+    client_class = _page_reporting_client(arxiv.Client)
+    if client_class is None:
+        return arxiv.Client(**settings)
+    return client_class(on_first_page, **settings)
+
 
-    # Search for the 10 most recent articles matching the keyword "quantum."
+def _fetch_shard(
+    client: arxiv.Client, category: str, day: datetime
+) -> Generator[arxiv.Result, None, None]:
+    """Fetch every submission to a category on a day, paging through the results.
+
+    Args:
+        client (arxiv.Client): The client (sets page size and delay)
+        category (str): The arxiv category
+        day (datetime): The day
+
+    Yields:
+        arxiv.Result: The submissions, as each page arrives.
+    """
     # Note the capitalization: logic operand words and the specifiers are case-sensitive!!
-    the_date = what_day.strftime("%Y%m%d")
-    the_end_date = (what_day + timedelta(days=1)).strftime("%Y%m%d")
-    query_string = (
-        f'(cat:{" OR cat:".join(topic_list)}) '
-        f"AND submittedDate:[{the_date} TO {the_end_date}]"
-    )
-    logging.info(f"arXiv Query string: {query_string} for day {what_day}")
+    the_date = day.strftime("%Y%m%d")
+    the_end_date = (day + timedelta(days=1)).strftime("%Y%m%d")
+    query_string = f"(cat:{category}) AND submittedDate:[{the_date} TO {the_end_date}]"
+    logging.info(f"arXiv Query string: {query_string} for day {day}")
 
     search = arxiv.Search(
         query=query_string,
-        max_results=400,
+        max_results=None,
         sort_by=arxiv.SortCriterion.SubmittedDate,
     )
+    yield from client.results(search)
 
-    # DO the search
-    client = arxiv.Client()
-    results = client.results(search)
-    all_results = list(results)
-    logging.info(f"Found {len(all_results)} results for topics {topic_list}")
 
-    return all_results
+def _shard_results(
+    client: arxiv.Client, category: str, day: datetime, refresh: bool
+) -> Generator[ArxivPaper, None, int]:
+    """The submissions in a (category, day) shard, from the cache or fetched (and
+    then cached).
+
+    Yields:
+        ArxivPaper: The submissions.
+
+    Returns:
+        int: The number of submissions in the shard.
+    """
+    shard = shard_path(category, day)
+    with span("arxiv.read_shard", category=category, day=f"{day:%Y-%m-%d}"):
+        cached = read_shard(shard) if not refresh else None
+    if cached is not None:
+        yield from cached
+        return len(cached)
+
+    papers = []
+    for result in _fetch_shard(client, category, day):
+        paper = paper_from_result(result)
+        papers.append(paper)
+        yield paper
+    logging.info(f"Found {len(papers)} results for {category} on {day:%Y-%m-%d}")
+
+    # Recent days can still change, so only cache them once they have settled.
+    if datetime.now() - (day + timedelta(days=1)) > config.arxiv_shard_final_after:
+        with span("arxiv.write_shard", category=category, day=f"{day:%Y-%m-%d}"):
+            write_shard(shard, papers)
+    return len(papers)
+
+
+# Marks the end of the results on the queue.
+_END = object()
+
+
+class ArxivStream:
+    """The submissions to a set of categories over a range of days, fetched on a
+    background thread as they are iterated over. Ranking can start as soon as the
+    first page arrives, and the model calls overlap with fetching the rest.
+    """
+
+    def __init__(
+        self,
+        topic_list: List[str],
+        what_day: datetime,
+        last_day: Optional[datetime] = None,
+        refresh: bool = False,
+    ):
+        """Set up the stream - nothing is fetched until it is iterated over.
+
+        Args:
+            topic_list (List[str]): A list of topics to search for
+            what_day (datetime): The (first) day to load
+            last_day (Optional[datetime]): The last day to load (inclusive), if
+                loading a range of days.
+            refresh (bool): Ignore the cache and fetch everything again.
+        """
+        assert len(topic_list) > 0, "No topics provided"
+        if last_day is None:
+            last_day = what_day
+
+        self._shards = []
+        day = what_day
+        while day.date() <= last_day.date():
+            self._shards.extend((category, day) for category in topic_list)
+            day += timedelta(days=1)
+        self._refresh = refresh
+
+        # Size of each shard, once known (from its first page, or the cache).
+        self._shard_sizes: List[Optional[int]] = [None] * len(self._shards)
+        self._delivered = 0
+        self._finished = False
+
+    @property
+    def estimated_total(self) -> Optional[int]:
+        """How many submissions there will be. Exact once everything has been
+        fetched; until then shards not yet started are assumed to be the average size
+        of those that have (and cross-listed papers are counted more than once).
+
+        Returns:
+            Optional[int]: The estimate, or None if nothing is known yet.
+        """
+        if self._finished:
+            return self._delivered
+        known = [s for s in self._shard_sizes if s is not None]
+        if len(known) == 0:
+            return None
+        unknown = len(self._shard_sizes) - len(known)
+        estimate = sum(known) + round(sum(known) / len(known) * unknown)
+        return max(estimate, self._delivered)
+
+    def _produce(self, results: queue.Queue, stop: threading.Event):
+        "Fetch all the shards, putting each submission on the queue"
+
+        def put(item: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        # One client for everything, so it keeps the delay between all requests.
+        current = 0
+
+        def set_size(total: int):
+            self._shard_sizes[current] = total
+
+        client = _arxiv_client(set_size)
+
+        try:
+            for index, (category, day) in enumerate(self._shards):
+                current = index
+                shard = _shard_results(client, category, day, self._refresh)
+                while True:
+                    try:
+                        result = next(shard)
+                    except StopIteration as e:
+                        self._shard_sizes[index] = e.value
+                        break
+                    if not put(result):
+                        return
+            put(_END)
+        except Exception as e:
+            put(e)
+
+    def __iter__(self) -> Iterator[ArxivPaper]:
+        """The submissions, each only once (even if cross-listed), as they arrive.
+
+        Yields:
+            ArxivPaper: The next submission.
+        """
+        results: queue.Queue = queue.Queue(maxsize=config.arxiv_page_size)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce, args=(results, stop), daemon=True
+        )
+        producer.start()
+
+        seen: Set[str] = set()
+        try:
+            while True:
+                item = results.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if item.id in seen:
+                    continue
+                seen.add(item.id)
+                self._delivered += 1
+                yield item
+            self._finished = True
+        finally:
+            stop.set()
+
+
+def load_arxiv_abstract(
+    topic_list: List[str],
+    what_day: datetime,
+    last_day: Optional[datetime] = None,
+    refresh: bool = False,
+) -> List[ArxivPaper]:
+    """Loads and returns basic info from the archive for a set
+    of topics, for one day or a range of days.
+
+    Each (category, day) is fetched and cached separately, so overlapping category
+    lists and date ranges re-use what has already been fetched. Use `ArxivStream`
+    to start on the results before they have all arrived.
+
+    Args:
+        topic_list (List[str]): A list of topics to search for
+        what_day (datetime): The (first) day to load
+        last_day (Optional[datetime]): The last day to load (inclusive), if
+            loading a range of days.
+        refresh (bool): Ignore the cache and fetch everything again.
+
+    Returns:
+        List[ArxivPaper]: The submissions, each only once (even if cross-listed),
+            in submission order.
+    """
+    all_results = list(ArxivStream(topic_list, what_day, last_day, refresh))
+    logging.info(f"Found {len(all_results)} results for topics {topic_list}")
+    return sorted(all_results, key=lambda r: r.published)
 
 
 def arxiv_contributions(
-    event_data: List[arxiv.Result],
+    event_data: Iterable[ArxivPaper],
 ) -> Generator[Contribution, None, None]:
 
-    for contrib in event_data:
+    for paper in event_data:
         yield Contribution(
-            title=contrib.title,
-            abstract=contrib.summary,
+            title=paper.title,
+            abstract=paper.abstract,
             type=None,
-            startDate=contrib.updated,
-            endDate=contrib.updated,
+            startDate=paper.updated,
+            endDate=paper.updated,
             roomFullname=None,
-            url=contrib.pdf_url,
+            url=paper.pdf_url,
+            id=paper.id,
         )
 
 
-def arxiv_ranked_filename(what_day: datetime, topics: List[str]) -> Path:
+def arxiv_ranked_filename(
+    what_day: datetime, topics: List[str], last_day: Optional[datetime] = None
+) -> Path:
     """Generate the filename for the arXiv ranking file which includes
     of the form:
 
         `arxiv-<year>-<month>-<day>-<topic1>-<topic2>.csv`
 
-    Where the topic names are alphabetically sorted.
+    Where the topic names are alphabetically sorted. For a range of days, the
+    last day follows the first (`arxiv-<first>-to-<last>-...`).
 
     Args:
         what_day (datetime): The day the ranking was done
         topics (List[str]): The topics we are ranking
+        last_day (Optional[datetime]): The last day, if ranking a range of days.
 
     Returns:
         Path to the output file (in local directory).
     """
     topic_str = "-".join(sorted(topics))
-    return Path(f"arxiv-{what_day:%Y-%m-%d}-{topic_str}.csv")
+    days = f"{what_day:%Y-%m-%d}"
+    if last_day is not None and last_day.date() != what_day.date():
+        days += f"-to-{last_day:%Y-%m-%d}"
+    return Path(f"arxiv-{days}-{topic_str}.csv")
@@ -0,0 +1,133 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, Generator, Iterable, List, Optional
+
+import joblib
+
+from abstract_ranker import config
+from abstract_ranker.arxiv_store import ArxivPaper
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+
+
+def _abstract_hash(contrib: Contribution) -> str:
+    return hashlib.sha1(
+        f"{contrib.title}\n{contrib.abstract}".encode("utf-8")
+    ).hexdigest()
+
+
+class ArxivRankedIndex:
+    """The arXiv papers already ranked with a model, by versionless id. A paper seen
+    again (cross-listed, or replaced with a new version) is only ranked again if
+    its title or abstract changed.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        """Create an empty index.
+
+        Args:
+            path (Optional[Path]): Where `save` writes the index.
+        """
+        self.path = path
+
+        # Version, title/abstract hash and answer for every paper.
+        self._papers: Dict[str, Dict[str, Any]] = {}
+
+        # The version of each paper `track`ed this run
+        self._versions: Dict[str, int] = {}
+
+        # Counts for this run
+        self.checked = 0
+        self.seen = 0
+
+    @classmethod
+    def for_model(
+        cls, model: str, prompt: str, topics: List[str]
+    ) -> "ArxivRankedIndex":
+        """Load the persistent index for answers from `model` given this prompt and
+        these topics (answers to a different question can't be re-used).
+
+        Args:
+            model (str): Short name of the model
+            prompt (str): The ranking prompt
+            topics (List[str]): The interested and not interested topics
+
+        Returns:
+            ArxivRankedIndex: The index, empty if none has been saved yet.
+        """
+        key = joblib.hash((model, prompt, topics))
+        path = config.CACHE_DIR / "arxiv" / "ranked" / f"{model}-{key}.pkl"
+
+        index = cls(path)
+        if path.exists():
+            try:
+                index._papers = joblib.load(path)
+            except Exception as e:
+                logging.warning(f"Unable to read arXiv ranked index {path}: {e}")
+        return index
+
+    def __len__(self) -> int:
+        return len(self._papers)
+
+    def track(
+        self, papers: Iterable[ArxivPaper]
+    ) -> Generator[ArxivPaper, None, None]:
+        """Pass the papers through on their way to be ranked, noting each one's
+        version for `add`.
+
+        Args:
+            papers (Iterable[ArxivPaper]): The papers
+
+        Yields:
+            ArxivPaper: The papers, unchanged.
+        """
+        for paper in papers:
+            self._versions[paper.id] = paper.version
+            yield paper
+
+    def lookup(self, contrib: Contribution) -> Optional[AbstractLLMResponse]:
+        """Find the answer for a paper that has already been ranked.
+
+        Args:
+            contrib (Contribution): The paper we are about to rank.
+
+        Returns:
+            Optional[AbstractLLMResponse]: The earlier answer (with `source` noting
+                which version it was for), or None if the paper is new or its title
+                or abstract has changed.
+        """
+        if contrib.id is None:
+            return None
+        self.checked += 1
+
+        paper = self._papers.get(contrib.id)
+        if paper is None or paper["hash"] != _abstract_hash(contrib):
+            return None
+
+        self.seen += 1
+        response: AbstractLLMResponse = paper["response"]
+        return response.model_copy(
+            update={"source": f"{response.source} (ranked as v{paper['version']})"}
+        )
+
+    def add(self, contrib: Contribution, response: AbstractLLMResponse):
+        """Record a freshly ranked paper.
+
+        Args:
+            contrib (Contribution): The paper
+            response (AbstractLLMResponse): What the model said about it
+        """
+        if contrib.id is None:
+            return
+        self._papers[contrib.id] = {
+            "version": self._versions.get(contrib.id, 1),
+            "hash": _abstract_hash(contrib),
+            "response": response,
+        }
+
+    def save(self):
+        "Write the index to disk, if it has a home"
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(self._papers, self.path)
@@ -0,0 +1,215 @@
+import ast
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import arxiv
+import joblib
+from pydantic import BaseModel, TypeAdapter
+
+from abstract_ranker import config
+
+# Bump when the shard layout changes - shards in any other format are re-fetched.
+SHARD_FORMAT = 1
+
+_short_id_pattern = re.compile(r"^(.*?)(?:v(\d+))?$")
+
+
+class ArxivPaper(BaseModel):
+    "The parts of an arXiv search result we use"
+
+    # The arXiv id, without the version (`2405.01234`)
+    id: str
+
+    # The version of the paper
+    version: int
+
+    # Title of the paper
+    title: str
+
+    # The abstract
+    abstract: str
+
+    # When the first version was submitted
+    published: datetime
+
+    # When this version was submitted
+    updated: datetime
+
+    # The categories it is listed in (primary first)
+    categories: List[str]
+
+    # Link to the pdf
+    pdf_url: Optional[str]
+
+    # Link to the abstract page
+    abs_url: str
+
+
+_paper_list = TypeAdapter(List[ArxivPaper])
+
+
+def split_arxiv_id(short_id: str) -> Tuple[str, int]:
+    """Split an arXiv id into the id all versions of the paper share, and the version
+    (`2405.01234v2` -> `2405.01234`, 2).
+
+    Args:
+        short_id (str): The arXiv id, with or without a version
+
+    Returns:
+        Tuple[str, int]: The id without the version, and the version (1 if there
+            is none).
+    """
+    match = _short_id_pattern.match(short_id)
+    assert match is not None
+    return match.group(1), int(match.group(2) or 1)
+
+
+def paper_from_result(result: arxiv.Result) -> ArxivPaper:
+    """Keep just what we need from an arxiv search result.
+
+    Args:
+        result (arxiv.Result): The search result
+
+    Returns:
+        ArxivPaper: The compact record.
+    """
+    id, version = split_arxiv_id(result.get_short_id())
+    categories = [result.primary_category] + [
+        c for c in result.categories if c != result.primary_category
+    ]
+    return ArxivPaper(
+        id=id,
+        version=version,
+        title=result.title,
+        abstract=result.summary,
+        published=result.published,
+        updated=result.updated,
+        categories=categories,
+        pdf_url=result.pdf_url,
+        abs_url=result.entry_id,
+    )
+
+
+def shard_path(category: str, day: datetime) -> Path:
+    """Where the submissions to one category on one day are cached.
+
+    Args:
+        category (str): The arxiv category (e.g. `hep-ex`)
+        day (datetime): The day
+
+    Returns:
+        Path: The shard file (it may not exist yet).
+    """
+    return config.CACHE_DIR / "arxiv" / "shards" / category / f"{day:%Y-%m-%d}.json"
+
+
+def write_shard(path: Path, papers: List[ArxivPaper]):
+    """Write a shard as one column per field. The file is written to the side and
+    then moved into place, so a shard is never half written.
+
+    Args:
+        path (Path): The shard file
+        papers (List[ArxivPaper]): The papers in the shard
+    """
+    fields = list(ArxivPaper.model_fields)
+    rows = [p.model_dump(mode="json") for p in papers]
+    columns = {f: [r[f] for r in rows] for f in fields}
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump({"format": SHARD_FORMAT, "columns": columns}, f)
+    os.replace(tmp_path, path)
+
+
+def read_shard(path: Path) -> Optional[List[ArxivPaper]]:
+    """Read a shard written by `write_shard`.
+
+    Args:
+        path (Path): The shard file
+
+    Returns:
+        Optional[List[ArxivPaper]]: The papers, or None if there is no shard in the
+            current format.
+    """
+    if not path.exists():
+        return None
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except ValueError as e:
+        logging.warning(f"Unable to read arXiv shard {path}: {e}")
+        return None
+    if data.get("format") != SHARD_FORMAT:
+        return None
+
+    columns: Dict[str, List[Any]] = data["columns"]
+    names = list(columns)
+    return _paper_list.validate_python(
+        [dict(zip(names, row)) for row in zip(*columns.values())]
+    )
+
+
+def convert_arxiv_cache() -> int:
+    """Convert cached arXiv results from older versions to compact shards.
+
+    Two kinds of entry are converted: the per-(category, day) pickles of
+    `arxiv.Result`, and the original per-(categories, day) cache. The original
+    cache stopped at 400 results, and did not wait for a day to settle, so entries
+    that may be missing papers are left to be fetched again.
+
+    Returns:
+        int: The number of shards written.
+    """
+    written = 0
+    arxiv_cache = config.CACHE_DIR / "arxiv"
+
+    # Per-(category, day) pickles
+    for pkl in sorted((arxiv_cache / "shards").glob("*/*.pkl")):
+        shard = pkl.with_suffix(".json")
+        if not shard.exists():
+            write_shard(shard, [paper_from_result(r) for r in joblib.load(pkl)])
+            written += 1
+        pkl.unlink()
+
+    # The original cache, one entry per list of categories and day.
+    old_cache = arxiv_cache / "abstract_ranker" / "arxiv" / "load_arxiv_abstract"
+    for metadata_file in sorted(old_cache.glob("*/metadata.json")):
+        output = metadata_file.parent / "output.pkl"
+        if not output.exists():
+            continue
+        metadata = json.loads(metadata_file.read_text())
+        inputs = metadata["input_args"]
+
+        # joblib records the arguments as their repr.
+        topics: List[str] = ast.literal_eval(inputs["topic_list"])
+        date_match = re.match(r"datetime\.datetime\(([\d, ]+)\)", inputs["what_day"])
+        if date_match is None:
+            continue
+        day = datetime(*[int(v) for v in date_match.group(1).split(",")])
+
+        # Leave anything that may be incomplete to be fetched again.
+        fetched = datetime.fromtimestamp(metadata["time"])
+        if fetched - (day + timedelta(days=1)) <= config.arxiv_shard_final_after:
+            logging.warning(f"Not converting {inputs}: the day had not settled")
+            continue
+        results: List[arxiv.Result] = joblib.load(output)
+        if len(results) >= 400:
+            logging.warning(
+                f"Not converting {inputs}: it may have been cut off at 400 results"
+            )
+            continue
+
+        papers = [paper_from_result(r) for r in results]
+        for category in topics:
+            shard = shard_path(category, day)
+            if not shard.exists():
+                write_shard(shard, [p for p in papers if category in p.categories])
+                written += 1
+
+    return written
@@ -0,0 +1,221 @@
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from abstract_ranker import config
+from abstract_ranker.llm_utils import summarize_llm, summarize_llm_stream
+
+# A markdown heading, or a short line in capitals or ending with a colon - the way
+# projects and agenda items are usually introduced in minutes.
+_heading_pattern = re.compile(r"^(#{1,6}\s.*|[A-Z0-9][^a-z\n]{2,80}|.{1,80}:)\s*$")
+
+# One or more blank lines between paragraphs.
+_paragraph_pattern = re.compile(r"\n\s*\n")
+
+
+@lru_cache(maxsize=1)
+def _token_counter() -> Callable[[str], int]:
+    "Count tokens with tiktoken if it is installed, otherwise estimate them"
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        logging.debug("tiktoken not available - estimating token counts")
+        # About four characters a token for English text.
+        return lambda text: (len(text) + 3) // 4
+
+
+def count_tokens(text: str) -> int:
+    """The number of tokens in some text (estimated if tiktoken is not installed).
+
+    Args:
+        text (str): The text
+
+    Returns:
+        int: The number of tokens.
+    """
+    return _token_counter()(text)
+
+
+def _blocks(text: str) -> List[str]:
+    "Split text into paragraphs, with every heading starting a block of its own"
+    blocks: List[str] = []
+    for paragraph in _paragraph_pattern.split(text):
+        current: List[str] = []
+        for line in paragraph.splitlines():
+            if _heading_pattern.match(line) and len(current) > 0:
+                blocks.append("\n".join(current))
+                current = []
+            current.append(line)
+        if len(current) > 0 and "\n".join(current).strip() != "":
+            blocks.append("\n".join(current))
+    return blocks
+
+
+def _split_block(block: str, max_tokens: int) -> List[str]:
+    "Split a block that is too big for a chunk on lines, then words, then characters"
+    lines = block.splitlines()
+    if len(lines) > 1:
+        units, separator = lines, "\n"
+    elif " " in block.strip():
+        units, separator = block.split(" "), " "
+    else:
+        # One enormous word - cut it up by (estimated) size.
+        size = max_tokens * 4
+        return [block[i : i + size] for i in range(0, len(block), size)]
+
+    pieces: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for unit in units:
+        tokens = count_tokens(unit) + 1
+        if tokens > max_tokens:
+            if len(current) > 0:
+                pieces.append(separator.join(current))
+                current, current_tokens = [], 0
+            pieces.extend(_split_block(unit, max_tokens))
+            continue
+        if current_tokens + tokens > max_tokens and len(current) > 0:
+            pieces.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if len(current) > 0:
+        pieces.append(separator.join(current))
+    return pieces
+
+
+def split_text(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """Split text into chunks of at most `max_tokens`, breaking between paragraphs
+    and in front of headings where possible. Each chunk starts with the last
+    paragraphs (up to `overlap_tokens`) of the one before, so nothing said across a
+    break is lost.
+
+    Args:
+        text (str): The text to split
+        max_tokens (int): The largest chunk
+        overlap_tokens (int): Tokens repeated from the end of the previous chunk
+
+    Returns:
+        List[str]: The chunks, in order.
+    """
+    blocks: List[str] = []
+    for block in _blocks(text):
+        if count_tokens(block) > max_tokens:
+            blocks.extend(_split_block(block, max_tokens))
+        else:
+            blocks.append(block)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    fresh = 0  # blocks in `current` that are not overlap
+    for block in blocks:
+        tokens = count_tokens(block) + 1
+        is_heading = _heading_pattern.match(block.splitlines()[0]) is not None
+        full = current_tokens + tokens > max_tokens
+        # Start the next chunk at a heading rather than part way through a section,
+        # as long as this chunk is already reasonably full.
+        if fresh > 0 and (full or (is_heading and current_tokens > max_tokens // 2)):
+            chunks.append("\n\n".join(current))
+            overlap: List[str] = []
+            overlap_size = 0
+            for previous in reversed(current):
+                size = count_tokens(previous) + 1
+                if overlap_size + size > overlap_tokens or size + tokens > max_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += size
+            current, current_tokens, fresh = overlap, overlap_size, 0
+        current.append(block)
+        current_tokens += tokens
+        fresh += 1
+    if fresh > 0:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def map_reduce_summarize(
+    text: str,
+    map_prompt: str,
+    reduce_prompt: str,
+    model: str,
+    use_cache: bool,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+    workers: Optional[int] = None,
+    on_text: Optional[Callable[[str], None]] = None,
+    single_prompt: Optional[str] = None,
+) -> str:
+    """Summarize text too long for one query: summarize overlapping chunks of it in
+    parallel, then merge the partial summaries. Each chunk summary is cached on the
+    chunk's text, so a re-run after an edit only re-summarizes the chunks that
+    changed. If the partial summaries are themselves too long they are merged a
+    group at a time.
+
+    Args:
+        text (str): The text to summarize
+        map_prompt (str): Prompt for summarizing one chunk
+        reduce_prompt (str): Prompt for merging partial summaries
+        model (str): The model to use
+        use_cache (bool): Whether to use the cache or not
+        max_tokens (Optional[int]): Tokens per chunk (defaults to
+            `summarize_chunk_tokens` in `config.py`).
+        overlap_tokens (Optional[int]): Overlap between chunks (defaults to
+            `summarize_chunk_overlap`).
+        workers (Optional[int]): Chunks summarized at once (defaults to
+            `summarize_workers`).
+        on_text (Optional[Callable[[str], None]]): If given, the final summary is
+            streamed to it as the model writes it.
+        single_prompt (Optional[str]): Prompt for text that fits in one chunk, which
+            is summarized whole rather than as a part (defaults to `map_prompt`).
+
+    Returns:
+        str: The summary.
+    """
+    max_tokens = max_tokens if max_tokens is not None else config.summarize_chunk_tokens
+    overlap_tokens = (
+        overlap_tokens if overlap_tokens is not None else config.summarize_chunk_overlap
+    )
+    workers = workers if workers is not None else config.summarize_workers
+
+    def final(prompt: str, text: str) -> str:
+        if on_text is None:
+            return summarize_llm(prompt, {"text": text}, model, use_cache)
+        parts: List[str] = []
+        for part in summarize_llm_stream(prompt, {"text": text}, model, use_cache):
+            on_text(part)
+            parts.append(part)
+        return "".join(parts)
+
+    chunks = split_text(text, max_tokens, overlap_tokens)
+    if len(chunks) == 1:
+        return final(single_prompt or map_prompt, chunks[0])
+
+    def summarize(prompt: str, texts: List[str]) -> List[str]:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(
+                executor.map(
+                    lambda t: summarize_llm(prompt, {"text": t}, model, use_cache),
+                    texts,
+                )
+            )
+
+    logging.info(f"Summarizing {len(chunks)} chunks of {count_tokens(text)} tokens")
+    partials = summarize(map_prompt, chunks)
+
+    # Merge the partial summaries, a group at a time if they will not fit together.
+    while True:
+        groups = split_text("\n\n".join(partials), max_tokens)
+        if len(groups) == 1:
+            return final(reduce_prompt, groups[0])
+        if len(groups) >= len(partials):
+            # Merging a group at a time isn't making them any shorter.
+            logging.warning("Partial summaries are too long to merge in one query")
+            return final(reduce_prompt, "\n\n".join(partials))
+        logging.info(f"Merging {len(partials)} partial summaries in {len(groups)}")
+        partials = summarize(reduce_prompt, groups)
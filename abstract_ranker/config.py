@@ -1,7 +1,51 @@
+from datetime import timedelta
 from pathlib import Path
 
 CACHE_DIR = Path("./.abstract_cache")
 
+# Every ranking is also recorded here, to be searched later with `query`.
+results_db = Path("./abstract_results.sqlite")
+
+# A --sort keeps at most this many results in memory; beyond that, sorted runs are
+# spilled to temporary files and merged.
+sort_memory_rows = 10_000
+
+# Chunked summaries (llm_summarize file --chunked): tokens per chunk, tokens of
+# overlap between neighbouring chunks, and chunks summarized at once.
+summarize_chunk_tokens = 6000
+summarize_chunk_overlap = 200
+summarize_workers = 4
+
+# Summarizing many files: files handled at once, and where the summaries go.
+summarize_file_workers = 4
+summaries_dir = Path("./summaries")
+
+# --profile: seconds between CPU samples, stack frames kept for each allocation,
+# and lines in each ranked list of the report.
+profile_interval = 0.005
+profile_traceback_frames = 1
+profile_top = 25
+profile_file = Path("abstract_ranker_profile.txt")
+
+# A cached indico export younger than this is used without asking the server; an
+# older one is re-validated (the server only re-sends it if it changed).
+indico_max_age = timedelta(hours=1)
+
+# (connect, read) timeouts in seconds for indico requests.
+indico_timeout = (10, 120)
+
+# Parallel requests when a large indico event is fetched in pieces (--split).
+indico_fetch_workers = 8
+
+# arXiv API paging: results per request, and the pause between requests (arXiv
+# asks for at least 3 seconds).
+arxiv_page_size = 500
+arxiv_delay_seconds = 3.0
+
+# An arXiv day is only cached once it is this old - before then late
+# announcements and replacements can still change it.
+arxiv_shard_final_after = timedelta(days=2)
+
 # Raw prompt for the LLM
 abstract_ranking_prompt = """Help me judge the following conference presentation as interesting or
 not by summarizing the abstract and ranking it according to topics I'm interested in or not.
@@ -25,3 +69,39 @@ not_interested_topics = [
     "Lattice Gauge Theory",
     "Neutrino Physics",
 ]
+
+# Contributions whose abstract is at least this similar (estimated Jaccard similarity
+# of word shingles) to one already ranked re-use that answer instead of a new query.
+near_duplicate_threshold = 0.9
+
+# Cosine similarity to the closest interesting topic needed for the `lexical` ranker
+# to call a contribution high or medium interest.
+lexical_interest_thresholds = {"high": 0.2, "medium": 0.1}
+
+# In cascade mode, contributions the cheap model ranks at least this interesting, or
+# ranks with less than this confidence, are re-ranked by the expensive model.
+cascade_interest_threshold = "medium"
+cascade_confidence_threshold = 0.7
+
+# Contributions matching any of these rules are marked low interest without asking
+# the LLM. Each rule sets some of `type`, `title`, `room` (case insensitive regular
+# expressions), `max_abstract_length` (abstract shorter than this), and `keywords`
+# (any of these words in the title or abstract); all that are set must match.
+prefilter_rules = [
+    {
+        "name": "breaks",
+        "title": r"^\s*(coffee|lunch|dinner|tea|break|reception)\b",
+        "max_abstract_length": 10,
+    },
+    {
+        "name": "welcome and organization",
+        "title": r"^\s*(welcome|opening|closing|updates from the organi[sz]ers|q&a"
+        r"|announcements)\b",
+        "max_abstract_length": 10,
+    },
+    {
+        "name": "empty posters",
+        "type": r"poster",
+        "max_abstract_length": 10,
+    },
+]
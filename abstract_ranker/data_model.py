@@ -1,5 +1,6 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
+from pydantic.json_schema import SkipJsonSchema
 from datetime import datetime
 
 
@@ -26,6 +27,9 @@ class Contribution(BaseModel):
     # URL to the item (talk, contribution, etc.)
     url: Optional[str]
 
+    # Stable id of the item in its source (indico contribution id, etc.)
+    id: Optional[str] = None
+
 
 class AbstractLLMResponse(BaseModel):
     "Result back from LLM grading of an abstract"
@@ -76,3 +80,12 @@ class AbstractLLMResponse(BaseModel):
         title="Short JSON list of terms (strings) in the abstract whose definition would "
         "improve your confidence.",
     )
+
+    # Where this answer came from (the model that produced it, or how it was
+    # re-used). We fill this in, not the LLM, so it is kept out of the schema.
+    source: SkipJsonSchema[str] = ""
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        # Answers pickled into the cache before `source` existed do not carry it.
+        state["__dict__"].setdefault("source", "")
+        super().__setstate__(state)
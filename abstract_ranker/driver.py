@@ -1,31 +1,95 @@
-from typing import Generator, Tuple
+import logging
+from typing import Generator, Iterable, List, Optional, Tuple
 
 from abstract_ranker.data_model import AbstractLLMResponse, Contribution
-from abstract_ranker.llm_utils import query_llm
+from abstract_ranker.llm_utils import LEXICAL_MODEL, get_query_cost, query_llm
+from abstract_ranker.near_duplicate import NearDuplicateIndex
+from abstract_ranker.prefilter import Prefilter
+from abstract_ranker.tracing import span
+from abstract_ranker.utils import as_a_number
 
 from abstract_ranker.config import interested_topics, not_interested_topics
 
 
-def process_contributions(
-    contributions: Generator[Contribution, None, None],
+class ModelCascade:
+    """Rank everything with a cheap model first, and only re-rank with the expensive
+    model the contributions that look interesting or that the cheap model is unsure of.
+    """
+
+    def __init__(
+        self, cheap_model: str, interest_threshold: str, confidence_threshold: float
+    ):
+        """Set up the cascade.
+
+        Args:
+            cheap_model (str): Model for the first pass (any LLM, or `lexical`).
+            interest_threshold (str): Escalate contributions ranked at least this
+                interesting ("low", "medium", or "high").
+            confidence_threshold (float): Escalate contributions ranked with less
+                than this confidence.
+        """
+        self.cheap_model = cheap_model
+        self.interest_threshold = as_a_number(interest_threshold)
+        self.confidence_threshold = confidence_threshold
+
+        # Counts for the run summary
+        self.ranked = 0
+        self.escalated = 0
+
+    def should_escalate(self, response: AbstractLLMResponse) -> bool:
+        """Does this cheap-model answer need a second opinion?
+
+        Args:
+            response (AbstractLLMResponse): The cheap model's answer.
+
+        Returns:
+            bool: True if the expensive model should re-rank it.
+        """
+        return (
+            as_a_number(response.interest) >= self.interest_threshold
+            or response.confidence < self.confidence_threshold
+        )
+
+    def summary(self, expensive_model: str) -> str:
+        """Escalation rate and the estimated cost saved versus running everything
+        through the expensive model.
+
+        Args:
+            expensive_model (str): The second-tier model.
+
+        Returns:
+            str: One line report.
+        """
+        rate = self.escalated / self.ranked if self.ranked > 0 else 0.0
+        report = (
+            f"Cascade {self.cheap_model} -> {expensive_model}: escalated "
+            f"{self.escalated} of {self.ranked} contributions ({rate:.1%})"
+        )
+
+        cheap_cost = get_query_cost(self.cheap_model)
+        expensive_cost = get_query_cost(expensive_model)
+        if cheap_cost is None or expensive_cost is None:
+            return report + ", cost saved unknown."
+        saved = (self.ranked - self.escalated) * expensive_cost - (
+            self.ranked * cheap_cost
+        )
+        return report + f", estimated cost saved ${saved:.2f}."
+
+
+def _rank_contribution(
+    contrib: Contribution,
     prompt: str,
     model: str,
     use_cache: bool,
-) -> Generator[Tuple[Contribution, AbstractLLMResponse], None, None]:
-    """Feed each contribution to the LLM, and get back the summary information.
-
-    Args:
-        contributions (Generator[Contribution, None, None]): The contribution list.
-        prompt (str): The prompt to feed the LLM.
-        model (str): The name of the model to run
-        use_cache (bool): If False, don't use the LLM cache.
+    near_duplicates: Optional[NearDuplicateIndex],
+) -> AbstractLLMResponse:
+    "Get the LLM's answer for a single contribution"
+    with span("driver.rank", contribution=contrib.title, id=contrib.id, model=model):
+        if near_duplicates is not None:
+            reused = near_duplicates.lookup(contrib)
+            if reused is not None:
+                return reused
 
-    Yields:
-        Generator[Tuple[Contribution, AbstractLLMResponse], None, None]: The summary data
-                                            from the LLM.
-    """
-
-    for contrib in contributions:
         abstract_text = (
             contrib.abstract
             if not (contrib.abstract is None or len(contrib.abstract) < 10)
@@ -41,6 +105,139 @@ def process_contributions(
             },
             model,
             use_cache,
+        ).model_copy(update={"source": model})
+
+        if near_duplicates is not None:
+            near_duplicates.add(contrib, summary)
+
+        return summary
+
+
+def _rank(
+    contributions: Iterable[Contribution],
+    prompt: str,
+    model: str,
+    use_cache: bool,
+    near_duplicates: Optional[NearDuplicateIndex],
+) -> Generator[Tuple[Contribution, AbstractLLMResponse], None, None]:
+    "Rank each contribution with a single model"
+    if model == LEXICAL_MODEL:
+        # Scores everything in one vectorized pass - nothing to cache or re-use.
+        from abstract_ranker.lexical import rank_lexical
+
+        yield from rank_lexical(contributions, interested_topics, not_interested_topics)
+        return
+
+    for contrib in contributions:
+        yield contrib, _rank_contribution(
+            contrib, prompt, model, use_cache, near_duplicates
+        )
+
+
+def _apply_prefilter(
+    contributions: Iterable[Contribution],
+    prefilter: Prefilter,
+    filtered: List[Tuple[Contribution, AbstractLLMResponse]],
+) -> Generator[Contribution, None, None]:
+    "Pass on the contributions the pre-filter lets through, set aside the rest"
+    for contrib in contributions:
+        answer = prefilter.check(contrib)
+        if answer is None:
+            yield contrib
+        else:
+            filtered.append((contrib, answer))
+
+
+def _process(
+    contributions: Iterable[Contribution],
+    prompt: str,
+    model: str,
+    use_cache: bool,
+    near_duplicates: Optional[NearDuplicateIndex],
+    cascade: Optional[ModelCascade],
+) -> Generator[Tuple[Contribution, AbstractLLMResponse], None, None]:
+    "Rank the contributions with a single model, or with the cascade"
+    if cascade is None:
+        yield from _rank(contributions, prompt, model, use_cache, near_duplicates)
+        return
+
+    for contrib, first_answer in _rank(
+        contributions, prompt, cascade.cheap_model, use_cache, None
+    ):
+        cascade.ranked += 1
+        if not cascade.should_escalate(first_answer):
+            yield contrib, first_answer
+            continue
+
+        cascade.escalated += 1
+        summary = _rank_contribution(contrib, prompt, model, use_cache, near_duplicates)
+        yield contrib, summary.model_copy(
+            update={
+                "source": f"{summary.source} (escalated from {cascade.cheap_model})"
+            }
+        )
+
+    logging.info(cascade.summary(model))
+
+
+def answered_by(summary: AbstractLLMResponse, model: str) -> bool:
+    """Did `model` itself give this answer (directly, on escalation, or re-used from a
+    near-duplicate) - rather than a cascade's cheap model or the pre-filter?
+
+    Args:
+        summary (AbstractLLMResponse): An answer from `process_contributions`
+        model (str): The model `process_contributions` was asked to rank with
+
+    Returns:
+        bool: True if the answer is `model`'s.
+    """
+    return summary.source == model or summary.source.startswith(f"{model} ")
+
+
+def process_contributions(
+    contributions: Generator[Contribution, None, None],
+    prompt: str,
+    model: str,
+    use_cache: bool,
+    near_duplicates: Optional[NearDuplicateIndex] = None,
+    cascade: Optional[ModelCascade] = None,
+    prefilter: Optional[Prefilter] = None,
+) -> Generator[Tuple[Contribution, AbstractLLMResponse], None, None]:
+    """Feed each contribution to the LLM, and get back the summary information.
+
+    Args:
+        contributions (Generator[Contribution, None, None]): The contribution list.
+        prompt (str): The prompt to feed the LLM.
+        model (str): The name of the model to run
+        use_cache (bool): If False, don't use the LLM cache.
+        near_duplicates (Optional[NearDuplicateIndex]): If given, contributions that
+            are near-duplicates of one already ranked re-use that answer, and new
+            answers are added to it.
+        cascade (Optional[ModelCascade]): If given, everything is first ranked by the
+            cascade's cheap model, and `model` only re-ranks what it escalates.
+        prefilter (Optional[Prefilter]): If given, contributions it catches are
+            answered by it and never reach any model.
+
+    Yields:
+        Generator[Tuple[Contribution, AbstractLLMResponse], None, None]: The summary data
+                                            from the LLM.
+    """
+    if prefilter is None:
+        yield from _process(
+            contributions, prompt, model, use_cache, near_duplicates, cascade
         )
+        return
 
-        yield contrib, summary
+    filtered: List[Tuple[Contribution, AbstractLLMResponse]] = []
+    for ranked in _process(
+        _apply_prefilter(contributions, prefilter, filtered),
+        prompt,
+        model,
+        use_cache,
+        near_duplicates,
+        cascade,
+    ):
+        yield from filtered
+        filtered.clear()
+        yield ranked
+    yield from filtered
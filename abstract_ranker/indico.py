@@ -1,18 +1,25 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+import json
+import logging
+import os
 from pathlib import Path
 import re
-from typing import Any, Dict, Generator, Optional, Tuple
+import threading
+from typing import IO, Any, Dict, Generator, Iterable, List, Optional, Tuple, Union
 
+import ijson
 import pytz
-from joblib import Memory
+from pytz.tzinfo import BaseTzInfo
 from pydantic import BaseModel
 import requests
+from requests.adapters import HTTPAdapter
 from tzlocal import get_localzone
 
-from abstract_ranker.config import CACHE_DIR
+from abstract_ranker import config
 from abstract_ranker.data_model import Contribution
-
-memory_indico = Memory(CACHE_DIR / "indico", verbose=0)
+from abstract_ranker.tracing import span
 
 
 # Some classes to help us out.
@@ -32,20 +39,9 @@ class IndicoDate(BaseModel):
         `self.tz` and `self.date` and `self.time`.
 
         Returns:
-            Tuple[str, str]: The date and time in the local timezone.
+            datetime: The date and time in the local timezone.
         """
-        # Get the talk timezone offset and the proper time for the talk.
-        talk_timezone = pytz.timezone(self.tz)
-        now = datetime.now(talk_timezone)
-        timezone_offset = now.strftime("%z")
-
-        talk_time = datetime.strptime(
-            f"{self.date} {self.time} {timezone_offset}", "%Y-%m-%d %H:%M:%S %z"
-        )
-
-        # Now, create that in local time.
-        local_talk_time = talk_time.astimezone(get_localzone())
-        return local_talk_time
+        return self.get_datetime(None).astimezone(get_localzone())
 
     def get_datetime(self, tz_name: Optional[str]) -> datetime:
         """Returns the date and time in the specified timezone, taking into account
@@ -53,42 +49,62 @@ class IndicoDate(BaseModel):
         it will the time in the event's timezone.
 
         Returns:
-            Tuple[str, str]: The date and time in the local timezone.
+            datetime: The date and time in the requested timezone.
         """
-        # Get the talk timezone offset and the proper time for the talk.
-        talk_timezone = pytz.timezone(self.tz)
-        now = datetime.now(talk_timezone)
-        timezone_offset = now.strftime("%z")
-
-        talk_time = datetime.strptime(
-            f"{self.date} {self.time} {timezone_offset}", "%Y-%m-%d %H:%M:%S %z"
-        )
+        return _convert_date(self.date, self.time, self.tz, tz_name)
 
-        if tz_name is None:
-            return talk_time
 
-        # Now, create that in local time.
-        local_talk_time = talk_time.astimezone(pytz.timezone(tz_name))
-        return local_talk_time
+@lru_cache(maxsize=None)
+def _timezone(tz_name: str) -> BaseTzInfo:
+    "The pytz timezone for a name - looked up once per run"
+    return pytz.timezone(tz_name)
 
 
-@memory_indico.cache
-def _load_indico_json(node: str, meeting_id: str) -> Dict[str, Any]:
-    """Loads and returns the JSON info for an indico meeting.
+@lru_cache(maxsize=4096)
+def _convert_date(
+    date: str, time: str, talk_tz_name: str, tz_name: Optional[str]
+) -> datetime:
+    """Convert an indico date and time to a timezone. Many talks share start and end
+    times (poster sessions, parallel tracks), so the results are memoized.
 
     Args:
-        node (str): The url stem for the indico instance we will access
-        meeting_id (str): The meeting ID for the meeting we want to access
+        date (str): The date ("YYYY-MM-DD")
+        time (str): The time ("HH:MM:SS")
+        talk_tz_name (str): The timezone the date and time are given in
+        tz_name (Optional[str]): The timezone to convert to (None to keep the
+            talk's).
 
     Returns:
-        _type_: The JSON data for the meeting
+        datetime: The timezone aware date and time.
     """
+    # Localize with the offset in force on the talk's date, not today's, so
+    # dates across a DST change come out right.
+    talk_time = _timezone(talk_tz_name).localize(
+        datetime.fromisoformat(f"{date}T{time}")
+    )
+    if tz_name is None or tz_name == talk_tz_name:
+        return talk_time
+    return talk_time.astimezone(_timezone(tz_name))
 
-    url = f"{node}/export/event/{meeting_id}.json?detail=contributions"
 
-    # Make the request to the URL
-    response = requests.get(url)
-    return response.json()["results"][0]
+# Shared HTTP session (connection pooling, keep-alive, compression).
+_session: Optional[requests.Session] = None
+
+
+def _get_session() -> requests.Session:
+    """The HTTP session used for all indico requests.
+
+    Returns:
+        requests.Session: The session, created on first use.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=3)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
 
 
 def parse_indico_url(event_url: str) -> Tuple[str, str]:
@@ -110,19 +126,477 @@ def parse_indico_url(event_url: str) -> Tuple[str, str]:
         raise ValueError("Invalid indico event URL")
 
 
-def load_indico_json(event_url: str) -> Dict[str, Any]:
+def indico_export_path(event_url: str) -> Path:
+    """Where the cached contribution export for a meeting lives. It is only
+    rewritten when a new copy is downloaded.
+
+    Args:
+        event_url (str): The URL of anything in the meeting
+
+    Returns:
+        Path: The cache file (it may not exist yet).
+    """
+    return _export_cache_path(*parse_indico_url(event_url))
+
+
+def _export_cache_path(node: str, meeting_id: str, part: str = "") -> Path:
+    """Where the raw contribution export for a meeting is kept.
+
+    Args:
+        node (str): The url stem for the indico instance
+        meeting_id (str): The meeting ID
+        part (str): Which piece of the meeting this is, when it is fetched in
+            pieces ("" for the full contribution export).
+
+    Returns:
+        Path: The cache file (it may not exist yet).
+    """
+    node_name = re.sub(r"[^\w.-]", "_", node.split("://")[-1])
+    suffix = f"-{part}" if part != "" else ""
+    return (
+        config.CACHE_DIR
+        / "indico"
+        / "exports"
+        / f"{node_name}-{meeting_id}{suffix}.json"
+    )
+
+
+# How much of a download is read from the network at a time.
+_DOWNLOAD_CHUNK = 64 * 1024
+
+
+class _ExportStream:
+    """The bytes of an indico export, read either from the cache or from the network.
+    A download goes into the cache on a background thread, at whatever rate the
+    network allows, and is read back from there however slowly it is consumed. The
+    validators (ETag, Last-Modified) needed to ask later if it has changed are kept
+    with it.
+    """
+
+    def __init__(self, url: str, cache_path: Path, max_age: timedelta, refresh: bool):
+        """Open the export, hitting the network only if we need to.
+
+        Args:
+            url (str): The export URL
+            cache_path (Path): Where the export is cached
+            max_age (timedelta): A cached export younger than this is used without
+                asking the server.
+            refresh (bool): Ignore any cached copy and download it again.
+        """
+        self._cache_path = cache_path
+        self._meta_path = cache_path.with_name(cache_path.name + ".meta")
+        self._response: Optional[requests.Response] = None
+        self._partial_path: Optional[Path] = None
+        self._download_thread: Optional[threading.Thread] = None
+        self._progress = threading.Condition()
+        self._downloaded = 0
+        self._download_done = False
+        self._download_error: Optional[Exception] = None
+        self._cancelled = False
+
+        meta: Dict[str, Any] = {}
+        if cache_path.exists() and self._meta_path.exists() and not refresh:
+            meta = json.loads(self._meta_path.read_text())
+            age = datetime.now().timestamp() - meta.get("fetched", 0)
+            if age < max_age.total_seconds():
+                logging.debug(f"Using cached indico export {cache_path}")
+                self._source: Any = cache_path.open("rb")
+                return
+
+        # Ask the server, conditionally if we have something cached.
+        headers = {}
+        if "etag" in meta:
+            headers["If-None-Match"] = meta["etag"]
+        if "last_modified" in meta:
+            headers["If-Modified-Since"] = meta["last_modified"]
+        response = _get_session().get(
+            url, headers=headers, stream=True, timeout=config.indico_timeout
+        )
+        if response.status_code == 304:
+            logging.debug(f"Indico export {url} not modified, using cached copy")
+            response.close()
+            meta["fetched"] = datetime.now().timestamp()
+            self._meta_path.write_text(json.dumps(meta))
+            self._source = cache_path.open("rb")
+            return
+
+        response.raise_for_status()
+        response.raw.decode_content = True
+        self._response = response
+
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._partial_path = cache_path.with_suffix(".partial")
+        copy = self._partial_path.open("wb")
+        self._source = self._partial_path.open("rb")
+        self._download_thread = threading.Thread(
+            target=self._download, args=(copy,), daemon=True
+        )
+        self._download_thread.start()
+
+    def _download(self, copy: IO[bytes]):
+        "Copy the response into the partial cache file (runs on its own thread)"
+        assert self._response is not None
+        try:
+            with copy:
+                while not self._cancelled:
+                    data = self._response.raw.read(_DOWNLOAD_CHUNK)
+                    if not data:
+                        break
+                    copy.write(data)
+                    copy.flush()
+                    with self._progress:
+                        self._downloaded += len(data)
+                        self._progress.notify_all()
+        except Exception as e:
+            self._download_error = e
+        finally:
+            with self._progress:
+                self._download_done = True
+                self._progress.notify_all()
+
+    def read(self, size: int = -1) -> bytes:
+        if self._download_thread is not None:
+            # Wait for the download to get ahead of us (or, to read it all, finish).
+            with self._progress:
+                while not self._download_done and (
+                    size < 0 or self._downloaded <= self._source.tell()
+                ):
+                    self._progress.wait()
+                if self._download_error is not None:
+                    raise self._download_error
+        return self._source.read(size)
+
+    def close(self, completed: bool):
+        """Done reading. A download is only kept in the cache if it was wanted to the
+        end; this waits for it to finish.
+
+        Args:
+            completed (bool): True if the whole export was read (or is wanted in the
+                cache anyway), False to abandon a download.
+        """
+        if self._download_thread is None:
+            self._source.close()
+            return
+
+        assert self._response is not None and self._partial_path is not None
+        if not completed:
+            self._cancelled = True
+            self._response.close()
+        self._download_thread.join()
+        self._source.close()
+        self._response.close()
+        if self._download_error is not None:
+            self._partial_path.unlink(missing_ok=True)
+            if completed:
+                raise self._download_error
+            return
+        if not completed:
+            self._partial_path.unlink(missing_ok=True)
+            return
+
+        os.replace(self._partial_path, self._cache_path)
+        meta = {"fetched": datetime.now().timestamp()}
+        if "ETag" in self._response.headers:
+            meta["etag"] = self._response.headers["ETag"]
+        if "Last-Modified" in self._response.headers:
+            meta["last_modified"] = self._response.headers["Last-Modified"]
+        self._meta_path.write_text(json.dumps(meta))
+
+
+def _open_export(
+    event_url: str, max_age: Optional[timedelta], refresh: bool
+) -> _ExportStream:
+    "Open the contribution export for the meeting `event_url` is part of"
+    node, meeting_id = parse_indico_url(event_url)
+    return _ExportStream(
+        f"{node}/export/event/{meeting_id}.json?detail=contributions",
+        _export_cache_path(node, meeting_id),
+        max_age if max_age is not None else config.indico_max_age,
+        refresh,
+    )
+
+
+def fetch_indico_export(
+    event_url: str, max_age: Optional[timedelta] = None, refresh: bool = False
+) -> Path:
+    """Bring the cached export for a meeting up to date without parsing it. The
+    cache file is only rewritten when the server sends a new copy, so its
+    modification time tells whether the export changed.
+
+    Args:
+        event_url (str): The URL of anything in the meeting
+        max_age (Optional[timedelta]): How old a cached copy can be before we check
+            with the server (defaults to `indico_max_age` in `config.py`).
+        refresh (bool): Ignore the cache and download the export again.
+
+    Returns:
+        Path: The cached export.
+    """
+    with span("indico.fetch", url=event_url):
+        # A download goes into the cache by itself; closing waits for it.
+        _open_export(event_url, max_age, refresh).close(True)
+    return indico_export_path(event_url)
+
+
+def load_indico_json(
+    event_url: str,
+    max_age: Optional[timedelta] = None,
+    refresh: bool = False,
+    split: bool = False,
+) -> Dict[str, Any]:
     """Returns the json for a url from any indico instance
 
+    A cached copy younger than `max_age` is used as is. An older one is
+    re-validated with the server, which only sends the export again if it changed.
+
     Args:
         event_url (str): The URL of anything in the meeting
+        max_age (Optional[timedelta]): How old a cached copy can be before we check
+            with the server (defaults to `indico_max_age` in `config.py`).
+        refresh (bool): Ignore the cache and download the export again.
+        split (bool): Fetch the event in pieces (timetable, then each session) in
+            parallel, rather than as one large export. Contributions that are not
+            on the timetable are missed this way.
 
     Returns:
         Dict[str, Any]: The info for the meeting
     """
+    with span("indico.load", url=event_url, split=split):
+        if split:
+            return _load_indico_split(event_url, max_age, refresh)
+
+        return _read_export(_open_export(event_url, max_age, refresh))["results"][0]
+
+
+def _read_export(export: _ExportStream) -> Dict[str, Any]:
+    "Parse a whole export, keeping it in the cache only if it was all read"
+    completed = False
+    try:
+        data = json.load(export)  # type: ignore
+        completed = True
+    finally:
+        export.close(completed)
+    return data
+
+
+def _fetch_part(
+    node: str,
+    meeting_id: str,
+    path: str,
+    part: str,
+    max_age: Optional[timedelta],
+    refresh: bool,
+) -> Dict[str, Any]:
+    """Fetch one piece of a meeting, with the same caching as the full export.
+
+    Args:
+        node (str): The url stem for the indico instance
+        meeting_id (str): The meeting ID
+        path (str): The export path and query, after `{node}/export/`
+        part (str): Name for this piece in the cache
+        max_age (Optional[timedelta]): How old a cached copy can be before we check
+            with the server.
+        refresh (bool): Ignore the cache and download it again.
+
+    Returns:
+        Dict[str, Any]: The parsed export.
+    """
+    with span("indico.fetch_part", part=part):
+        return _read_export(
+            _ExportStream(
+                f"{node}/export/{path}",
+                _export_cache_path(node, meeting_id, part),
+                max_age if max_age is not None else config.indico_max_age,
+                refresh,
+            )
+        )
+
+
+def _timetable_sessions(
+    timetable: Dict[str, Any],
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Find the sessions in a timetable export, and the contributions scheduled
+    outside of any session.
+
+    Args:
+        timetable (Dict[str, Any]): The `results` of the timetable export, keyed by
+            day and then entry.
+
+    Returns:
+        List[str]: The session ids, in timetable order.
+        List[Dict[str, Any]]: The contributions outside any session, in the same
+            form as the contribution export.
+    """
+    sessions: Dict[str, None] = {}
+    contributions = []
+    for day in timetable.values():
+        for entry in day.values():
+            if entry.get("entryType") == "Session":
+                sessions[str(entry["sessionId"])] = None
+            elif entry.get("entryType") == "Contribution":
+                contributions.append(
+                    {
+                        "id": str(entry.get("contributionId", entry.get("id"))),
+                        "title": entry["title"],
+                        "description": entry.get("description", ""),
+                        "type": None,
+                        "startDate": entry.get("startDate"),
+                        "endDate": entry.get("endDate"),
+                        "roomFullname": entry.get("room"),
+                        "url": entry.get("url"),
+                    }
+                )
+    return list(sessions), contributions
+
+
+def _start_key(raw: Dict[str, Any]) -> Tuple[str, str]:
+    "Sort contributions by start time, unscheduled ones last"
+    start = raw.get("startDate")
+    if start is None:
+        return ("9999-99-99", "")
+    return (start["date"], start["time"])
+
+
+def _load_indico_split(
+    event_url: str, max_age: Optional[timedelta], refresh: bool
+) -> Dict[str, Any]:
+    """Fetch a meeting in pieces over a pool of workers: the event info and timetable
+    first, and then each session's contributions. Very large events can time out
+    when all contributions are asked for in one request.
 
-    # Example usage
+    Args:
+        event_url (str): The URL of anything in the meeting
+        max_age (Optional[timedelta]): How old a cached copy can be before we check
+            with the server.
+        refresh (bool): Ignore the cache and download everything again.
+
+    Returns:
+        Dict[str, Any]: The info for the meeting, in the same form as
+            `load_indico_json` returns.
+    """
     node, meeting_id = parse_indico_url(event_url)
-    return _load_indico_json(node, meeting_id)  # type: ignore
+
+    with ThreadPoolExecutor(max_workers=config.indico_fetch_workers) as pool:
+        info_future = pool.submit(
+            _fetch_part,
+            node,
+            meeting_id,
+            f"event/{meeting_id}.json",
+            "info",
+            max_age,
+            refresh,
+        )
+        timetable_future = pool.submit(
+            _fetch_part,
+            node,
+            meeting_id,
+            f"timetable/{meeting_id}.json",
+            "timetable",
+            max_age,
+            refresh,
+        )
+        timetable = timetable_future.result()["results"].get(meeting_id, {})
+        session_ids, contributions = _timetable_sessions(timetable)
+
+        session_futures = [
+            pool.submit(
+                _fetch_part,
+                node,
+                meeting_id,
+                f"event/{meeting_id}/session/{session_id}.json?detail=contributions",
+                f"session-{session_id}",
+                max_age,
+                refresh,
+            )
+            for session_id in session_ids
+        ]
+        event_info = info_future.result()["results"][0]
+
+        # The session exports have the full contribution details, so they win over
+        # anything the timetable had.
+        session_contributions: List[Dict[str, Any]] = []
+        for future in session_futures:
+            for session in future.result()["results"]:
+                session_contributions.extend(session.get("contributions", []))
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    for raw in session_contributions + contributions:
+        merged.setdefault(str(raw.get("id", raw.get("url", raw["title"]))), raw)
+    logging.debug(
+        f"Fetched {len(merged)} contributions for {event_url} from "
+        f"{len(session_ids)} sessions"
+    )
+
+    return dict(event_info, contributions=sorted(merged.values(), key=_start_key))
+
+
+def _stream_contribution_items(
+    events: Iterable[Tuple[str, str, Any]],
+) -> Generator[Dict[str, Any], None, None]:
+    "Build each contribution dict from the parser events as it arrives"
+    builder: Optional[ijson.ObjectBuilder] = None
+    for prefix, event, value in events:
+        if prefix == "results.item.contributions.item" and event == "start_map":
+            builder = ijson.ObjectBuilder()
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == "results.item.contributions.item" and event == "end_map":
+                yield builder.value
+                builder = None
+        elif prefix == "results.item.contributions" and event == "end_array":
+            return
+
+
+def stream_indico_json(
+    event_url: str, max_age: Optional[timedelta] = None, refresh: bool = False
+) -> Tuple[Dict[str, Any], Generator[Dict[str, Any], None, None]]:
+    """Parse the contribution export for an indico event as it downloads, rather than
+    holding the whole thing in memory. The cache is used as for `load_indico_json`.
+
+    Args:
+        event_url (str): The URL of anything in the meeting
+        max_age (Optional[timedelta]): How old a cached copy can be before we check
+            with the server (defaults to `indico_max_age` in `config.py`).
+        refresh (bool): Ignore the cache and download the export again.
+
+    Returns:
+        Dict[str, Any]: The meeting info (everything but the contributions).
+        Generator[Dict[str, Any], None, None]: The raw contributions, one by one.
+    """
+    export = _open_export(event_url, max_age, refresh)
+
+    # The meeting info comes before the contributions, so build that first.
+    try:
+        events = ijson.parse(export, use_float=True)
+        info_builder = ijson.ObjectBuilder()
+        for prefix, event, value in events:
+            if (
+                prefix == "results.item"
+                and event == "map_key"
+                and value == "contributions"
+            ):
+                break
+            if prefix.startswith("results.item"):
+                info_builder.event(event, value)
+        info = info_builder.value if hasattr(info_builder, "value") else {}
+        if "title" not in info or "startDate" not in info:
+            raise ValueError(f"Indico export for {event_url} has no event information")
+    except BaseException:
+        export.close(False)
+        raise
+
+    def contributions() -> Generator[Dict[str, Any], None, None]:
+        completed = False
+        try:
+            yield from _stream_contribution_items(events)
+            # Read the rest of the export so the cached copy is complete.
+            for _ in events:
+                pass
+            completed = True
+        finally:
+            export.close(completed)
+
+    return info, contributions()
 
 
 class IndicoContribution(BaseModel):
@@ -148,41 +622,74 @@ class IndicoContribution(BaseModel):
     # The URL to the contribution
     url: Optional[str]
 
+    # The contribution id within the event
+    id: Optional[Union[int, str]] = None
+
+
+def _indico_datetime(
+    raw_date: Optional[Dict[str, Any]], timezone_name: Optional[str]
+) -> Optional[datetime]:
+    "Convert a raw indico date, falling back on `IndicoDate` to report a bad one"
+    if raw_date is None:
+        return None
+    try:
+        return _convert_date(
+            raw_date["date"], raw_date["time"], raw_date["tz"], timezone_name
+        )
+    except (KeyError, TypeError):
+        return IndicoDate.model_validate(raw_date).get_datetime(timezone_name)
+
+
+def _to_contribution(raw: Dict[str, Any], timezone_name: Optional[str]) -> Contribution:
+    """Build the contribution straight from the raw indico data, so it is validated
+    once (as a `Contribution`) rather than first as an `IndicoContribution`.
+    """
+    contrib_id = raw.get("id")
+    return Contribution(
+        title=raw.get("title"),
+        abstract=raw.get("description"),
+        type=raw.get("type"),
+        startDate=_indico_datetime(raw.get("startDate"), timezone_name),
+        endDate=_indico_datetime(raw.get("endDate"), timezone_name),
+        roomFullname=raw.get("roomFullname"),
+        url=raw.get("url"),
+        id=str(contrib_id) if contrib_id is not None else None,
+    )
+
+
+def convert_indico_contributions(
+    raw_contributions: Iterable[Dict[str, Any]], timezone_name: Optional[str]
+) -> Generator[Contribution, None, None]:
+    """Convert raw indico contributions, one at a time.
+
+    Args:
+        raw_contributions (Iterable[Dict[str, Any]]): Contributions as found in the
+            indico export.
+        timezone_name (Optional[str]): Timezone for the dates (None for the event's).
+
+    Yields:
+        Contribution: The contribution data.
+    """
+    for contrib in raw_contributions:
+        with span("indico.convert"):
+            converted = _to_contribution(contrib, timezone_name)
+        yield converted
+
 
 def indico_contributions(
-    event_data: Dict[str, Any], timezone_name: str
+    event_data: Dict[str, Any], timezone_name: Optional[str]
 ) -> Generator[Contribution, None, None]:
-    """Yields the contributions from the event data.
+    """Yields the contributions from the event data, each validated as it is
+    yielded.
 
     Args:
         event_data (Dict[str, Any]): The event data.
+        timezone_name (Optional[str]): Timezone for the dates (None for the event's).
 
     Yields:
-        Dict[str, Any]: The contribution data.
-    """
-    for contrib in event_data["contributions"]:
-        item = IndicoContribution(**contrib)
-        start_date = (
-            item.startDate.get_datetime(timezone_name)
-            if item.startDate is not None
-            else None
-        )
-        end_date = (
-            item.endDate.get_datetime(timezone_name)
-            if item.endDate is not None
-            else None
-        )
-
-        contribution = Contribution(
-            title=item.title,
-            abstract=item.description,
-            type=item.type,
-            startDate=start_date,
-            endDate=end_date,
-            roomFullname=item.roomFullname,
-            url=item.url,
-        )
-        yield contribution
+        Contribution: The contribution data.
+    """
+    yield from convert_indico_contributions(event_data["contributions"], timezone_name)
 
 
 def generate_ranking_csv_filename(event: Dict[str, Any]) -> Path:
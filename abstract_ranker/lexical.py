@@ -0,0 +1,206 @@
+import re
+from typing import Dict, Generator, Iterable, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from abstract_ranker.config import lexical_interest_thresholds
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+from abstract_ranker.llm_utils import LEXICAL_MODEL
+
+# BM25 parameters
+_K1 = 1.5
+_B = 0.75
+
+# Words that carry no topical information.
+_STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "based", "been", "but", "by", "can",
+    "e", "eg", "etc", "for", "from", "g", "has", "have", "in", "into", "is", "it",
+    "its", "new", "not", "of", "on", "or", "our", "over", "such", "than", "that",
+    "the", "their", "these", "this", "those", "to", "using", "was", "we", "which",
+    "while", "will", "with", "within",
+}  # fmt: skip
+
+_experiments = [
+    "ATLAS", "CMS", "LHCb", "ALICE", "Belle II", "BaBar", "MATHUSLA", "FASER",
+    "CODEX-b", "SHiP", "DUNE", "IceCube", "CDF", "D0", "ILC", "FCC", "EIC",
+]  # fmt: skip
+_experiment_pattern = re.compile(
+    r"\b(" + "|".join(re.escape(e) for e in _experiments) + r")\b"
+)
+
+
+def _tokenize(text: str) -> List[str]:
+    """Split text into lower case terms, dropping stop words and plural endings.
+
+    Args:
+        text (str): The text
+
+    Returns:
+        List[str]: The terms
+    """
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) < 2 or word in _STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def _term_matrix(docs: List[List[str]], vocabulary: Dict[str, int]) -> sp.csr_matrix:
+    """Build the (documents x terms) matrix of raw term counts, adding any new terms
+    to `vocabulary`.
+    """
+    indptr = [0]
+    indices: List[int] = []
+    for doc in docs:
+        for term in doc:
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float64)
+    m = sp.csr_matrix(
+        (data, np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+        shape=(len(docs), len(vocabulary)),
+    )
+    m.sum_duplicates()
+    return m
+
+
+def _normalize_rows(m: sp.csr_matrix) -> sp.csr_matrix:
+    "Scale each row to unit length (empty rows stay empty)"
+    norms = np.sqrt(np.asarray(m.multiply(m).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.csr_matrix(sp.diags(1.0 / norms) @ m)
+
+
+def lexical_scores(
+    texts: List[str], topics: List[str]
+) -> Tuple[np.ndarray, sp.csr_matrix, Dict[str, int]]:
+    """Cosine similarity between the BM25 weighted texts and each topic.
+
+    Args:
+        texts (List[str]): The documents (title and abstract)
+        topics (List[str]): The topic descriptions
+
+    Returns:
+        np.ndarray: (texts x topics) array of similarities, from 0 to 1.
+        sp.csr_matrix: The BM25 weighted (texts x terms) matrix.
+        Dict[str, int]: Term to column index.
+    """
+    vocabulary: Dict[str, int] = {}
+    counts = _term_matrix([_tokenize(t) for t in texts], vocabulary)
+    topic_counts = _term_matrix([_tokenize(t) for t in topics], vocabulary)
+    counts.resize((counts.shape[0], len(vocabulary)))
+
+    # Document frequency and BM25 idf for every term
+    n_docs = counts.shape[0]
+    df = np.bincount(counts.indices, minlength=len(vocabulary))
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+    # BM25 term weights, applied to the non-zero entries only
+    doc_length = np.asarray(counts.sum(axis=1)).ravel()
+    avg_length = doc_length.mean() if n_docs > 0 and doc_length.mean() > 0 else 1.0
+    row_length = np.repeat(doc_length, np.diff(counts.indptr))
+    tf = counts.data
+    counts.data = (
+        tf
+        * (_K1 + 1)
+        / (tf + _K1 * (1 - _B + _B * row_length / avg_length))
+        * idf[counts.indices]
+    )
+
+    # Topics are short - weight each term present by its idf.
+    topic_counts.data = idf[topic_counts.indices]
+
+    similarity = _normalize_rows(counts) @ _normalize_rows(topic_counts).T
+    return np.asarray(similarity.todense()), counts, vocabulary
+
+
+def _first_sentence(contrib: Contribution) -> str:
+    "A summary of no more than 200 characters"
+    if contrib.abstract is None or len(contrib.abstract) < 10:
+        return contrib.title
+    text = " ".join(contrib.abstract.split())
+    sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    return sentence if len(sentence) <= 200 else sentence[:197] + "..."
+
+
+def rank_lexical(
+    contributions: Iterable[Contribution],
+    interested_topics: List[str],
+    not_interested_topics: List[str],
+) -> Generator[Tuple[Contribution, AbstractLLMResponse], None, None]:
+    """Rank contributions against the topic lists with BM25 weighted cosine
+    similarity - no LLM, no network. All contributions are scored in one go.
+
+    Args:
+        contributions (Iterable[Contribution]): The contributions to rank
+        interested_topics (List[str]): Topics that make a contribution interesting
+        not_interested_topics (List[str]): Topics that make it uninteresting
+
+    Yields:
+        Tuple[Contribution, AbstractLLMResponse]: Each contribution with a synthetic
+            answer in the same form the LLMs give.
+    """
+    contribs = list(contributions)
+    if len(contribs) == 0:
+        return
+
+    topics = interested_topics + not_interested_topics
+    texts = [f"{c.title}\n{c.abstract or ''}" for c in contribs]
+    similarity, weights, vocabulary = lexical_scores(texts, topics)
+
+    n_interested = len(interested_topics)
+    interest_score = (
+        similarity[:, :n_interested].max(axis=1)
+        if n_interested > 0
+        else np.zeros(len(contribs))
+    )
+    not_interest_score = (
+        similarity[:, n_interested:].max(axis=1)
+        if len(not_interested_topics) > 0
+        else np.zeros(len(contribs))
+    )
+    best_topic = similarity.argmax(axis=1)
+
+    high = lexical_interest_thresholds["high"]
+    medium = lexical_interest_thresholds["medium"]
+    level = np.where(
+        not_interest_score > interest_score,
+        "low",
+        np.where(
+            interest_score >= high,
+            "high",
+            np.where(interest_score >= medium, "medium", "low"),
+        ),
+    )
+
+    # Confidence grows with the distance from the nearest level boundary.
+    distance = np.minimum(
+        np.abs(interest_score - high), np.abs(interest_score - medium)
+    )
+    confidence = np.clip(0.5 + distance / high, 0.0, 1.0)
+
+    terms = np.empty(len(vocabulary), dtype=object)
+    for term, index in vocabulary.items():
+        terms[index] = term
+
+    for i, contrib in enumerate(contribs):
+        row = weights.getrow(i)
+        keywords = [str(t) for t in terms[row.indices[np.argsort(-row.data)[:5]]]]
+        experiment = _experiment_pattern.search(texts[i])
+        topic = topics[best_topic[i]]
+
+        yield contrib, AbstractLLMResponse(
+            summary=_first_sentence(contrib),
+            experiment=experiment.group(1) if experiment else "",
+            keywords=keywords,
+            interest=str(level[i]),
+            explanation=f"Closest topic: '{topic}' "
+            f"(similarity {similarity[i, best_topic[i]]:.2f})",
+            confidence=float(confidence[i]),
+            unknown_terms=[],
+            source=LEXICAL_MODEL,
+        )
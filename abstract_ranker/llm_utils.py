@@ -1,59 +1,115 @@
-from typing import Any, Callable, Dict, List, Union
-
+import logging
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
+
+import joblib
+from filelock import FileLock
 from joblib import Memory
 
+from abstract_ranker import config
 from abstract_ranker.config import CACHE_DIR
 from abstract_ranker.data_model import AbstractLLMResponse
+from abstract_ranker.tracing import span
 
 memory_llm_query = Memory(CACHE_DIR / "llm_queries", verbose=0)
 memory_llm_summarize = Memory(CACHE_DIR / "llm_summaries", verbose=0)
 
+# The queries this process has in flight, keyed by the hash of their arguments. A
+# second identical query waits on the first one's future rather than going back to
+# the LLM. Finished queries are dropped - repeats come from the cache.
+_query_futures: Dict[str, "Future[AbstractLLMResponse]"] = {}
+_query_futures_lock = threading.Lock()
+
+
+def reset():
+    """Use for testing - forget all the queries made by this process"""
+    with _query_futures_lock:
+        _query_futures.clear()
+
 
 def local_query_gpt(
-    prompt: str, context: Dict[str, Union[str, List[str]]], model: str
+    prompt: str, context: Dict[str, Union[str, List[str]]], model: str, name: str
 ) -> AbstractLLMResponse:
+    from abstract_ranker.metrics import llm_request
     from abstract_ranker.openai_utils import query_gpt
 
-    return query_gpt(prompt, context, model)
+    with llm_request(name), span("llm.request", model=model):
+        return query_gpt(prompt, context, model)
 
 
 def local_query_hugging_face(
-    query: str, context: Dict[str, Union[str, List[str]]], model_name: str
+    query: str, context: Dict[str, Union[str, List[str]]], model_name: str, name: str
 ) -> AbstractLLMResponse:
     from abstract_ranker.local_llms import query_hugging_face
+    from abstract_ranker.metrics import llm_request
 
-    return query_hugging_face(query, context, model_name)
+    with llm_request(name), span("llm.request", model=model_name):
+        return query_hugging_face(query, context, model_name)
+
+
+# Set (for this thread only) while a streamed summary is stored in the summary
+# cache: the summary query returns it rather than asking the model again.
+_streamed_summary = threading.local()
 
 
 def local_summarize_gpt(
     query: str, context: Dict[str, str | List[str]], model: str
 ) -> str:
+    streamed: Optional[str] = getattr(_streamed_summary, "text", None)
+    if streamed is not None:
+        return streamed
+
     from abstract_ranker.openai_utils import summarize_gpt
 
     return summarize_gpt(query, context, model)
 
 
+def local_stream_summarize_gpt(
+    query: str, context: Dict[str, str | List[str]], model: str
+) -> Iterator[str]:
+    from abstract_ranker.openai_utils import stream_summarize_gpt
+
+    return stream_summarize_gpt(query, context, model)
+
+
 _llm_dispatch: Dict[str, Callable[[str, Dict[Any, Any]], AbstractLLMResponse]] = {
     "GPT4Turbo": lambda prompt, context: local_query_gpt(
-        prompt, context, "gpt-4-turbo"
+        prompt, context, "gpt-4-turbo", "GPT4Turbo"
+    ),
+    "GPT54mini": lambda prompt, context: local_query_gpt(
+        prompt, context, "gpt-5.4-mini", "GPT54mini"
+    ),
+    "GPT55": lambda prompt, context: local_query_gpt(
+        prompt, context, "gpt-5.5", "GPT55"
+    ),
+    "GPT4o": lambda prompt, context: local_query_gpt(
+        prompt, context, "gpt-4o", "GPT4o"
     ),
-    "GPT54mini": lambda prompt, context: local_query_gpt(prompt, context, "gpt-5.4-mini"),
-    "GPT55": lambda prompt, context: local_query_gpt(prompt, context, "gpt-5.5"),
-    "GPT4o": lambda prompt, context: local_query_gpt(prompt, context, "gpt-4o"),
     "GPT4o-mini": lambda prompt, context: local_query_gpt(
-        prompt, context, "gpt-4o-mini"
+        prompt, context, "gpt-4o-mini", "GPT4o-mini"
     ),
     "GPT35Turbo": lambda prompt, context: local_query_gpt(
-        prompt, context, "gpt-3.5-turbo"
+        prompt, context, "gpt-3.5-turbo", "GPT35Turbo"
     ),
     "phi3-mini": lambda prompt, context: local_query_hugging_face(
-        prompt, context, "microsoft/Phi-3-mini-4k-instruct"
+        prompt, context, "microsoft/Phi-3-mini-4k-instruct", "phi3-mini"
     ),
     "phi3p5-mini": lambda prompt, context: local_query_hugging_face(
-        prompt, context, "microsoft/Phi-3.5-mini-instruct"
+        prompt, context, "microsoft/Phi-3.5-mini-instruct", "phi3p5-mini"
     ),
     "phi3-small": lambda prompt, context: local_query_hugging_face(
-        prompt, context, "microsoft/Phi-3-small-8k-instruct"
+        prompt, context, "microsoft/Phi-3-small-8k-instruct", "phi3-small"
     ),
 }
 
@@ -67,6 +123,25 @@ _llm_summary_dispatch: Dict[str, Callable[[str, Dict[Any, Any]], str]] = {
     ),
 }
 
+_llm_summary_stream_dispatch: Dict[
+    str, Callable[[str, Dict[Any, Any]], Iterator[str]]
+] = {
+    "GPT4Turbo": lambda prompt, context: local_stream_summarize_gpt(
+        prompt, context, "gpt-4-turbo"
+    ),
+    "GPT4o": lambda prompt, context: local_stream_summarize_gpt(
+        prompt, context, "gpt-4o"
+    ),
+    "GPT4o-mini": lambda prompt, context: local_stream_summarize_gpt(
+        prompt, context, "gpt-4o-mini"
+    ),
+}
+
+
+# The LLM-free ranker (see `lexical.py`). It scores all contributions at once, so it
+# is not in the per-query dispatch table.
+LEXICAL_MODEL = "lexical"
+
 
 def get_llm_models() -> List[str]:
     """Get the available LLM models.
@@ -77,6 +152,41 @@ def get_llm_models() -> List[str]:
     return list(_llm_dispatch.keys())
 
 
+def get_ranking_models() -> List[str]:
+    """Get the models that can rank contributions: the LLMs, and the lexical ranker.
+
+    Returns:
+        List[str]: The available models.
+    """
+    return get_llm_models() + [LEXICAL_MODEL]
+
+
+# Rough cost (US$) of ranking one abstract (~1000 prompt tokens, ~150 completion
+# tokens) with each model. Models we don't know the price of are left out.
+_llm_query_cost: Dict[str, float] = {
+    "GPT4Turbo": 0.0145,
+    "GPT4o": 0.004,
+    "GPT4o-mini": 0.00025,
+    "GPT35Turbo": 0.0007,
+    "phi3-mini": 0.0,
+    "phi3p5-mini": 0.0,
+    "phi3-small": 0.0,
+    LEXICAL_MODEL: 0.0,
+}
+
+
+def get_query_cost(model: str) -> Optional[float]:
+    """Rough cost of ranking one abstract with a model.
+
+    Args:
+        model (str): Short name of the model
+
+    Returns:
+        Optional[float]: Cost in US$, or None if we do not know it.
+    """
+    return _llm_query_cost.get(model)
+
+
 @memory_llm_query.cache
 def _query_llm(
     prompt: str,
@@ -96,6 +206,21 @@ def _query_llm(
     return _llm_dispatch[model](prompt, context)
 
 
+def _query_lock_path(key: str) -> Path:
+    """Path of the lock file that guards the cache entry for query `key` across
+    processes.
+
+    Args:
+        key (str): The hash of the query arguments.
+
+    Returns:
+        Path: The lock file (its directory is created if needed).
+    """
+    lock_dir = config.CACHE_DIR / "locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    return lock_dir / f"{key}.lock"
+
+
 def query_llm(
     prompt: str,
     context: Dict[str, Union[str, List[str]]],
@@ -104,6 +229,12 @@ def query_llm(
 ) -> AbstractLLMResponse:
     """Query the given LLM for a summary.
 
+    Identical queries are only run once: a caller that asks for a query that
+    this process already has in flight waits for that result. When
+    the cache is in use a file lock on the query is held while it runs, so a
+    second process asking the same question waits and then picks the answer up
+    from the cache.
+
     Args:
         prompt (str): Prompt to use
         context (Dict[str, str]): The context and instructions
@@ -112,10 +243,39 @@ def query_llm(
     Returns:
         dict: The results, parsed as json.
     """
-    if not use_cache:
-        return _query_llm.__wrapped__(prompt, context, model)
-    else:
-        return _query_llm(prompt, context, model)
+    # A query that skips the cache must not be answered by one that uses it.
+    key = joblib.hash((prompt, context, model, use_cache))
+    assert key is not None
+
+    with _query_futures_lock:
+        future = _query_futures.get(key)
+        is_owner = future is None
+        if future is None:
+            future = Future()
+            _query_futures[key] = future
+
+    if not is_owner:
+        logging.debug(f"Waiting on identical query for '{context.get('title')}'")
+        return future.result()
+
+    try:
+        with span("llm.query", model=model, cached=use_cache):
+            if not use_cache:
+                result = _query_llm.__wrapped__(prompt, context, model)
+            else:
+                with FileLock(_query_lock_path(key)):
+                    result = _query_llm(prompt, context, model)
+    except BaseException as e:
+        # Let anyone waiting see the failure, but let the next caller try again.
+        with _query_futures_lock:
+            del _query_futures[key]
+        future.set_exception(e)
+        raise
+
+    with _query_futures_lock:
+        del _query_futures[key]
+    future.set_result(result)
+    return result
 
 
 @memory_llm_summarize.cache
@@ -143,8 +303,44 @@ def summarize_llm(
         use_cache(bool): Whether to use the cache or not.
     """
     if not use_cache:
-        response = _summarize_llm.__wrapped__[model](prompt, context)
+        response = _summarize_llm.__wrapped__(prompt, context, model)
     else:
         response = _summarize_llm(prompt, context, model)
 
     return response
+
+
+def summarize_llm_stream(
+    prompt: str, context: Dict[str, str], model: str, use_cache: bool
+) -> Generator[str, None, None]:
+    """Summarize the given context with the given model, yielding the summary as the
+    model writes it. A summary already in the cache is yielded at once, in one
+    piece; a new one is added to the cache once it is complete (so `summarize_llm`
+    finds it too).
+
+    Args:
+        prompt (str): The prompt to use.
+        context (Dict[str, str]): The context to use.
+        model (str): The model to use.
+        use_cache(bool): Whether to use the cache or not.
+
+    Yields:
+        str: The next piece of the summary.
+    """
+    if use_cache and _summarize_llm.check_call_in_cache(prompt, context, model):
+        yield _summarize_llm(prompt, context, model)
+        return
+
+    parts: List[str] = []
+    for part in _llm_summary_stream_dispatch[model](prompt, context):
+        parts.append(part)
+        yield part
+
+    if use_cache:
+        # Store the summary by "running" the cached query with the answer already
+        # in hand.
+        _streamed_summary.text = "".join(parts)
+        try:
+            _summarize_llm(prompt, context, model)
+        finally:
+            _streamed_summary.text = None
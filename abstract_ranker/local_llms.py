@@ -9,6 +9,8 @@ from pydantic import ValidationError
 from tenacity import retry, retry_if_exception_type, stop_after_attempt
 
 from abstract_ranker.data_model import AbstractLLMResponse
+from abstract_ranker.profiling import checkpoint
+from abstract_ranker.tracing import span
 
 _hf_models: Dict[str, Any] = {}
 
@@ -42,6 +44,7 @@ def create_pipeline(model_name: str):
         _hf_models[model_name] = pipeline(
             "text-generation", model=model, tokenizer=tokenizer, trust_remote_code=True
         )
+        checkpoint(f"{model_name} loaded")
 
     return _hf_models[model_name]
 
@@ -116,7 +119,8 @@ def query_hugging_face(
         "do_sample": True,
         "prefix_allowed_tokens_fn": prefix_function,
     }
-    full_result = pipe(messages, **generation_args)
+    with span("hf.generate", model=model_name):
+        full_result = pipe(messages, **generation_args)
     logger.debug(f"Result from hf inference for {context['title']}: {full_result}")
     result = full_result[0]["generated_text"]
     assert isinstance(result, str)
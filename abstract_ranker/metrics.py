@@ -0,0 +1,282 @@
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import (
+    Callable,
+    Deque,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from rich.console import Group, RenderableType
+from rich.panel import Panel
+from rich.table import Table
+
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+from abstract_ranker.llm_utils import get_query_cost
+
+# Latencies of this many recent requests are used for the p95.
+LATENCY_WINDOW = 200
+
+# Interest levels, in the order they are shown.
+_INTEREST_LEVELS = ["high", "medium", "low"]
+
+
+class RunMetrics:
+    """Counters for a ranking run, updated as contributions are ranked and LLM
+    requests are made, and read by the live dashboard. Updates are a few additions
+    under a lock - everything else is worked out when the dashboard is drawn.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        total: Optional[int] = None,
+        estimate: Optional[Callable[[], Optional[int]]] = None,
+    ):
+        """Start counting.
+
+        Args:
+            model (str): Short name of the model ranking, for the title (and to price
+                requests that don't say which model made them)
+            total (Optional[int]): Number of contributions, if known
+            estimate (Optional[Callable[[], Optional[int]]]): Asked for the best
+                estimate of the total if it isn't known up front.
+        """
+        self.model = model
+        self.total = total
+        self._estimate = estimate
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+        self.completed = 0
+        self.reused = 0
+        self.requests_started = 0
+        self.requests_finished = 0
+        self.requests_failed = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # Finished requests by the model that made them, to price them.
+        self.model_requests: Counter = Counter()
+        self.interest: Counter = Counter()
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+        # Requests started when the last contribution came out - if none were
+        # started since, the next one was answered without a new request.
+        self._requests_at_last = 0
+
+    def request_started(self):
+        with self._lock:
+            self.requests_started += 1
+
+    def request_finished(self, latency: float, ok: bool, model: Optional[str] = None):
+        with self._lock:
+            self.requests_finished += 1
+            self.model_requests[model if model is not None else self.model] += 1
+            if not ok:
+                self.requests_failed += 1
+            self._latencies.append(latency)
+
+    def add_tokens(self, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def ranked(self, summary: AbstractLLMResponse):
+        "Count a ranked contribution"
+        with self._lock:
+            self.completed += 1
+            if self.requests_started == self._requests_at_last:
+                self.reused += 1
+            self._requests_at_last = self.requests_started
+            self.interest[summary.interest] += 1
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    @property
+    def in_flight(self) -> int:
+        return self.requests_started - self.requests_finished
+
+    def p95_latency(self) -> Optional[float]:
+        "95th percentile latency (seconds) of the recent requests"
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) == 0:
+            return None
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+    def cost(self) -> Optional[float]:
+        "Estimated cost (US$) of the requests so far, each at its model's price"
+        with self._lock:
+            requests = dict(self.model_requests)
+        cost = 0.0
+        for model, count in (requests or {self.model: 0}).items():
+            per_query = get_query_cost(model)
+            if per_query is None:
+                return None
+            cost += per_query * count
+        return cost
+
+    def expected_total(self) -> Optional[int]:
+        if self._estimate is not None:
+            estimate = self._estimate()
+            if estimate is not None:
+                return estimate
+        return self.total
+
+    def eta(self) -> Optional[timedelta]:
+        "Time left, at the rate so far"
+        total = self.expected_total()
+        if total is None or self.completed == 0:
+            return None
+        rate = self.completed / self.elapsed
+        return timedelta(seconds=round(max(total - self.completed, 0) / rate))
+
+    def render(self) -> RenderableType:
+        "The dashboard panel"
+        elapsed = max(self.elapsed, 1e-6)
+        total = self.expected_total()
+        p95 = self.p95_latency()
+        cost = self.cost()
+        eta = self.eta()
+        tokens = self.prompt_tokens + self.completion_tokens
+
+        stats = Table.grid(padding=(0, 2))
+        stats.add_column(style="bold")
+        stats.add_column()
+        stats.add_row(
+            "Ranked",
+            f"{self.completed} of {total if total is not None else '?'} "
+            f"({self.reused} cached or re-used, {self.in_flight} in flight, "
+            f"{self.requests_failed} failed)",
+        )
+        stats.add_row(
+            "Throughput",
+            f"{self.completed / elapsed:.2f} contributions/s, "
+            f"{self.requests_finished / elapsed:.2f} requests/s, "
+            f"{tokens / elapsed:.0f} tokens/s",
+        )
+        stats.add_row(
+            "Latency",
+            f"p95 {p95:.2f}s" if p95 is not None else "no requests yet",
+        )
+        stats.add_row(
+            "Cost",
+            f"${cost:.3f} so far (estimated)" if cost is not None else "unknown",
+        )
+        stats.add_row(
+            "Elapsed",
+            f"{timedelta(seconds=round(elapsed))}"
+            + (f", ETA {eta}" if eta is not None else ""),
+        )
+
+        histogram = Table.grid(padding=(0, 2))
+        histogram.add_column(style="bold")
+        histogram.add_column()
+        histogram.add_column(justify="right")
+        most = max([self.interest[level] for level in _INTEREST_LEVELS] + [1])
+        for level in _INTEREST_LEVELS:
+            count = self.interest[level]
+            histogram.add_row(level, "█" * round(30 * count / most), str(count))
+
+        return Panel(Group(stats, "", histogram), title=f"Ranking with {self.model}")
+
+
+# The metrics of the run being shown, if any. The request hooks below do nothing
+# when there is none.
+_active: Optional[RunMetrics] = None
+
+
+@contextmanager
+def llm_request(model: Optional[str] = None):
+    """Time an LLM request (not one answered from the cache) for the dashboard.
+
+    Args:
+        model (Optional[str]): Short name of the model asked, to price the request
+            (None for the model the run is ranking with).
+    """
+    metrics = _active
+    if metrics is None:
+        yield
+        return
+
+    metrics.request_started()
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        metrics.request_finished(time.perf_counter() - start, ok, model)
+
+
+def record_tokens(prompt_tokens: int, completion_tokens: int):
+    "Count the tokens a request used, for the dashboard"
+    metrics = _active
+    if metrics is not None:
+        metrics.add_tokens(prompt_tokens, completion_tokens)
+
+
+@contextmanager
+def _logging_above(stream):
+    "Send logging that goes to the terminal through `stream` for now"
+    moved: List[Tuple[logging.StreamHandler, object]] = []
+    for handler in logging.getLogger().handlers:
+        if (
+            isinstance(handler, logging.StreamHandler)
+            and handler.stream in (sys.__stderr__, sys.__stdout__)
+            and handler.stream is not stream
+        ):
+            moved.append((handler, handler.stream))
+            handler.setStream(stream)
+    try:
+        yield
+    finally:
+        for handler, original in moved:
+            handler.setStream(original)
+
+
+def live_dashboard(
+    rankings: Iterable[Tuple[Contribution, AbstractLLMResponse]],
+    model: str,
+    total: Optional[int] = None,
+    estimate: Optional[Callable[[], Optional[int]]] = None,
+) -> Generator[Tuple[Contribution, AbstractLLMResponse], None, None]:
+    """Show a live panel of the run's progress (counts, throughput, latency, cost,
+    ETA and interest levels) while the rankings pass through. Log messages are
+    printed above the panel.
+
+    Args:
+        rankings (Iterable[Tuple[Contribution, AbstractLLMResponse]]): The rankings
+        model (str): Short name of the model
+        total (Optional[int]): Number of contributions, if known
+        estimate (Optional[Callable[[], Optional[int]]]): Asked for the best estimate
+            of the total if it isn't known up front.
+
+    Yields:
+        Tuple[Contribution, AbstractLLMResponse]: The rankings, unchanged.
+    """
+    from rich.live import Live
+
+    global _active
+    metrics = RunMetrics(model, total, estimate)
+    _active = metrics
+    try:
+        with Live(get_renderable=metrics.render, refresh_per_second=4):
+            # On a terminal `Live` swaps `sys.stderr` for one that prints above
+            # the panel.
+            with _logging_above(sys.stderr):
+                for contrib, summary in rankings:
+                    metrics.ranked(summary)
+                    yield contrib, summary
+    finally:
+        _active = None
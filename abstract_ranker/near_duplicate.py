@@ -0,0 +1,262 @@
+import hashlib
+import logging
+import random
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import joblib
+
+from abstract_ranker import config
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+
+# MinHash signature length, and how it is cut into LSH bands. With 32 bands of 4
+# rows, pairs with a similarity of ~0.5 or better almost always share a bucket.
+_NUM_PERMUTATIONS = 128
+_BANDS = 32
+_ROWS = _NUM_PERMUTATIONS // _BANDS
+
+# Mersenne prime for the universal hash family used as permutations.
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed so signatures are comparable from one run to the next.
+_rng = random.Random(20240311)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(_NUM_PERMUTATIONS)
+]
+
+# Shingle size (in words)
+_SHINGLE_SIZE = 3
+
+# Abstracts shorter than this carry too little text to call anything a duplicate.
+_MIN_ABSTRACT_LENGTH = 10
+
+
+def _shingles(text: str) -> List[int]:
+    """Hash the overlapping word n-grams of `text`.
+
+    Args:
+        text (str): Text to shingle
+
+    Returns:
+        List[int]: 32 bit hash of each distinct shingle.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < _SHINGLE_SIZE:
+        words = words + [""] * (_SHINGLE_SIZE - len(words))
+    shingles = {
+        " ".join(words[i : i + _SHINGLE_SIZE])
+        for i in range(len(words) - _SHINGLE_SIZE + 1)
+    }
+    return [
+        int.from_bytes(
+            hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little"
+        )
+        for s in shingles
+    ]
+
+
+def minhash_signature(text: str) -> Tuple[int, ...]:
+    """Build the MinHash signature of a piece of text.
+
+    Args:
+        text (str): The text
+
+    Returns:
+        Tuple[int, ...]: The signature, `_NUM_PERMUTATIONS` long.
+    """
+    hashes = _shingles(text)
+    return tuple(
+        min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimated_similarity(sig_1: Tuple[int, ...], sig_2: Tuple[int, ...]) -> float:
+    """Estimate the Jaccard similarity of two texts from their signatures.
+
+    Args:
+        sig_1 (Tuple[int, ...]): Signature of the first text
+        sig_2 (Tuple[int, ...]): Signature of the second text
+
+    Returns:
+        float: Fraction of signature slots that agree (0 to 1).
+    """
+    return sum(1 for a, b in zip(sig_1, sig_2) if a == b) / len(sig_1)
+
+
+def _contribution_text(contrib: Contribution) -> Optional[str]:
+    "Text we compare contributions on, or None if there is not enough of it"
+    if contrib.abstract is None or len(contrib.abstract) < _MIN_ABSTRACT_LENGTH:
+        return None
+    return f"{contrib.title}\n{contrib.abstract}"
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of the contributions we have already ranked with a model, so
+    that a resubmitted abstract with small edits can re-use the earlier answer rather
+    than paying for a new query.
+    """
+
+    def __init__(self, threshold: float, path: Optional[Path] = None):
+        """Create an empty index.
+
+        Args:
+            threshold (float): Minimum estimated similarity to count as a duplicate.
+            path (Optional[Path]): Where `save` writes the index.
+        """
+        self.threshold = threshold
+        self.path = path
+
+        # Title, text hash, signature and answer for every entry.
+        self._titles: List[str] = []
+        self._text_hashes: List[str] = []
+        self._signatures: List[Tuple[int, ...]] = []
+        self._responses: List[AbstractLLMResponse] = []
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+        self._known_text_hashes: Set[str] = set()
+
+        # Counts for this run
+        self.checked = 0
+        self.reused = 0
+
+    @classmethod
+    def for_model(
+        cls, model: str, prompt: str, topics: List[str], threshold: float
+    ) -> "NearDuplicateIndex":
+        """Load the persistent index for answers from `model` given this prompt and
+        these topics (answers to a different question can't be re-used).
+
+        Args:
+            model (str): Short name of the model
+            prompt (str): The ranking prompt
+            topics (List[str]): The interested and not interested topics
+            threshold (float): Minimum estimated similarity to count as a duplicate.
+
+        Returns:
+            NearDuplicateIndex: The index, empty if none has been saved yet.
+        """
+        key = joblib.hash((model, prompt, topics))
+        path = config.CACHE_DIR / "near_duplicates" / f"{model}-{key}.pkl"
+
+        index = cls(threshold, path)
+        if path.exists():
+            try:
+                index._load(path)
+            except Exception as e:
+                logging.warning(f"Unable to read near-duplicate index {path}: {e}")
+        return index
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        return [
+            (band, hash(signature[band * _ROWS : (band + 1) * _ROWS]))
+            for band in range(_BANDS)
+        ]
+
+    def lookup(self, contrib: Contribution) -> Optional[AbstractLLMResponse]:
+        """Find an already ranked contribution that is nearly the same as this one.
+
+        Exact matches are ignored - those are the job of the query cache.
+
+        Args:
+            contrib (Contribution): The contribution we are about to rank.
+
+        Returns:
+            Optional[AbstractLLMResponse]: The earlier answer (with `source` noting
+                it was re-used), or None if there is no near-duplicate.
+        """
+        text = _contribution_text(contrib)
+        if text is None or len(self) == 0:
+            return None
+        self.checked += 1
+
+        text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if text_hash in self._known_text_hashes:
+            return None
+
+        signature = minhash_signature(text)
+        candidates = {
+            i for key in self._band_keys(signature) for i in self._buckets.get(key, [])
+        }
+
+        best: Optional[Tuple[float, int]] = None
+        for i in candidates:
+            similarity = estimated_similarity(signature, self._signatures[i])
+            if similarity >= self.threshold and (best is None or similarity > best[0]):
+                best = (similarity, i)
+
+        if best is None:
+            return None
+
+        similarity, i = best
+        self.reused += 1
+        logging.debug(
+            f"'{contrib.title}' is a near-duplicate ({similarity:.2f}) of "
+            f"'{self._titles[i]}'"
+        )
+        response = self._responses[i]
+        return response.model_copy(
+            update={
+                "source": f"{response.source} near-duplicate ({similarity:.2f}) of: "
+                f"{self._titles[i]}"
+            }
+        )
+
+    def add(self, contrib: Contribution, response: AbstractLLMResponse):
+        """Add a freshly ranked contribution to the index.
+
+        Args:
+            contrib (Contribution): The contribution
+            response (AbstractLLMResponse): What the model said about it
+        """
+        text = _contribution_text(contrib)
+        if text is None:
+            return
+        text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if text_hash in self._known_text_hashes:
+            return
+
+        self._insert(contrib.title, text_hash, minhash_signature(text), response)
+
+    def _insert(
+        self,
+        title: str,
+        text_hash: str,
+        signature: Tuple[int, ...],
+        response: AbstractLLMResponse,
+    ):
+        i = len(self._titles)
+        self._titles.append(title)
+        self._text_hashes.append(text_hash)
+        self._signatures.append(signature)
+        self._responses.append(response)
+        self._known_text_hashes.add(text_hash)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(i)
+
+    def save(self):
+        "Write the index to disk, if it has a home"
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(
+            {
+                "titles": self._titles,
+                "text_hashes": self._text_hashes,
+                "signatures": self._signatures,
+                "responses": self._responses,
+            },
+            self.path,
+        )
+
+    def _load(self, path: Path):
+        data = joblib.load(path)
+        for title, text_hash, signature, response in zip(
+            data["titles"], data["text_hashes"], data["signatures"], data["responses"]
+        ):
+            self._insert(title, text_hash, signature, response)
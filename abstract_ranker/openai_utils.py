@@ -1,15 +1,22 @@
 # Config items
 import logging
+import os
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Generator, List
 
 import openai
 
 from abstract_ranker.data_model import AbstractLLMResponse
+from abstract_ranker.metrics import record_tokens
+from abstract_ranker.tracing import span
 
 
 def get_key():
-    return Path(".openai_key").read_text().strip()
+    "The API key: from `.openai_key`, or the `OPENAI_API_KEY` environment variable"
+    key_file = Path(".openai_key")
+    if not key_file.exists() and "OPENAI_API_KEY" in os.environ:
+        return os.environ["OPENAI_API_KEY"]
+    return key_file.read_text().strip()
 
 
 def query_gpt(
@@ -29,85 +36,110 @@ def query_gpt(
     schema = {k: v["title"] for k, v in schema.items()}
 
     # Generate the completion using OpenAI
-    openai_client = openai.OpenAI(api_key=get_key())
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a helpful assistant and expert in the field of experimental "
-                "particle physics. All responses must be in the JSON format specified. Your responses are short and to the point.",
-            },
-            {"role": "user", "content": prompt},
-            {
-                "role": "user",
-                "content": "Topics I'm very interested in\n - "
-                + "\n - ".join(context["interested_topics"]),
-            },
-            {
-                "role": "user",
-                "content": "Topics I'm not at all interested in\n - "
-                + "\n - ".join(context["not_interested_topics"]),
-            },
-            {
-                "role": "user",
-                "content": f'Conference Talk Title: "{context["title"]}"',
-            },
-            {
-                "role": "user",
-                "content": f'Conference Talk Abstract: "{context["abstract"]}"',
-            },
-            {
-                "role": "user",
-                "content": "Your answer should be correct JSON using in the following JSON schema."
-                " Everything should be short and succinct with no emoji, and properly escape "
-                "latex directives. This is a JSON schema, so "
-                "replace the title and type dict with the actual data: \n"
-                f"{schema}",
-            },
-        ],
-        n=1,
-        stop=None,
-    )
+    with span("openai.round_trip", model=model):
+        openai_client = openai.OpenAI(api_key=get_key())
+        response = openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a helpful assistant and expert in the field of experimental "
+                    "particle physics. All responses must be in the JSON format specified. Your responses are short and to the point.",
+                },
+                {"role": "user", "content": prompt},
+                {
+                    "role": "user",
+                    "content": "Topics I'm very interested in\n - "
+                    + "\n - ".join(context["interested_topics"]),
+                },
+                {
+                    "role": "user",
+                    "content": "Topics I'm not at all interested in\n - "
+                    + "\n - ".join(context["not_interested_topics"]),
+                },
+                {
+                    "role": "user",
+                    "content": f'Conference Talk Title: "{context["title"]}"',
+                },
+                {
+                    "role": "user",
+                    "content": f'Conference Talk Abstract: "{context["abstract"]}"',
+                },
+                {
+                    "role": "user",
+                    "content": "Your answer should be correct JSON using in the following JSON schema."
+                    " Everything should be short and succinct with no emoji, and properly escape "
+                    "latex directives. This is a JSON schema, so "
+                    "replace the title and type dict with the actual data: \n"
+                    f"{schema}",
+                },
+            ],
+            n=1,
+            stop=None,
+        )
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record_tokens(usage.prompt_tokens, usage.completion_tokens)
 
     # Parse the YAML response
     r = response.choices[0].message.content
-    if r is not None:
-        # Remove leading text or trailing text
-        start_bracket = r.find("{")
-        if start_bracket != -1:
-            logging.debug(f"Removing header from response: {r[:start_bracket]}")
-            r = r[start_bracket:]
-
-        end_bracket = r.rfind("}")
-        if end_bracket != -1:
-            logging.debug(f"Removing trailer from response: {r[end_bracket:]}")
-            r = r[: end_bracket + 1]
-
-        # Escape any latex in there
-        r = r.replace("\\", "\\\\")
-
-        # Parse the response
-        try:
-            parsed_response = AbstractLLMResponse.model_validate_json(r)
-        except Exception as e:
-            logging.error(f"Bad JSON format for '{context['title']}': {r} ({e})")
-            raise
-
-    else:
-        parsed_response = AbstractLLMResponse(
-            summary="No response from {model}.",
-            experiment="",
-            keywords=[],
-            interest="",
-            explanation="",
-            confidence=0.0,
-            unknown_terms=[],
-        )
+    with span("openai.parse"):
+        if r is not None:
+            # Remove leading text or trailing text
+            start_bracket = r.find("{")
+            if start_bracket != -1:
+                logging.debug(f"Removing header from response: {r[:start_bracket]}")
+                r = r[start_bracket:]
+
+            end_bracket = r.rfind("}")
+            if end_bracket != -1:
+                logging.debug(f"Removing trailer from response: {r[end_bracket:]}")
+                r = r[: end_bracket + 1]
+
+            # Escape any latex in there
+            r = r.replace("\\", "\\\\")
+
+            # Parse the response
+            try:
+                parsed_response = AbstractLLMResponse.model_validate_json(r)
+            except Exception as e:
+                logging.error(f"Bad JSON format for '{context['title']}': {r} ({e})")
+                raise
+
+        else:
+            parsed_response = AbstractLLMResponse(
+                summary="No response from {model}.",
+                experiment="",
+                keywords=[],
+                interest="",
+                explanation="",
+                confidence=0.0,
+                unknown_terms=[],
+            )
 
     return parsed_response
 
 
+def _summary_messages(
+    prompt: str, context: Dict[str, str | List[str]]
+) -> List[Dict[str, str]]:
+    "The messages for a summary query"
+    # Build context:
+    c_text = f"""Meeting Minutes:
+{context['text']}
+    """
+
+    return [
+        {
+            "role": "system",
+            "content": "You are a helpful assistant and expert in the field of experimental "
+            "particle physics and computational particle physics. Your responses are short and to the point.",
+        },
+        {"role": "user", "content": prompt},
+        {"role": "user", "content": c_text},
+    ]
+
+
 def summarize_gpt(prompt: str, context: Dict[str, str | List[str]], model: str) -> str:
     """Summarize the given context with the given model.
 
@@ -119,24 +151,11 @@ def summarize_gpt(prompt: str, context: Dict[str, str | List[str]], model: str)
     Returns:
         str: The summary.
     """
-    # Build context:
-    c_text = f"""Meeting Minutes:
-{context['text']}
-    """
-
     # Query the model
     openai_client = openai.OpenAI(api_key=get_key())
     response = openai_client.chat.completions.create(
         model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a helpful assistant and expert in the field of experimental "
-                "particle physics and computational particle physics. Your responses are short and to the point.",
-            },
-            {"role": "user", "content": prompt},
-            {"role": "user", "content": c_text},
-        ],
+        messages=_summary_messages(prompt, context),  # type: ignore
         n=1,
         stop=None,
     )
@@ -145,3 +164,30 @@ def summarize_gpt(prompt: str, context: Dict[str, str | List[str]], model: str)
     if response.choices[0].message.content is None:
         return f"No response from {model}"
     return response.choices[0].message.content
+
+
+def stream_summarize_gpt(
+    prompt: str, context: Dict[str, str | List[str]], model: str
+) -> Generator[str, None, None]:
+    """Summarize the given context with the given model, yielding the text as the
+    model writes it.
+
+    Args:
+        prompt (str): The prompt to use.
+        context (Dict[str, str]): The context to use.
+        model (str): The model to use.
+
+    Yields:
+        str: The next piece of the summary.
+    """
+    openai_client = openai.OpenAI(api_key=get_key())
+    stream = openai_client.chat.completions.create(
+        model=model,
+        messages=_summary_messages(prompt, context),  # type: ignore
+        n=1,
+        stop=None,
+        stream=True,
+    )
+    for chunk in stream:
+        if len(chunk.choices) > 0 and chunk.choices[0].delta.content is not None:
+            yield chunk.choices[0].delta.content
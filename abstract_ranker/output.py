@@ -1,19 +1,25 @@
 import csv
+import json
 import logging
+import os
+from datetime import timezone
 from pathlib import Path
-from typing import Generator, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
 
 from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+from abstract_ranker.tracing import span
 from abstract_ranker.utils import as_a_number
 
 
 def dump_to_csv_file(
     output_filename: Path,
-    data: Generator[Tuple[Contribution, AbstractLLMResponse], None, None],
+    data: Iterable[Tuple[Contribution, AbstractLLMResponse]],
     progress_bar: bool,
 ):
-    # Open the CSV file in write mode
-    with output_filename.open(mode="w", newline="", encoding="utf-8") as file:
+    # Write to a temporary file and move it into place once it is complete, so anyone
+    # reading the CSV never sees a half written file.
+    temp_filename = output_filename.with_name(output_filename.name + ".tmp")
+    with temp_filename.open(mode="w", newline="", encoding="utf-8") as file:
         writer = csv.writer(file)
 
         # Write the header row
@@ -31,6 +37,7 @@ def dump_to_csv_file(
                 "Type",
                 "Confidence",
                 "Unknown Terms",
+                "Source",
             ]
         )
 
@@ -38,31 +45,188 @@ def dump_to_csv_file(
         unknown_terms = set()
         for contrib, summary in data:
             # Write the row to the CSV file
-            writer.writerow(
-                [
-                    (
-                        contrib.startDate.strftime("%Y-%m-%d")
-                        if contrib.startDate
-                        else ""
-                    ),
-                    (
-                        contrib.startDate.strftime("%H:%M:%S")
-                        if contrib.startDate
-                        else ""
-                    ),
-                    contrib.roomFullname if contrib.roomFullname else "",
-                    contrib.title,
-                    summary.summary,
-                    contrib.url,
-                    summary.experiment,
-                    summary.keywords,
-                    as_a_number(summary.interest),
-                    contrib.type,
-                    summary.confidence,
-                    summary.unknown_terms,
-                ]
-            )
+            with span("output.write_row", format="csv"):
+                writer.writerow(
+                    [
+                        (
+                            contrib.startDate.strftime("%Y-%m-%d")
+                            if contrib.startDate
+                            else ""
+                        ),
+                        (
+                            contrib.startDate.strftime("%H:%M:%S")
+                            if contrib.startDate
+                            else ""
+                        ),
+                        contrib.roomFullname if contrib.roomFullname else "",
+                        contrib.title,
+                        summary.summary,
+                        contrib.url,
+                        summary.experiment,
+                        summary.keywords,
+                        as_a_number(summary.interest),
+                        contrib.type,
+                        summary.confidence,
+                        summary.unknown_terms,
+                        summary.source,
+                    ]
+                )
             unknown_terms.update(summary.unknown_terms)
+    os.replace(temp_filename, output_filename)
+
     # Print a message indicating the CSV file has been created
     logging.info(f"CSV file '{output_filename}' has been created.")
     logging.info(f"Unknown terms: {unknown_terms}")
+
+
+def _row(contrib: Contribution, summary: AbstractLLMResponse) -> Dict[str, Any]:
+    "One result as a record, with lists kept as lists"
+    return {
+        "id": contrib.id,
+        "start": contrib.startDate,
+        "end": contrib.endDate,
+        "room": contrib.roomFullname,
+        "title": contrib.title,
+        "summary": summary.summary,
+        "url": contrib.url,
+        "experiment": summary.experiment,
+        "keywords": list(summary.keywords),
+        "interest": as_a_number(summary.interest),
+        "type": contrib.type,
+        "confidence": summary.confidence,
+        "unknown_terms": list(summary.unknown_terms),
+        "source": summary.source,
+    }
+
+
+def dump_to_jsonl_file(
+    output_filename: Path,
+    data: Iterable[Tuple[Contribution, AbstractLLMResponse]],
+    progress_bar: bool,
+):
+    """Write one JSON object per line, as each result arrives. The lines go to
+    `<file>.tmp` (which can be followed while the ranking is still going), moved
+    into place once it is complete so a reader never sees a half written file.
+
+    Args:
+        output_filename (Path): The file to write
+        data (Iterable[Tuple[Contribution, AbstractLLMResponse]]): The results
+        progress_bar (bool): True if a progress bar is being shown
+    """
+    unknown_terms: Set[str] = set()
+    temp_filename = output_filename.with_name(output_filename.name + ".tmp")
+    with temp_filename.open(mode="w", encoding="utf-8") as file:
+        for contrib, summary in data:
+            with span("output.write_row", format="jsonl"):
+                row = _row(contrib, summary)
+                for k in ["start", "end"]:
+                    row[k] = row[k].isoformat() if row[k] is not None else None
+                file.write(json.dumps(row, ensure_ascii=False) + "\n")
+                file.flush()
+            unknown_terms.update(summary.unknown_terms)
+    os.replace(temp_filename, output_filename)
+
+    logging.info(f"JSONL file '{output_filename}' has been created.")
+    logging.info(f"Unknown terms: {unknown_terms}")
+
+
+# Rows buffered before they are written out as a parquet row group.
+PARQUET_ROW_GROUP_SIZE = 500
+
+
+def dump_to_parquet_file(
+    output_filename: Path,
+    data: Iterable[Tuple[Contribution, AbstractLLMResponse]],
+    progress_bar: bool,
+):
+    """Write a parquet file with proper list columns. Results are written a row group
+    at a time as they arrive, so memory use stays bounded. Needs `pyarrow`.
+
+    Args:
+        output_filename (Path): The file to write
+        data (Iterable[Tuple[Contribution, AbstractLLMResponse]]): The results
+        progress_bar (bool): True if a progress bar is being shown
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Writing parquet files needs pyarrow (pip install conference-llm-tools[parquet])"
+        ) from e
+
+    schema = pa.schema(
+        [
+            ("id", pa.string()),
+            ("start", pa.timestamp("s", tz="UTC")),
+            ("end", pa.timestamp("s", tz="UTC")),
+            ("room", pa.string()),
+            ("title", pa.string()),
+            ("summary", pa.string()),
+            ("url", pa.string()),
+            ("experiment", pa.string()),
+            ("keywords", pa.list_(pa.string())),
+            ("interest", pa.int8()),
+            ("type", pa.string()),
+            ("confidence", pa.float64()),
+            ("unknown_terms", pa.list_(pa.string())),
+            ("source", pa.string()),
+        ]
+    )
+
+    unknown_terms: Set[str] = set()
+    rows: List[Dict[str, Any]] = []
+    temp_filename = output_filename.with_name(output_filename.name + ".tmp")
+    with pq.ParquetWriter(temp_filename, schema) as writer:
+        for contrib, summary in data:
+            row = _row(contrib, summary)
+            for k in ["start", "end"]:
+                if row[k] is not None and row[k].tzinfo is not None:
+                    row[k] = row[k].astimezone(timezone.utc)
+            rows.append(row)
+            unknown_terms.update(summary.unknown_terms)
+            if len(rows) >= PARQUET_ROW_GROUP_SIZE:
+                with span("output.write_row_group", rows=len(rows)):
+                    writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                rows.clear()
+        if len(rows) > 0:
+            with span("output.write_row_group", rows=len(rows)):
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+    os.replace(temp_filename, output_filename)
+
+    logging.info(f"Parquet file '{output_filename}' has been created.")
+    logging.info(f"Unknown terms: {unknown_terms}")
+
+
+# The output formats, with their file suffix and writer.
+OUTPUT_FORMATS: Dict[
+    str,
+    Tuple[
+        str,
+        Callable[
+            [Path, Iterable[Tuple[Contribution, AbstractLLMResponse]], bool], None
+        ],
+    ],
+] = {
+    "csv": (".csv", dump_to_csv_file),
+    "jsonl": (".jsonl", dump_to_jsonl_file),
+    "parquet": (".parquet", dump_to_parquet_file),
+}
+
+
+def dump_rankings(
+    output_filename: Path,
+    data: Iterable[Tuple[Contribution, AbstractLLMResponse]],
+    progress_bar: bool,
+    output_format: str = "csv",
+):
+    """Write the results in one of the `OUTPUT_FORMATS`.
+
+    Args:
+        output_filename (Path): The file to write
+        data (Iterable[Tuple[Contribution, AbstractLLMResponse]]): The results
+        progress_bar (bool): True if a progress bar is being shown
+        output_format (str): One of the `OUTPUT_FORMATS`
+    """
+    _, writer = OUTPUT_FORMATS[output_format]
+    writer(output_filename, data, progress_bar)
@@ -0,0 +1,115 @@
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+
+
+class PrefilterRule(BaseModel):
+    """A rule that marks a contribution as not worth asking the LLM about. A rule
+    matches only if all of the criteria it sets match.
+    """
+
+    # Name reported in the output and the hit counts
+    name: str
+
+    # Regular expression (case insensitive) matched against the contribution type
+    type: Optional[str] = None
+
+    # Regular expression (case insensitive) matched against the title
+    title: Optional[str] = None
+
+    # Regular expression (case insensitive) matched against the room
+    room: Optional[str] = None
+
+    # Matches if the abstract is shorter than this many characters
+    max_abstract_length: Optional[int] = None
+
+    # Matches if any of these words appear in the title or abstract
+    keywords: List[str] = []
+
+    def matches(self, contrib: Contribution) -> bool:
+        """Does this rule match the contribution?
+
+        Args:
+            contrib (Contribution): The contribution to test
+
+        Returns:
+            bool: True if every criterion the rule sets matches.
+        """
+        if self.type is not None and not re.search(
+            self.type, contrib.type or "", re.IGNORECASE
+        ):
+            return False
+        if self.title is not None and not re.search(
+            self.title, contrib.title, re.IGNORECASE
+        ):
+            return False
+        if self.room is not None and not re.search(
+            self.room, contrib.roomFullname or "", re.IGNORECASE
+        ):
+            return False
+        if (
+            self.max_abstract_length is not None
+            and len(contrib.abstract or "") >= self.max_abstract_length
+        ):
+            return False
+        if len(self.keywords) > 0:
+            text = f"{contrib.title}\n{contrib.abstract or ''}".lower()
+            if not any(
+                re.search(rf"\b{re.escape(k.lower())}\b", text) for k in self.keywords
+            ):
+                return False
+        return True
+
+
+class Prefilter:
+    """Screens contributions before they go to the LLM, answering the obviously
+    irrelevant ones (breaks, welcome talks, empty posters, ...) itself.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        """Build the pre-filter.
+
+        Args:
+            rules (List[Dict[str, Any]]): `PrefilterRule` fields for each rule, in
+                the order they should be tried.
+        """
+        self.rules = [PrefilterRule(**r) for r in rules]
+        self.hits: Counter = Counter()
+
+    def check(self, contrib: Contribution) -> Optional[AbstractLLMResponse]:
+        """Run the rules over a contribution.
+
+        Args:
+            contrib (Contribution): The contribution
+
+        Returns:
+            Optional[AbstractLLMResponse]: A low interest answer naming the rule that
+                matched, or None if the contribution should go to the LLM.
+        """
+        for rule in self.rules:
+            if rule.matches(contrib):
+                self.hits[rule.name] += 1
+                return AbstractLLMResponse(
+                    summary=contrib.title,
+                    experiment="",
+                    keywords=[],
+                    interest="low",
+                    explanation=f"Filtered by rule '{rule.name}'",
+                    confidence=1.0,
+                    unknown_terms=[],
+                    source=f"filter: {rule.name}",
+                )
+        return None
+
+    def summary(self) -> str:
+        """Hit counts for each rule.
+
+        Returns:
+            str: One line report.
+        """
+        counts = ", ".join(f"{r.name}: {self.hits[r.name]}" for r in self.rules)
+        return f"Pre-filtered {sum(self.hits.values())} contributions ({counts})."
@@ -0,0 +1,292 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from abstract_ranker import config
+
+# A function, as (file, first line, name).
+_Function = Tuple[str, int, str]
+
+# Allocation sites listed for what grew in each stage.
+_GROWTH_SITES = 5
+
+
+def rss_bytes() -> Optional[int]:
+    "Resident memory of this process now (peak so far where that isn't available)"
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def _mb(size: Optional[int]) -> str:
+    return f"{size / 1024**2:8.1f}" if size is not None else "       ?"
+
+
+class _Sampler(threading.Thread):
+    """Every `interval` seconds, record the stack of every other thread. Counts are
+    kept per function: where the thread was (self) and everything on its stack
+    (total). Stacks inside the profiler itself are left out."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="abstract_ranker profiler", daemon=True)
+        self.interval = interval
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack: List[_Function] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+
+                # Time spent taking memory snapshots is the profiler's, not the run's
+                if any(function[0] == __file__ for function in stack):
+                    continue
+                self.samples += 1
+                self.self_counts[stack[0]] += 1
+                self.total_counts.update(set(stack))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """Profile a whole run: a sampling CPU profiler on a background thread, and
+    RSS plus a `tracemalloc` snapshot at each stage boundary (`checkpoint`). Each
+    snapshot is boiled down to the top allocation sites and what grew since the
+    last one straight away, so the profiler itself holds little memory.
+    """
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        frames: Optional[int] = None,
+        top: Optional[int] = None,
+    ):
+        """Set up the profiler (it does nothing until `start`).
+
+        Args:
+            interval (Optional[float]): Seconds between CPU samples (defaults to
+                `profile_interval` in `config.py`).
+            frames (Optional[int]): Stack frames `tracemalloc` keeps for each
+                allocation (defaults to `profile_traceback_frames`).
+            top (Optional[int]): Lines in each ranked list of the report (defaults
+                to `profile_top`).
+        """
+        self._sampler = _Sampler(
+            interval if interval is not None else config.profile_interval
+        )
+        self._frames = frames if frames is not None else config.profile_traceback_frames
+        self.top = top if top is not None else config.profile_top
+
+        # (stage, seconds since start, rss, traced now, traced peak in the stage,
+        # top allocation sites as (site, size, blocks), growth as (site, size))
+        self.stages: List[
+            Tuple[
+                str,
+                float,
+                Optional[int],
+                int,
+                int,
+                List[Tuple[str, int, int]],
+                List[Tuple[str, int]],
+            ]
+        ] = []
+        self._start = 0.0
+        self._previous_sizes: Dict[str, int] = {}
+
+    def start(self):
+        self._start = time.perf_counter()
+        tracemalloc.start(self._frames)
+        self.checkpoint("start")
+        self._sampler.start()
+
+    def checkpoint(self, stage: str):
+        """Record memory at the end of a stage, and start the next one.
+
+        Args:
+            stage (str): The stage that just finished
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        when = time.perf_counter() - self._start
+        rss = rss_bytes()
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        statistics = snapshot.statistics("lineno")
+        del snapshot
+
+        sites = [
+            (f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", stat)
+            for stat in statistics
+        ]
+        sizes = {site: stat.size for site, stat in sites}
+        growth = sorted(
+            (
+                (site, size - self._previous_sizes.get(site, 0))
+                for site, size in sizes.items()
+                if size > self._previous_sizes.get(site, 0)
+            ),
+            key=lambda g: g[1],
+            reverse=True,
+        )
+
+        self.stages.append(
+            (
+                stage,
+                when,
+                rss,
+                current,
+                peak,
+                [(site, stat.size, stat.count) for site, stat in sites[: self.top]],
+                growth[:_GROWTH_SITES],
+            )
+        )
+        self._previous_sizes = sizes
+        tracemalloc.reset_peak()
+
+    def stop(self):
+        self._sampler.stop()
+        self.checkpoint("end")
+        tracemalloc.stop()
+
+    def report(self) -> str:
+        """The profile as text: the hot functions, memory by stage, the allocation
+        sites holding the most memory, and what grew in each stage.
+
+        Returns:
+            str: The report.
+        """
+        lines: List[str] = []
+        sampler = self._sampler
+        samples = max(sampler.samples, 1)
+
+        lines.append(
+            f"Hot functions ({sampler.samples} samples of all threads, every "
+            f"{sampler.interval * 1000:.0f} ms of wall clock time)"
+        )
+        lines.append(f"{'self %':>8} {'total %':>8}  function")
+        for function, count in sampler.self_counts.most_common(self.top):
+            self_percent = 100 * count / samples
+            total_percent = 100 * sampler.total_counts[function] / samples
+            lines.append(
+                f"{self_percent:8.1f} {total_percent:8.1f}  {_describe(function)}"
+            )
+        lines.append("")
+
+        lines.append("Memory by stage (MB)")
+        lines.append(
+            f"{'seconds':>8} {'RSS':>8} {'change':>8} {'traced':>8} {'peak':>8}  stage"
+        )
+        previous_rss: Optional[int] = None
+        for stage, when, rss, current, peak, _, _ in self.stages:
+            change = (
+                rss - previous_rss
+                if rss is not None and previous_rss is not None
+                else None
+            )
+            lines.append(
+                f"{when:8.2f} {_mb(rss)} {_mb(change)} {_mb(current)} {_mb(peak)}  "
+                f"{stage}"
+            )
+            previous_rss = rss
+        lines.append("")
+
+        # The allocation sites holding memory at the checkpoint where the most was
+        # held. tracemalloc can only snapshot at checkpoints, not at a stage's peak,
+        # so the peak column above can be higher.
+        if len(self.stages) > 0:
+            held_stage = max(self.stages, key=lambda s: s[3])
+            lines.append(
+                "Memory by allocation site at the checkpoint holding the most "
+                f"(after '{held_stage[0]}', {held_stage[3] / 1024**2:.1f} MB)"
+            )
+            lines.append(f"{'MB':>8} {'blocks':>8}  allocated at")
+            for site, size, count in held_stage[5]:
+                lines.append(f"{size / 1024**2:8.2f} {count:8d}  {site}")
+            lines.append("")
+
+        lines.append("Growth by stage")
+        for stage, *_, growth in self.stages[1:]:
+            if len(growth) == 0:
+                continue
+            lines.append(f"  {stage}:")
+            for site, size in growth:
+                lines.append(f"    {size / 1024**2:+8.2f} MB  {site}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _describe(function: _Function) -> str:
+    filename, line, name = function
+    return f"{name} ({filename}:{line})"
+
+
+# The profiler for this run, if profiling is on.
+_profiler: Optional[Profiler] = None
+
+
+def checkpoint(stage: str):
+    """Mark the end of a stage of the run for the profiler (if one is running).
+
+    Args:
+        stage (str): The stage that just finished
+    """
+    profiler = _profiler
+    if profiler is not None:
+        profiler.checkpoint(stage)
+
+
+def start_profiling() -> Profiler:
+    """Start profiling the run.
+
+    Returns:
+        Profiler: The running profiler.
+    """
+    global _profiler
+    _profiler = Profiler()
+    _profiler.start()
+    return _profiler
+
+
+def stop_profiling(report_file: Path) -> Optional[Profiler]:
+    """Stop profiling, and write the report.
+
+    Args:
+        report_file (Path): Where to write the report
+
+    Returns:
+        Optional[Profiler]: The profiler that was running, if any.
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return None
+    profiler.stop()
+    report_file.write_text(profiler.report(), encoding="utf-8")
+    print(f"Profile written to {report_file}")
+    return profiler
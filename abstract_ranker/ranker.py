@@ -1,7 +1,9 @@
 import argparse
 import logging
+from contextlib import ExitStack
+from functools import partial
 from pathlib import Path
-from typing import Generator, Optional
+from typing import Callable, Generator, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 import pytz
@@ -9,9 +11,19 @@ import tzlocal
 
 from abstract_ranker.config import (
     abstract_ranking_prompt,
+    cascade_confidence_threshold,
+    cascade_interest_threshold,
+    interested_topics,
+    near_duplicate_threshold,
+    not_interested_topics,
+    prefilter_rules,
+    profile_file,
 )
-from abstract_ranker.data_model import Contribution
-from abstract_ranker.llm_utils import get_llm_models
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+from abstract_ranker.llm_utils import LEXICAL_MODEL, get_ranking_models
+from abstract_ranker.output import OUTPUT_FORMATS
+from abstract_ranker.profiling import checkpoint
+from abstract_ranker.sorting import order_rankings, parse_sort_keys
 
 
 def _parse_timezone(cmd_tz_name: str) -> Optional[str]:
@@ -45,52 +57,300 @@ def _parse_timezone(cmd_tz_name: str) -> Optional[str]:
     return final_timezone
 
 
+def _rank_contributions(
+    args, contributions: Iterable[Contribution]
+) -> Generator[Tuple[Contribution, AbstractLLMResponse], None, None]:
+    """Rank contributions with everything the command line asks for (model, cascade,
+    pre-filter, near-duplicate re-use). Summaries are logged once all have been
+    ranked.
+
+    Args:
+        args (_type_): Command line arguments for common steering parameters.
+        contributions (Iterable[Contribution]): The contributions to rank.
+
+    Yields:
+        Tuple[Contribution, AbstractLLMResponse]: Each contribution and its ranking.
+    """
+    from abstract_ranker.driver import ModelCascade, process_contributions
+    from abstract_ranker.near_duplicate import NearDuplicateIndex
+    from abstract_ranker.prefilter import Prefilter
+
+    # Answers to near-duplicate abstracts are re-used, unless we are ignoring the cache.
+    near_duplicates = (
+        NearDuplicateIndex.for_model(
+            args.model,
+            abstract_ranking_prompt,
+            interested_topics + not_interested_topics,
+            args.near_duplicate_threshold,
+        )
+        if args.near_duplicate_threshold > 0
+        and not args.ignore_cache
+        and args.model != LEXICAL_MODEL
+        else None
+    )
+
+    cascade = (
+        ModelCascade(args.cascade, args.cascade_interest, args.cascade_confidence)
+        if args.cascade is not None
+        else None
+    )
+
+    prefilter = Prefilter(prefilter_rules) if not args.no_prefilter else None
+
+    yield from process_contributions(
+        contributions,
+        abstract_ranking_prompt,
+        args.model,
+        not args.ignore_cache,
+        near_duplicates=near_duplicates,
+        cascade=cascade,
+        prefilter=prefilter,
+    )
+    checkpoint("ranked")
+
+    if prefilter is not None:
+        logging.info(prefilter.summary())
+
+    if near_duplicates is not None:
+        near_duplicates.save()
+        logging.info(
+            f"Re-used near-duplicate answers for {near_duplicates.reused} of "
+            f"{near_duplicates.checked} contributions checked."
+        )
+
+
+def _rank_new_papers(
+    args, contributions: Iterable[Contribution], index
+) -> Generator[Tuple[Contribution, AbstractLLMResponse], None, None]:
+    """Rank only the arXiv papers not already in `index` (or whose abstract has
+    changed). The rest are carried forward with their earlier answer, or skipped.
+
+    Args:
+        args (_type_): Command line arguments for common steering parameters.
+        contributions (Iterable[Contribution]): The papers to rank.
+        index (ArxivRankedIndex): The papers already ranked.
+
+    Yields:
+        Tuple[Contribution, AbstractLLMResponse]: Each paper and its ranking.
+    """
+    carried: List[Tuple[Contribution, AbstractLLMResponse]] = []
+
+    def new_papers() -> Generator[Contribution, None, None]:
+        for contrib in contributions:
+            previous = index.lookup(contrib)
+            if previous is None:
+                yield contrib
+            elif args.seen == "carry":
+                carried.append((contrib, previous))
+
+    from abstract_ranker.driver import answered_by
+
+    for contrib, summary in _rank_contributions(args, new_papers()):
+        yield from carried
+        carried.clear()
+        # Answers from a cascade's cheap model or the pre-filter are not this
+        # model's, so they are not carried forward as if they were.
+        if answered_by(summary, args.model):
+            index.add(contrib, summary)
+        yield contrib, summary
+    yield from carried
+
+    index.save()
+    logging.info(
+        f"{index.seen} of {index.checked} arXiv papers were already ranked "
+        f"({'carried forward' if args.seen == 'carry' else 'skipped'})."
+    )
+
+
+def _record_rankings(
+    args,
+    rankings: Iterable[Tuple[Contribution, AbstractLLMResponse]],
+    event: Tuple[str, str],
+) -> Iterable[Tuple[Contribution, AbstractLLMResponse]]:
+    """Record the rankings in the results database as they pass through (unless
+    turned off on the command line).
+
+    Args:
+        args (_type_): Command line arguments for common steering parameters.
+        rankings (Iterable[Tuple[Contribution, AbstractLLMResponse]]): The rankings
+        event (Tuple[str, str]): The source (`indico`, `arxiv`) and event name.
+
+    Returns:
+        Iterable[Tuple[Contribution, AbstractLLMResponse]]: The same rankings.
+    """
+    if args.no_db:
+        return rankings
+
+    from abstract_ranker.results_db import record_rankings
+
+    return record_rankings(rankings, event[0], event[1], args.model)
+
+
+def _output_file(args, csv_file: Path) -> Path:
+    """The file we will actually write for `csv_file`.
+
+    Args:
+        args (_type_): Command line arguments for common steering parameters.
+        csv_file (Path): The default output file name.
+
+    Returns:
+        Path: The output file.
+    """
+    output_file = csv_file.with_suffix(OUTPUT_FORMATS[args.format][0])
+
+    # The lexical ranker is a quick first look while an LLM run is going - so don't
+    # write over the LLM's output file.
+    if args.model == LEXICAL_MODEL:
+        return output_file.with_name(
+            f"{output_file.stem} - lexical{output_file.suffix}"
+        )
+    return output_file
+
+
 def _generate_ranking_results(
     args,
-    number_contributions: int,
+    number_contributions: Optional[int],
     contributions: Generator[Contribution, None, None],
     csv_file: Path,
+    event: Tuple[str, str],
+    estimate: Optional[Callable[[], Optional[int]]] = None,
+    rank: Optional[
+        Callable[
+            [Iterable[Contribution]],
+            Iterable[Tuple[Contribution, AbstractLLMResponse]],
+        ]
+    ] = None,
 ):
     """Generate the ranking results.
 
     Args:
         args (_type_): Command line arguments for common steering parameters.
-        number_contributions (int): The total number of contributions.
+        number_contributions (Optional[int]): The total number of contributions, if
+            known.
         contributions (Generator[Contribution, None, None]): The list of contributions.
         csv_file (Path): Where we will write the csv file.
+        event (Tuple[str, str]): The source (`indico`, `arxiv`) and event name, for
+            the results database.
+        estimate (Optional[Callable[[], Optional[int]]]): If the total isn't known up
+            front, asked for the best estimate so far as the ranking goes.
+        rank (Optional[Callable]): Ranks the contributions (defaults to
+            `_rank_contributions`).
     """
-    from abstract_ranker.driver import process_contributions
-    from abstract_ranker.output import dump_to_csv_file
+    from abstract_ranker.output import dump_rankings
     from abstract_ranker.utils import progress_bar
 
-    if args.v == 0:
-        contributions = progress_bar(number_contributions, contributions)
+    if args.v == 0 and not args.dashboard:
+        contributions = progress_bar(number_contributions, contributions, estimate)
 
-    rankings = process_contributions(
-        contributions,
-        abstract_ranking_prompt,
-        args.model,
-        not args.ignore_cache,
+    rankings = (
+        rank(contributions)
+        if rank is not None
+        else _rank_contributions(args, contributions)
     )
+    if args.dashboard:
+        from abstract_ranker.metrics import live_dashboard
 
-    dump_to_csv_file(csv_file, rankings, args.v == 0)
+        rankings = live_dashboard(rankings, args.model, number_contributions, estimate)
+    rankings = _record_rankings(args, rankings, event)
+
+    dump_rankings(
+        _output_file(args, csv_file),
+        order_rankings(rankings, args.sort, args.top),
+        args.v == 0,
+        args.format,
+    )
+    checkpoint("written")
 
 
 def cmd_rank_indico(args):
     from abstract_ranker.indico import (
+        convert_indico_contributions,
         generate_ranking_csv_filename,
         indico_contributions,
         load_indico_json,
+        stream_indico_json,
     )
 
+    max_age = timedelta(minutes=args.max_age) if args.max_age is not None else None
+    if args.split and (args.stream or args.watch is not None):
+        raise ValueError("--split can't be used with --stream or --watch")
+
+    if args.watch is not None:
+        from abstract_ranker.watch import IndicoWatcher, watch_indico
+
+        watcher = IndicoWatcher(
+            args.indico_url,
+            args.tz,
+            lambda contributions: _record_rankings(
+                args,
+                _rank_contributions(args, contributions),
+                ("indico", watcher.event_info.get("title", args.indico_url)),
+            ),
+            args.ignore_cache,
+        )
+        watch_indico(
+            watcher,
+            lambda info: _output_file(args, generate_ranking_csv_filename(info)),
+            timedelta(minutes=args.watch),
+            output_format=args.format,
+            order=lambda rankings: order_rankings(rankings, args.sort, args.top),
+        )
+        return
+
+    if args.stream:
+        # Rank contributions as they arrive - the total isn't known up front.
+        event_info, raw_contributions = stream_indico_json(
+            args.indico_url, max_age, args.ignore_cache
+        )
+        csv_file = generate_ranking_csv_filename(event_info)
+        contributions = convert_indico_contributions(raw_contributions, args.tz)
+        _generate_ranking_results(
+            args, None, contributions, csv_file, ("indico", event_info["title"])
+        )
+        return
+
     # Build the pipe-line.
-    indico_data = load_indico_json(args.indico_url)
+    indico_data = load_indico_json(
+        args.indico_url, max_age, args.ignore_cache, args.split
+    )
     number_contributions = len(indico_data["contributions"])
     contributions = indico_contributions(indico_data, args.tz)
 
     csv_file = generate_ranking_csv_filename(indico_data)
 
-    _generate_ranking_results(args, number_contributions, contributions, csv_file)
+    _generate_ranking_results(
+        args,
+        number_contributions,
+        contributions,
+        csv_file,
+        ("indico", indico_data["title"]),
+    )
+
+
+def _parse_date(date_str: str) -> datetime:
+    """Parses a date given on the command line.
+
+    Args:
+        date_str (str): The date, as YYYY-MM-DD
+
+    Returns:
+        datetime: The start of that day.
+    """
+    return datetime.strptime(date_str, "%Y-%m-%d").replace(second=1)
+
+
+def _parse_day(date_str: str) -> datetime:
+    """Parses a date given on the command line, as the local midnight it starts at.
+
+    Args:
+        date_str (str): The date, as YYYY-MM-DD
+
+    Returns:
+        datetime: Midnight at the start of that day, in the local timezone.
+    """
+    return datetime.strptime(date_str, "%Y-%m-%d").replace(
+        tzinfo=tzlocal.get_localzone()
+    )
 
 
 def cmd_rank_arxiv(args):
@@ -103,18 +363,104 @@ def cmd_rank_arxiv(args):
     the_date = datetime.now() - timedelta(days=1)
     the_date = the_date.replace(hour=0, minute=0, second=1, microsecond=0)
 
+    first_day = args.from_date if args.from_date is not None else the_date
+    last_day = args.to_date if args.to_date is not None else max(first_day, the_date)
+    if last_day < first_day:
+        raise ValueError("--to must not be before --from")
+
     from abstract_ranker.arxiv import (
+        ArxivStream,
         arxiv_contributions,
         arxiv_ranked_filename,
-        load_arxiv_abstract,
     )
+    from abstract_ranker.arxiv_store import ArxivPaper
+
+    # Rank the submissions as they arrive - the total is estimated as pages come in.
+    arxiv_data = ArxivStream(
+        args.arxiv_categories, first_day, last_day, args.ignore_cache
+    )
+    papers: Iterable[ArxivPaper] = arxiv_data
+    csv_file = arxiv_ranked_filename(first_day, args.arxiv_categories, last_day)
+
+    # Papers ranked on an earlier day, or in another category, are not re-ranked.
+    rank = None
+    if not args.ignore_cache:
+        from abstract_ranker.arxiv_index import ArxivRankedIndex
+
+        index = ArxivRankedIndex.for_model(
+            args.model,
+            abstract_ranking_prompt,
+            interested_topics + not_interested_topics,
+        )
+        papers = index.track(papers)
+        rank = partial(_rank_new_papers, args, index=index)
+    contributions = arxiv_contributions(papers)
+
+    _generate_ranking_results(
+        args,
+        None,
+        contributions,
+        csv_file,
+        ("arxiv", " ".join(sorted(args.arxiv_categories))),
+        lambda: arxiv_data.estimated_total,
+        rank,
+    )
+
+
+def cmd_convert_arxiv_cache(args):
+    """Convert cached arXiv results from older versions to the compact shards.
+
+    Args:
+        args (): Command line arguments
+    """
+    from abstract_ranker.arxiv_store import convert_arxiv_cache
 
-    # Now load in the submissions.
-    arxiv_data = load_arxiv_abstract(args.arxiv_categories, the_date)
-    contributions = arxiv_contributions(arxiv_data)
-    csv_file = arxiv_ranked_filename(the_date, args.arxiv_categories)
+    written = convert_arxiv_cache()
+    print(f"Wrote {written} arXiv cache shards.")
 
-    _generate_ranking_results(args, len(arxiv_data), contributions, csv_file)
+
+def cmd_query(args):
+    """Search the rankings of all earlier runs.
+
+    Args:
+        args (): Command line arguments
+    """
+    from rich.console import Console
+    from rich.table import Table
+
+    from abstract_ranker.results_db import open_results_db, query_rankings
+
+    conn = open_results_db()
+    try:
+        rows = query_rankings(
+            conn,
+            text=args.text,
+            since=args.since,
+            until=args.until,
+            min_interest=args.interest,
+            source=args.source,
+            event=args.event,
+            model=args.query_model,
+            limit=args.limit,
+        )
+    except ValueError as e:
+        raise SystemExit(f"abstract_ranker query: error: {e}")
+    finally:
+        conn.close()
+
+    table = Table()
+    for column in ["Date", "Event", "Title", "Interest", "Summary", "Url"]:
+        table.add_column(column)
+    for row in rows:
+        table.add_row(
+            (row["start"] or "")[:10],
+            row["event"],
+            row["title"],
+            str(row["interest"]),
+            row["summary"],
+            row["url"] or "",
+        )
+    Console().print(table)
 
 
 def main():
@@ -126,7 +472,7 @@ def main():
         "-m",
         type=str,
         help="GPT model to use",
-        choices=get_llm_models(),
+        choices=get_ranking_models(),
         default="GPT4o",
     )
     parser.add_argument(
@@ -138,7 +484,106 @@ def main():
     parser.add_argument(
         "--ignore-cache",
         action="store_true",
-        help="Ignore the cache and re-run the queries",
+        help="Ignore the cache: re-run the queries and re-download indico events",
+        default=False,
+    )
+    parser.add_argument(
+        "--cascade",
+        type=str,
+        help="Rank everything with this cheap model first, and only re-rank the "
+        "interesting or uncertain contributions with --model",
+        choices=get_ranking_models(),
+        default=None,
+    )
+    parser.add_argument(
+        "--cascade-interest",
+        type=str,
+        help="Escalate contributions the cheap model ranks at least this interesting",
+        choices=["low", "medium", "high"],
+        default=cascade_interest_threshold,
+    )
+    parser.add_argument(
+        "--cascade-confidence",
+        type=float,
+        help="Escalate contributions the cheap model ranks with less confidence than "
+        "this (0 to 1)",
+        default=cascade_confidence_threshold,
+    )
+    parser.add_argument(
+        "--near-duplicate-threshold",
+        type=float,
+        help="Re-use the answer for an already ranked abstract at least this similar "
+        "(0 to 1). Use 0 to turn re-use off.",
+        default=near_duplicate_threshold,
+    )
+    parser.add_argument(
+        "--no-prefilter",
+        action="store_true",
+        help="Send every contribution to the model, even those the pre-filter rules in "
+        "config.py would mark as not interesting (breaks, welcome talks, ...)",
+        default=False,
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        help="Output file format. jsonl and parquet keep keywords and unknown terms as "
+        "lists (parquet needs pyarrow).",
+        choices=list(OUTPUT_FORMATS),
+        default="csv",
+    )
+    parser.add_argument(
+        "--dashboard",
+        action="store_true",
+        help="Show a live panel while ranking: counts, requests and tokens per "
+        "second, p95 latency, estimated cost, ETA and interest levels (works with "
+        "-v)",
+        default=False,
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        help="Write a Chrome trace-event file of where the run spent its time (open "
+        "it in chrome://tracing or ui.perfetto.dev)",
+        default=None,
+    )
+    parser.add_argument(
+        "--trace-otlp",
+        type=Path,
+        help="Write the same trace as OpenTelemetry (OTLP/JSON) spans to this file",
+        default=None,
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the run, and write a report of the hot functions, memory by "
+        "stage and the allocation sites holding the most memory",
+        default=False,
+    )
+    parser.add_argument(
+        "--profile-file",
+        type=Path,
+        help="Where --profile writes its report",
+        default=profile_file,
+    )
+    parser.add_argument(
+        "--sort",
+        type=parse_sort_keys,
+        help="Sort the output on these comma separated keys (interest, confidence, "
+        "start, title), e.g. interest,confidence. Without it results are written as "
+        "they are ranked.",
+        default=None,
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        help="Only write the best this many results (by --sort, or by interest then "
+        "confidence)",
+        default=None,
+    )
+    parser.add_argument(
+        "--no-db",
+        action="store_true",
+        help="Don't record the rankings in the results database",
         default=False,
     )
     parser.add_argument(
@@ -161,6 +606,35 @@ def main():
     rank_indico_parser.add_argument(
         "indico_url", type=str, help="URL of the indico event"
     )
+    rank_indico_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Start ranking while the event export is still downloading, keeping memory "
+        "use flat for very large events",
+        default=False,
+    )
+    rank_indico_parser.add_argument(
+        "--split",
+        action="store_true",
+        help="Fetch the event in pieces (timetable, then each session) in parallel, "
+        "for events too large for indico to export in one go",
+        default=False,
+    )
+    rank_indico_parser.add_argument(
+        "--max-age",
+        type=float,
+        help="Minutes a cached copy of the event can be used before checking with "
+        "indico for changes (default from config.py)",
+        default=None,
+    )
+    rank_indico_parser.add_argument(
+        "--watch",
+        type=float,
+        metavar="MINUTES",
+        help="Keep polling the event every MINUTES minutes, ranking only new or changed "
+        "contributions and rewriting the csv file (Ctrl-C to stop)",
+        default=None,
+    )
     rank_indico_parser.set_defaults(func=cmd_rank_indico)
 
     rank_arxiv_parser = subparsers.add_parser(
@@ -174,9 +648,97 @@ def main():
     rank_arxiv_parser.add_argument(
         "arxiv_categories", type=str, nargs="+", help="List of arxiv categories"
     )
+    rank_arxiv_parser.add_argument(
+        "--from",
+        dest="from_date",
+        type=_parse_date,
+        metavar="YYYY-MM-DD",
+        help="First submission day to rank (default: yesterday)",
+        default=None,
+    )
+    rank_arxiv_parser.add_argument(
+        "--to",
+        dest="to_date",
+        type=_parse_date,
+        metavar="YYYY-MM-DD",
+        help="Last submission day to rank (default: yesterday, or --from if later)",
+        default=None,
+    )
+    rank_arxiv_parser.add_argument(
+        "--seen",
+        type=str,
+        choices=["carry", "skip"],
+        help="What to do with papers already ranked on an earlier run (cross-listed, "
+        "or a new version with the same abstract): carry their ranking forward into "
+        "the csv file, or leave them out",
+        default="carry",
+    )
     rank_arxiv_parser.set_defaults(func=cmd_rank_arxiv)
 
+    convert_arxiv_parser = subparsers.add_parser(
+        "convert_arxiv_cache",
+        help="Convert cached arXiv results from older versions to the compact format",
+    )
+    convert_arxiv_parser.set_defaults(func=cmd_convert_arxiv_cache)
+
+    query_parser = subparsers.add_parser(
+        "query",
+        help="Search the rankings from all earlier runs",
+        description="""
+    Search the results database every run records into. For example, all high interest
+    LLP talks since 2024: query LLP --interest high --since 2024-01-01""",
+    )
+    query_parser.add_argument(
+        "text",
+        type=str,
+        nargs="?",
+        help="Words to find in the title, summary, keywords or explanation (sqlite "
+        'FTS5 syntax: AND, OR, NOT, "phrases", prefix*)',
+        default=None,
+    )
+    query_parser.add_argument(
+        "--since",
+        type=_parse_day,
+        metavar="YYYY-MM-DD",
+        help="Only contributions starting on or after this day (local time)",
+        default=None,
+    )
+    query_parser.add_argument(
+        "--until",
+        type=_parse_day,
+        metavar="YYYY-MM-DD",
+        help="Only contributions starting before this day (local time)",
+        default=None,
+    )
+    query_parser.add_argument(
+        "--interest",
+        type=str,
+        choices=["low", "medium", "high"],
+        help="Minimum interest",
+        default=None,
+    )
+    query_parser.add_argument(
+        "--source", type=str, choices=["indico", "arxiv"], default=None
+    )
+    query_parser.add_argument(
+        "--event", type=str, help="Part of the event name", default=None
+    )
+    query_parser.add_argument(
+        "--ranked-by",
+        dest="query_model",
+        type=str,
+        help="Only rankings from this model",
+        default=None,
+    )
+    query_parser.add_argument("--limit", type=int, default=50)
+    query_parser.set_defaults(func=cmd_query)
+
     args = parser.parse_args()
+    if args.cascade is not None and args.model == LEXICAL_MODEL:
+        parser.error(
+            "--model lexical can only be the cheap first tier of a cascade "
+            "(--cascade lexical)"
+        )
 
     # Turn on logging. If the verbosity is 1, set the logging level to INFO. If the verbosity is 2,
     # set the logging level to DEBUG.
@@ -191,7 +753,23 @@ def main():
 
     # Next, call the appropriate command function.
     func = args.func
-    func(args)
+    with ExitStack() as stack:
+        if args.profile:
+            from abstract_ranker.profiling import start_profiling, stop_profiling
+
+            start_profiling()
+            stack.callback(stop_profiling, args.profile_file)
+
+        if args.trace is not None or args.trace_otlp is not None:
+            from abstract_ranker.tracing import span, start_tracing, stop_tracing
+
+            start_tracing()
+            stack.callback(stop_tracing, args.trace, args.trace_otlp)
+            stack.enter_context(
+                span("ranker.run", command=args.command, model=args.model)
+            )
+
+        func(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,286 @@
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Generator, Iterable, List, Optional, Tuple
+
+from abstract_ranker import config
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+from abstract_ranker.utils import as_a_number
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rankings (
+    key TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    event TEXT NOT NULL,
+    model TEXT NOT NULL,
+    contribution_id TEXT,
+    start TEXT,
+    room TEXT,
+    title TEXT NOT NULL,
+    url TEXT,
+    type TEXT,
+    summary TEXT,
+    experiment TEXT,
+    keywords TEXT,
+    interest INTEGER,
+    confidence REAL,
+    explanation TEXT,
+    unknown_terms TEXT,
+    provenance TEXT,
+    ranked_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rankings_source ON rankings (source);
+CREATE INDEX IF NOT EXISTS rankings_event ON rankings (event);
+CREATE INDEX IF NOT EXISTS rankings_start ON rankings (start);
+CREATE INDEX IF NOT EXISTS rankings_interest ON rankings (interest);
+CREATE INDEX IF NOT EXISTS rankings_model ON rankings (model);
+CREATE VIRTUAL TABLE IF NOT EXISTS rankings_fts USING fts5(
+    title, summary, keywords, explanation
+);
+"""
+
+# Columns filled in from each ranked contribution.
+_COLUMNS = [
+    "key",
+    "source",
+    "event",
+    "model",
+    "contribution_id",
+    "start",
+    "room",
+    "title",
+    "url",
+    "type",
+    "summary",
+    "experiment",
+    "keywords",
+    "interest",
+    "confidence",
+    "explanation",
+    "unknown_terms",
+    "provenance",
+    "ranked_at",
+]
+
+# Rows written between commits.
+_COMMIT_EVERY = 50
+
+
+def open_results_db(path: Optional[Path] = None) -> sqlite3.Connection:
+    """Open (creating if need be) the results database.
+
+    Args:
+        path (Optional[Path]): The database file (defaults to `results_db` in
+            `config.py`).
+
+    Returns:
+        sqlite3.Connection: The connection, with rows returned as `sqlite3.Row`.
+    """
+    path = path if path is not None else config.results_db
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _db_time(when: Optional[datetime]) -> Optional[str]:
+    "Times are stored in UTC (if they have a timezone) so they sort and compare"
+    if when is None:
+        return None
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when.isoformat(sep=" ", timespec="seconds")
+
+
+def upsert_ranking(
+    conn: sqlite3.Connection,
+    source: str,
+    event: str,
+    model: str,
+    contrib: Contribution,
+    summary: AbstractLLMResponse,
+):
+    """Add a ranked contribution, replacing any earlier ranking of it for the same
+    event and model.
+
+    Args:
+        conn (sqlite3.Connection): The results database
+        source (str): Where the contribution came from (`indico`, `arxiv`)
+        event (str): The event (or arXiv categories) it is part of
+        model (str): The model that ranked it
+        contrib (Contribution): The contribution
+        summary (AbstractLLMResponse): The ranking
+    """
+    identity = contrib.id or contrib.url or contrib.title
+    row = {
+        "key": f"{source}\t{event}\t{identity}\t{model}",
+        "source": source,
+        "event": event,
+        "model": model,
+        "contribution_id": contrib.id,
+        "start": _db_time(contrib.startDate),
+        "room": contrib.roomFullname,
+        "title": contrib.title,
+        "url": contrib.url,
+        "type": contrib.type,
+        "summary": summary.summary,
+        "experiment": summary.experiment,
+        "keywords": json.dumps(summary.keywords),
+        "interest": as_a_number(summary.interest),
+        "confidence": summary.confidence,
+        "explanation": summary.explanation,
+        "unknown_terms": json.dumps(summary.unknown_terms),
+        "provenance": summary.source,
+        "ranked_at": _db_time(datetime.now(timezone.utc)),
+    }
+
+    existing = conn.execute(
+        "SELECT rowid FROM rankings WHERE key = ?", (row["key"],)
+    ).fetchone()
+    if existing is None:
+        rowid = conn.execute(
+            f"INSERT INTO rankings ({', '.join(_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+            [row[c] for c in _COLUMNS],
+        ).lastrowid
+    else:
+        rowid = existing["rowid"]
+        conn.execute(
+            f"UPDATE rankings SET {', '.join(f'{c} = ?' for c in _COLUMNS[1:])} "
+            "WHERE rowid = ?",
+            [row[c] for c in _COLUMNS[1:]] + [rowid],
+        )
+        conn.execute("DELETE FROM rankings_fts WHERE rowid = ?", (rowid,))
+
+    conn.execute(
+        "INSERT INTO rankings_fts (rowid, title, summary, keywords, explanation) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (
+            rowid,
+            contrib.title,
+            summary.summary,
+            " ".join(summary.keywords),
+            summary.explanation,
+        ),
+    )
+
+
+def _ranked_by(summary: AbstractLLMResponse, model: str) -> str:
+    """The model whose answer this is (`filter` for the pre-filter), whatever the
+    source says about how it was re-used - or `model` if the answer does not say.
+    """
+    return summary.source.split(" ")[0].rstrip(":") or model
+
+
+def record_rankings(
+    rankings: Iterable[Tuple[Contribution, AbstractLLMResponse]],
+    source: str,
+    event: str,
+    model: str,
+    path: Optional[Path] = None,
+) -> Generator[Tuple[Contribution, AbstractLLMResponse], None, None]:
+    """Pass the rankings through, recording each in the results database as it goes.
+
+    Args:
+        rankings (Iterable[Tuple[Contribution, AbstractLLMResponse]]): The rankings
+        source (str): Where the contributions came from (`indico`, `arxiv`)
+        event (str): The event (or arXiv categories) they are part of
+        model (str): The model asked to rank them. Each ranking is recorded under
+            the model that actually answered (a cascade's cheap model, say).
+        path (Optional[Path]): The database file (defaults to `results_db` in
+            `config.py`).
+
+    Yields:
+        Tuple[Contribution, AbstractLLMResponse]: The rankings, unchanged.
+    """
+    conn = open_results_db(path)
+    try:
+        for count, (contrib, summary) in enumerate(rankings, start=1):
+            upsert_ranking(
+                conn, source, event, _ranked_by(summary, model), contrib, summary
+            )
+            if count % _COMMIT_EVERY == 0:
+                conn.commit()
+            yield contrib, summary
+    finally:
+        conn.commit()
+        conn.close()
+
+
+def query_rankings(
+    conn: sqlite3.Connection,
+    text: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_interest: Optional[str] = None,
+    source: Optional[str] = None,
+    event: Optional[str] = None,
+    model: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[sqlite3.Row]:
+    """Find rankings across all runs.
+
+    Args:
+        conn (sqlite3.Connection): The results database
+        text (Optional[str]): Full-text query (FTS5 syntax) over the title, summary,
+            keywords and explanation.
+        since (Optional[datetime]): Only contributions starting on or after this
+        until (Optional[datetime]): Only contributions starting before this
+        min_interest (Optional[str]): Only contributions at least this interesting
+            ("low", "medium", "high").
+        source (Optional[str]): Only contributions from this source
+        event (Optional[str]): Only events whose name contains this
+        model (Optional[str]): Only rankings by this model
+        limit (Optional[int]): At most this many rows
+
+    Returns:
+        List[sqlite3.Row]: The matching rows - best text match first if there is a
+            text query, otherwise most recent first.
+
+    Raises:
+        ValueError: If `text` is not a valid FTS5 query.
+    """
+    conditions: List[str] = []
+    params: List[Any] = []
+    if text is not None:
+        conditions.append("rankings_fts MATCH ?")
+        params.append(text)
+    if since is not None:
+        conditions.append("r.start >= ?")
+        params.append(_db_time(since))
+    if until is not None:
+        conditions.append("r.start < ?")
+        params.append(_db_time(until))
+    if min_interest is not None:
+        conditions.append("r.interest >= ?")
+        params.append(as_a_number(min_interest))
+    if source is not None:
+        conditions.append("r.source = ?")
+        params.append(source)
+    if event is not None:
+        conditions.append("r.event LIKE ?")
+        params.append(f"%{event}%")
+    if model is not None:
+        conditions.append("r.model = ?")
+        params.append(model)
+
+    sql = "SELECT r.* FROM rankings r"
+    if text is not None:
+        sql += " JOIN rankings_fts ON rankings_fts.rowid = r.rowid"
+    if len(conditions) > 0:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += (
+        " ORDER BY bm25(rankings_fts)" if text is not None else " ORDER BY r.start DESC"
+    )
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    try:
+        return conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if text is None:
+            raise
+        raise ValueError(f"Invalid full-text query {text!r}: {e}") from e
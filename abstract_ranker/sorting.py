@@ -0,0 +1,171 @@
+import heapq
+import pickle
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from abstract_ranker import config
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+from abstract_ranker.utils import as_a_number
+
+Ranking = Tuple[Contribution, AbstractLLMResponse]
+
+
+def _start(contrib: Contribution, summary: AbstractLLMResponse) -> float:
+    "Earliest first, anything without a time last"
+    if contrib.startDate is None:
+        return float("inf")
+    when = contrib.startDate
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return (when - datetime(1970, 1, 1, tzinfo=timezone.utc)).total_seconds()
+
+
+# The keys results can be sorted on. Each gives a value that sorts best first:
+# the most interesting and most confident first, the earliest first, titles A-Z.
+SORT_KEYS: Dict[str, Callable[[Contribution, AbstractLLMResponse], Any]] = {
+    "interest": lambda contrib, summary: -as_a_number(summary.interest),
+    "confidence": lambda contrib, summary: -summary.confidence,
+    "start": _start,
+    "title": lambda contrib, summary: contrib.title.lower(),
+}
+
+# What --top sorts on if no --sort is given.
+DEFAULT_SORT = ["interest", "confidence"]
+
+
+def parse_sort_keys(sort: str) -> List[str]:
+    """Parse a comma separated list of sort keys from the command line.
+
+    Args:
+        sort (str): The keys, e.g. `interest,confidence`
+
+    Returns:
+        List[str]: The keys, most significant first.
+    """
+    keys = [k.strip() for k in sort.split(",") if len(k.strip()) > 0]
+    unknown = [k for k in keys if k not in SORT_KEYS]
+    if len(keys) == 0 or len(unknown) > 0:
+        raise ValueError(
+            f"Unknown sort key(s) {unknown} - use a comma separated list of "
+            f"{', '.join(SORT_KEYS)}"
+        )
+    return keys
+
+
+def _sort_key(keys: List[str]) -> Callable[[Ranking], Tuple[Any, ...]]:
+    functions = [SORT_KEYS[k] for k in keys]
+
+    def key(ranking: Ranking) -> Tuple[Any, ...]:
+        return tuple(f(*ranking) for f in functions)
+
+    return key
+
+
+def top_rankings(rankings: Iterable[Ranking], keys: List[str], k: int) -> List[Ranking]:
+    """The best `k` results. Only `k` results are held at a time (a bounded heap), no
+    matter how many go by.
+
+    Args:
+        rankings (Iterable[Ranking]): The results
+        keys (List[str]): The `SORT_KEYS` to order by, most significant first
+        k (int): How many to keep
+
+    Returns:
+        List[Ranking]: The best `k`, in order (ties in arrival order).
+    """
+    return heapq.nsmallest(k, rankings, key=_sort_key(keys))
+
+
+def _read_run(file: BinaryIO) -> Generator[Ranking, None, None]:
+    "Read back a sorted run written by `sort_rankings`"
+    while True:
+        try:
+            yield pickle.load(file)
+        except EOFError:
+            return
+
+
+def sort_rankings(
+    rankings: Iterable[Ranking],
+    keys: List[str],
+    memory_rows: Optional[int] = None,
+) -> Generator[Ranking, None, None]:
+    """Sort the results. At most `memory_rows` are held in memory: longer runs are
+    sorted a block at a time, each block spilled to a temporary file, and the blocks
+    merged as they are read back.
+
+    Args:
+        rankings (Iterable[Ranking]): The results
+        keys (List[str]): The `SORT_KEYS` to order by, most significant first
+        memory_rows (Optional[int]): Results sorted in memory at once (defaults to
+            `sort_memory_rows` in `config.py`).
+
+    Yields:
+        Ranking: The results in order (ties in arrival order).
+    """
+    memory_rows = memory_rows if memory_rows is not None else config.sort_memory_rows
+    key = _sort_key(keys)
+
+    with tempfile.TemporaryDirectory(prefix="abstract_ranker_sort_") as temp_dir:
+        runs: List[Path] = []
+        block: List[Ranking] = []
+        for ranking in rankings:
+            block.append(ranking)
+            if len(block) >= memory_rows:
+                block.sort(key=key)
+                run = Path(temp_dir) / f"run-{len(runs)}.pkl"
+                with run.open("wb") as f:
+                    for r in block:
+                        pickle.dump(r, f, protocol=pickle.HIGHEST_PROTOCOL)
+                runs.append(run)
+                block = []
+        block.sort(key=key)
+
+        if len(runs) == 0:
+            yield from block
+            return
+
+        # `heapq.merge` is stable across its inputs in order, and the runs are in
+        # arrival order, so ties stay in arrival order.
+        files = [run.open("rb") for run in runs]
+        try:
+            yield from heapq.merge(*[_read_run(f) for f in files], block, key=key)
+        finally:
+            for f in files:
+                f.close()
+
+
+def order_rankings(
+    rankings: Iterable[Ranking],
+    sort: Optional[List[str]] = None,
+    top: Optional[int] = None,
+) -> Iterable[Ranking]:
+    """Apply the command line ordering: the `top` best, everything sorted, or (with
+    neither) the results untouched, streaming as they arrive.
+
+    Args:
+        rankings (Iterable[Ranking]): The results
+        sort (Optional[List[str]]): The `SORT_KEYS` to order by
+        top (Optional[int]): Keep only this many (sorted by `DEFAULT_SORT` if `sort`
+            is not given)
+
+    Returns:
+        Iterable[Ranking]: The results to write.
+    """
+    if top is not None:
+        return top_rankings(rankings, sort if sort is not None else DEFAULT_SORT, top)
+    if sort is not None:
+        return sort_rankings(rankings, sort)
+    return rankings
@@ -1,30 +1,26 @@
 import argparse
+import hashlib
+import json
 import logging
-import fsspec
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, List, Optional
 
-from abstract_ranker.llm_utils import get_llm_models, summarize_llm
+import fsspec
 
+from abstract_ranker import config
+from abstract_ranker.chunking import map_reduce_summarize
+from abstract_ranker.llm_utils import (
+    get_llm_models,
+    summarize_llm,
+    summarize_llm_stream,
+)
 
-def cmd_summarize(args):
-    """Summarize a file.
-
-    Args:
-        args (_type_): The command line arguments.
-    """
-    with fsspec.open(args.file, "r") as f:
-        text = f.read()  # type: ignore
-
-    # Type of summary
-    summary_type_prompt = """
-The below text are meeting minutes. Please extract from the meeting minutes any action items,
-decisions made, or what look like big successes by project. Decisions should be clear in the notes
-and referred to as something that will be done going forward (some projects will have no
-decisions). Any project may have no Action items, decisions, or successes or only some.
-The output should be Markdown that
-looks like
-this:
-
-# <Meeting Title>
+# The markdown we ask for: action items, decisions and successes by project.
+_minutes_format = """# <Meeting Title>
 
 ## <Project 1 name>
 
@@ -56,12 +52,222 @@ this:
 
 """
 
-    r = summarize_llm(
-        summary_type_prompt, {"text": text}, args.model, not args.ignore_cache
+# Type of summary
+minutes_prompt = """
+The below text are meeting minutes. Please extract from the meeting minutes any action items,
+decisions made, or what look like big successes by project. Decisions should be clear in the notes
+and referred to as something that will be done going forward (some projects will have no
+decisions). Any project may have no Action items, decisions, or successes or only some.
+The output should be Markdown that
+looks like
+this:
+
+""" + _minutes_format
+
+# Chunked mode: the same question for one part of the minutes...
+minutes_chunk_prompt = """
+The below text is one part of a longer set of meeting minutes (it may start or stop in the middle
+of a project's discussion). Please extract from it any action items, decisions made, or what look
+like big successes by project. Decisions should be clear in the notes and referred to as something
+that will be done going forward. Any project may have no Action items, decisions, or successes or
+only some. If the meeting title is not in this part, use "Meeting Minutes" as the title.
+The output should be Markdown that looks like this:
+""" + _minutes_format
+
+# ... and to merge the answers for all the parts into one.
+minutes_merge_prompt = """
+The below text is several partial summaries of consecutive parts of the same meeting minutes, each
+in the Markdown format shown below. Neighbouring parts overlap a little, so the same item can
+appear twice. Please merge them into a single summary in the same format: one title for the
+meeting, one section per project combining that project's Action Items, Decisions Made and Big
+Successes from every part, with duplicates removed. Do not add anything that is not in the
+partial summaries. The output should be Markdown that looks like this:
+""" + _minutes_format
+
+
+def _summarize_text(
+    args, text: str, on_text: Optional[Callable[[str], None]] = None
+) -> str:
+    """Summarize the text of one set of minutes as the command line asks. If
+    `on_text` is given the summary is streamed to it as the model writes it."""
+    if args.chunked:
+        return map_reduce_summarize(
+            text,
+            minutes_chunk_prompt,
+            minutes_merge_prompt,
+            args.model,
+            not args.ignore_cache,
+            max_tokens=args.chunk_tokens,
+            on_text=on_text,
+            single_prompt=minutes_prompt,
+        )
+    if on_text is not None:
+        parts: List[str] = []
+        for part in summarize_llm_stream(
+            minutes_prompt, {"text": text}, args.model, not args.ignore_cache
+        ):
+            on_text(part)
+            parts.append(part)
+        return "".join(parts)
+    return summarize_llm(
+        minutes_prompt, {"text": text}, args.model, not args.ignore_cache
+    )
+
+
+def _output_names(sources: List[str]) -> List[str]:
+    "Markdown file name for each source - the source name, unless two share it"
+    stems = [PurePosixPath(s).stem for s in sources]
+    return [
+        (
+            f"{stem}.md"
+            if stems.count(stem) == 1
+            else f"{stem}-{hashlib.sha1(source.encode()).hexdigest()[:8]}.md"
+        )
+        for stem, source in zip(stems, sources)
+    ]
+
+
+# Records, in the output directory, what each summary was made from.
+_STATE_FILE = ".summaries.json"
+
+
+def summarize_files(
+    urls: List[str],
+    output_dir: Path,
+    summarize: Callable[[str], str],
+    settings: str,
+    workers: Optional[int] = None,
+    ignore_previous: bool = False,
+) -> Dict[str, str]:
+    """Summarize many files (any fsspec url, globs allowed) into one Markdown file
+    each, plus an `index.md`. Files are fetched and summarized on a bounded pool of
+    workers. A file whose content (and `settings`) has not changed since the last
+    run into `output_dir` is skipped without being summarized again (unless
+    `ignore_previous` is set).
+
+    Args:
+        urls (List[str]): The files, or globs matching them
+        output_dir (Path): Where to write the summaries and index
+        summarize (Callable[[str], str]): Summarizes the text of one file
+        settings (str): The model and options - a change re-summarizes everything
+        workers (Optional[int]): Files handled at once (defaults to
+            `summarize_file_workers` in `config.py`).
+        ignore_previous (bool): Summarize every file again, even if unchanged.
+
+    Returns:
+        Dict[str, str]: For each file, `summarized`, `unchanged` or `failed`.
+    """
+    files = fsspec.open_files(urls, "rb")
+    if len(files) == 0:
+        raise ValueError(f"No files match {urls}")
+    sources = [f.full_name for f in files]
+    names = _output_names(sources)
+    workers = workers if workers is not None else config.summarize_file_workers
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state_file = output_dir / _STATE_FILE
+    state: Dict[str, Dict[str, str]] = (
+        json.loads(state_file.read_text(encoding="utf-8"))
+        if state_file.exists()
+        else {}
     )
 
-    # Dump output to stdout
-    print(r)
+    def summarize_one(open_file: fsspec.core.OpenFile, source: str, name: str):
+        with open_file as f:
+            data: bytes = f.read()  # type: ignore
+        content_hash = hashlib.sha256(data + settings.encode()).hexdigest()
+        previous = state.get(source)
+        if (
+            not ignore_previous
+            and previous is not None
+            and previous["hash"] == content_hash
+            and (output_dir / previous["output"]).exists()
+        ):
+            return "unchanged", previous
+
+        summary = summarize(data.decode("utf-8", errors="replace"))
+        temp_file = output_dir / f"{name}.tmp"
+        temp_file.write_text(summary, encoding="utf-8")
+        os.replace(temp_file, output_dir / name)
+        return "summarized", {
+            "hash": content_hash,
+            "output": name,
+            "summarized": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    status: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            source: executor.submit(summarize_one, f, source, name)
+            for f, source, name in zip(files, sources, names)
+        }
+        for source, future in futures.items():
+            try:
+                status[source], state[source] = future.result()
+            except Exception as e:
+                logging.error(f"Unable to summarize {source}: {e}")
+                status[source] = "failed"
+
+    state_file.write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+    # The index covers everything summarized into this directory so far.
+    lines = ["# Summaries", ""]
+    for source in sorted(state):
+        entry = state[source]
+        lines.append(
+            f"- [{entry['output']}]({entry['output']}): {source} "
+            f"(summarized {entry['summarized']})"
+        )
+    (output_dir / "index.md").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    return status
+
+
+def cmd_summarize(args):
+    """Summarize a file, or many files into an output directory.
+
+    Args:
+        args (_type_): The command line arguments.
+    """
+    files = fsspec.open_files(args.file, "r")
+    if args.output_dir is None and len(files) == 1:
+        with files[0] as f:
+            text = f.read()  # type: ignore
+
+        # Dump output to stdout
+        if args.stream:
+
+            def write(part: str):
+                sys.stdout.write(part)
+                sys.stdout.flush()
+
+            _summarize_text(args, text, on_text=write)
+            print()
+        else:
+            print(_summarize_text(args, text))
+        return
+
+    if args.stream:
+        logging.warning("--stream only applies to a single file written to the screen")
+
+    output_dir = (
+        args.output_dir if args.output_dir is not None else config.summaries_dir
+    )
+    settings = f"{args.model} " + (
+        f"chunked {args.chunk_tokens}" if args.chunked else "single"
+    )
+    status = summarize_files(
+        args.file,
+        output_dir,
+        lambda text: _summarize_text(args, text),
+        settings,
+        ignore_previous=args.ignore_cache,
+    )
+    counts = {s: list(status.values()).count(s) for s in set(status.values())}
+    print(
+        f"Wrote {output_dir / 'index.md'}: "
+        + ", ".join(f"{n} {s}" for s, n in sorted(counts.items()))
+    )
 
 
 def main():
@@ -87,8 +293,21 @@ def main():
 
     subparsers = parser.add_subparsers(dest="command", help="sub-command help")
 
-    rank_parser = subparsers.add_parser("file", help="Summarize a file")
-    rank_parser.add_argument("file", type=str, help="File location")
+    rank_parser = subparsers.add_parser("file", help="Summarize files")
+    rank_parser.add_argument(
+        "file",
+        type=str,
+        nargs="+",
+        help="File locations (any fsspec url; globs allowed). A single file is "
+        "summarized to the screen unless --output-dir is given.",
+    )
+    rank_parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help="Write one Markdown summary per file, and an index, here (default "
+        "from config.py when there is more than one file)",
+        default=None,
+    )
     rank_parser.add_argument(
         "--model",
         "-m",
@@ -97,6 +316,25 @@ def main():
         choices=get_llm_models(),
         default="GPT4o",
     )
+    rank_parser.add_argument(
+        "--chunked",
+        action="store_true",
+        help="Summarize the file in overlapping chunks (in parallel) and merge the "
+        "results - for minutes too long for one query",
+        default=False,
+    )
+    rank_parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        help="Tokens per chunk in --chunked mode",
+        default=config.summarize_chunk_tokens,
+    )
+    rank_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the summary as the model writes it (a single file only)",
+        default=False,
+    )
     rank_parser.set_defaults(func=cmd_summarize)
 
     args = parser.parse_args()
@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, ContextManager, Dict, List, Optional, Tuple
+
+# Spans with these names are also counted while they are open, giving a
+# concurrency track in the trace.
+_COUNTED_SPANS = {"llm.request", "indico.fetch_part", "arxiv.fetch_page"}
+
+
+class _NoSpan:
+    "What `span` hands back when tracing is off - shared, and does nothing"
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    "A span being timed"
+
+    __slots__ = ("_tracer", "name", "attrs", "span_id", "parent_id", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self._tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self._tracer._enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self._tracer._exit(self)
+        return False
+
+
+class Tracer:
+    """Collects spans (and the number of some kinds of span open at once) for a run,
+    and writes them as a Chrome trace or as OTLP-style JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start_ns = time.perf_counter_ns()
+        self._epoch_ns = time.time_ns()
+        self._trace_id = os.urandom(16).hex()
+
+        # (name, thread id, span id, parent span id, start ns, end ns, attributes)
+        self.spans: List[Tuple[str, int, str, Optional[str], int, int, Dict]] = []
+        # (name, ns, number open)
+        self.counters: List[Tuple[str, int, int]] = []
+        self._open: Dict[str, int] = {}
+
+    def span(self, name: str, attrs: Dict[str, Any]) -> _Span:
+        return _Span(self, name, attrs)
+
+    def _stack(self) -> List[_Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, span: _Span):
+        stack = self._stack()
+        span.span_id = os.urandom(8).hex()
+        span.parent_id = stack[-1].span_id if len(stack) > 0 else None
+        stack.append(span)
+        span.start = time.perf_counter_ns() - self._start_ns
+        if span.name in _COUNTED_SPANS:
+            self._count(span.name, 1, span.start)
+
+    def _exit(self, span: _Span):
+        end = time.perf_counter_ns() - self._start_ns
+        self._stack().pop()
+        if span.name in _COUNTED_SPANS:
+            self._count(span.name, -1, end)
+        with self._lock:
+            self.spans.append(
+                (
+                    span.name,
+                    threading.get_ident(),
+                    span.span_id,
+                    span.parent_id,
+                    span.start,
+                    end,
+                    span.attrs,
+                )
+            )
+
+    def _count(self, name: str, change: int, when: int):
+        with self._lock:
+            self._open[name] = self._open.get(name, 0) + change
+            self.counters.append((name, when, self._open[name]))
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """The trace in the Chrome trace-event format (load it in `chrome://tracing`
+        or https://ui.perfetto.dev).
+
+        Returns:
+            Dict[str, Any]: The trace, ready for `json.dump`.
+        """
+        pid = os.getpid()
+        threads = {}
+        events: List[Dict[str, Any]] = []
+        for name, tid, _, _, start, end, attrs in self.spans:
+            threads.setdefault(tid, len(threads))
+            events.append(
+                {
+                    "name": name,
+                    "cat": name.split(".")[0],
+                    "ph": "X",
+                    "ts": start / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": pid,
+                    "tid": threads[tid],
+                    "args": {k: _json_value(v) for k, v in attrs.items()},
+                }
+            )
+        for name, when, count in self.counters:
+            events.append(
+                {
+                    "name": f"{name} in flight",
+                    "ph": "C",
+                    "ts": when / 1000,
+                    "pid": pid,
+                    "args": {"open": count},
+                }
+            )
+        for tid, number in threads.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": number,
+                    "args": {"name": "main" if number == 0 else f"worker {number}"},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def otlp_trace(self) -> Dict[str, Any]:
+        """The trace shaped like an OpenTelemetry (OTLP/JSON) export, for tools that
+        read that.
+
+        Returns:
+            Dict[str, Any]: The trace, ready for `json.dump`.
+        """
+        spans = []
+        for name, tid, span_id, parent_id, start, end, attrs in self.spans:
+            span: Dict[str, Any] = {
+                "traceId": self._trace_id,
+                "spanId": span_id,
+                "name": name,
+                "kind": 1,
+                "startTimeUnixNano": str(self._epoch_ns + start),
+                "endTimeUnixNano": str(self._epoch_ns + end),
+                "attributes": [
+                    {"key": k, "value": _otlp_value(v)}
+                    for k, v in list(attrs.items()) + [("thread.id", tid)]
+                ],
+            }
+            if parent_id is not None:
+                span["parentSpanId"] = parent_id
+            spans.append(span)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": "abstract_ranker"},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "abstract_ranker"}, "spans": spans}
+                    ],
+                }
+            ]
+        }
+
+
+def _json_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": "" if value is None else str(value)}
+
+
+# The tracer for this run, if tracing is on.
+_tracer: Optional[Tracer] = None
+
+
+def span(name: str, **attrs: Any) -> ContextManager:
+    """Time a stage of the run (when tracing is on - otherwise this does nothing).
+
+    Args:
+        name (str): The stage, as `module.stage` (e.g. `llm.request`)
+        attrs: Anything to record with it (the contribution title, the model, ...)
+
+    Returns:
+        ContextManager: Use in a `with` around the stage.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.span(name, attrs)
+
+
+def start_tracing() -> Tracer:
+    """Start recording spans.
+
+    Returns:
+        Tracer: The tracer collecting them.
+    """
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop_tracing(
+    chrome_file: Optional[Path] = None, otlp_file: Optional[Path] = None
+) -> Optional[Tracer]:
+    """Stop recording spans, and write out what was recorded.
+
+    Args:
+        chrome_file (Optional[Path]): Write a Chrome trace-event file here
+        otlp_file (Optional[Path]): Write OTLP-style JSON here
+
+    Returns:
+        Optional[Tracer]: The tracer that was running, if any.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    if chrome_file is not None:
+        chrome_file.write_text(json.dumps(tracer.chrome_trace()), encoding="utf-8")
+    if otlp_file is not None:
+        otlp_file.write_text(json.dumps(tracer.otlp_trace()), encoding="utf-8")
+    return tracer
@@ -1,4 +1,4 @@
-from typing import Generator, TypeVar
+from typing import Callable, Generator, Iterable, Optional, TypeVar
 
 from rich.progress import Progress
 
@@ -20,11 +20,17 @@ T = TypeVar("T")
 
 
 def progress_bar(
-    length: int, data: Generator[T, None, None]
+    length: Optional[int],
+    data: Iterable[T],
+    estimate: Optional[Callable[[], Optional[int]]] = None,
 ) -> Generator[T, None, None]:
-    """A progress bar for the indicating how close we are to being done."""
+    """A progress bar for the indicating how close we are to being done. If `length`
+    is None we don't know how many there will be, and only the count is shown.
+    If `estimate` is given, it is asked for a (better) total as we go."""
     with Progress() as progress:
         task = progress.add_task("Ranking contributions", total=length)
         for contrib in data:
             yield contrib
+            if estimate is not None:
+                progress.update(task, total=estimate())
             progress.update(task, advance=1)
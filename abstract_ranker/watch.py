@@ -0,0 +1,228 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+import requests
+
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+from abstract_ranker.indico import (
+    convert_indico_contributions,
+    fetch_indico_export,
+    load_indico_json,
+)
+
+Ranking = Tuple[Contribution, AbstractLLMResponse]
+
+
+class WatchChanges(BaseModel):
+    "What changed in an event since the last poll"
+
+    # Contributions we had not seen before
+    new: int = 0
+
+    # Contributions whose title or abstract changed (so were re-ranked)
+    changed: int = 0
+
+    # Contributions where only other details (time, room, ...) changed
+    updated: int = 0
+
+    # Contributions that are no longer in the event
+    removed: int = 0
+
+    def any(self) -> bool:
+        return self.new + self.changed + self.updated + self.removed > 0
+
+
+def _contribution_key(raw: Dict[str, Any]) -> str:
+    "Stable key for a raw indico contribution"
+    for k in ["id", "url", "title"]:
+        if raw.get(k) is not None:
+            return str(raw[k])
+    raise ValueError(f"Indico contribution has no id, url, or title: {raw}")
+
+
+def _converted_key(contrib: Contribution) -> str:
+    "The same key, for a contribution once converted (and ranked)"
+    return contrib.id or contrib.url or contrib.title
+
+
+def _fingerprint(raw: Dict[str, Any]) -> str:
+    "Changes if anything in the raw contribution changes"
+    return hashlib.sha1(
+        json.dumps(raw, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class IndicoWatcher:
+    """Keeps the rankings for an indico event up to date as the event changes. Only
+    new contributions, or those whose title or abstract changed, are ranked again;
+    anything else that changed (time, room, ...) is updated in place.
+    """
+
+    def __init__(
+        self,
+        event_url: str,
+        timezone_name: Optional[str],
+        rank: Callable[[Iterable[Contribution]], Iterable[Ranking]],
+        refresh: bool = False,
+    ):
+        """Set up the watcher - nothing is fetched until the first `poll`.
+
+        Args:
+            event_url (str): The URL of the indico event
+            timezone_name (Optional[str]): Timezone for the dates (None for the event's)
+            rank (Callable[[Iterable[Contribution]], Iterable[Ranking]]): Ranks a
+                list of contributions.
+            refresh (bool): Download the event again on the first poll, rather than
+                re-validating a cached copy.
+        """
+        self.event_url = event_url
+        self.timezone_name = timezone_name
+        self._rank = rank
+        self._refresh = refresh
+
+        self.event_info: Dict[str, Any] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._rankings: Dict[str, Ranking] = {}
+        self._export_version: Optional[int] = None
+
+    @property
+    def rankings(self) -> List[Ranking]:
+        "The current rankings, in event order"
+        return list(self._rankings.values())
+
+    def poll(self) -> Optional[WatchChanges]:
+        """Check the event for changes and bring the rankings up to date.
+
+        Returns:
+            Optional[WatchChanges]: What changed, or None if the event export has not
+                changed at all.
+        """
+        export_path = fetch_indico_export(self.event_url, timedelta(0), self._refresh)
+        self._refresh = False
+
+        # The cached export is only rewritten when indico sends a new copy, so
+        # there is nothing to parse if it is the one we saw last time.
+        export_version = export_path.stat().st_mtime_ns
+        if export_version == self._export_version:
+            return None
+
+        # It was re-validated just now.
+        event_data = load_indico_json(self.event_url, timedelta.max)
+        self.event_info = {k: v for k, v in event_data.items() if k != "contributions"}
+        changes = self.update(event_data["contributions"])
+        self._export_version = export_version
+        return changes
+
+    def update(self, raw_contributions: List[Dict[str, Any]]) -> WatchChanges:
+        """Bring the rankings up to date with a new list of raw contributions.
+
+        Args:
+            raw_contributions (List[Dict[str, Any]]): The contributions as found in
+                the indico export.
+
+        Returns:
+            WatchChanges: What changed.
+        """
+        changes = WatchChanges()
+        fingerprints: Dict[str, str] = {}
+        kept: Dict[str, Ranking] = {}
+        to_rank: Dict[str, str] = {}
+        to_rank_contributions: List[Contribution] = []
+
+        for raw in raw_contributions:
+            key = _contribution_key(raw)
+            fingerprints[key] = _fingerprint(raw)
+            previous = self._rankings.get(key)
+            if previous is not None and self._fingerprints[key] == fingerprints[key]:
+                kept[key] = previous
+                continue
+
+            contrib = next(convert_indico_contributions([raw], self.timezone_name))
+            if (
+                previous is not None
+                and previous[0].title == contrib.title
+                and previous[0].abstract == contrib.abstract
+            ):
+                changes.updated += 1
+                kept[key] = (contrib, previous[1])
+                continue
+
+            if previous is None:
+                changes.new += 1
+            else:
+                changes.changed += 1
+            to_rank[_converted_key(contrib)] = key
+            to_rank_contributions.append(contrib)
+
+        ranked = {
+            to_rank[_converted_key(contrib)]: (contrib, answer)
+            for contrib, answer in self._rank(to_rank_contributions)
+        }
+
+        changes.removed = len(set(self._rankings) - set(fingerprints))
+        self._rankings = {
+            key: kept[key] if key in kept else ranked[key] for key in fingerprints
+        }
+        self._fingerprints = fingerprints
+        return changes
+
+
+def watch_indico(
+    watcher: IndicoWatcher,
+    output_file: Callable[[Dict[str, Any]], Path],
+    interval: timedelta,
+    cycles: Optional[int] = None,
+    output_format: str = "csv",
+    order: Optional[Callable[[Iterable[Ranking]], Iterable[Ranking]]] = None,
+):
+    """Poll an event, rewriting the output file every time something changes. A poll
+    that fails to reach indico is logged and tried again on the next cycle.
+
+    Args:
+        watcher (IndicoWatcher): Tracks the event and its rankings
+        output_file (Callable[[Dict[str, Any]], Path]): Output file for the event info
+        interval (timedelta): Time between polls
+        cycles (Optional[int]): Stop after this many polls (None to run until
+            interrupted).
+        output_format (str): Format of the output file (see `OUTPUT_FORMATS`).
+        order (Optional[Callable]): Sorts (or trims) the rankings before they are
+            written.
+    """
+    from abstract_ranker.output import dump_rankings
+
+    cycle = 0
+    try:
+        while cycles is None or cycle < cycles:
+            if cycle > 0:
+                time.sleep(interval.total_seconds())
+            cycle += 1
+
+            try:
+                changes = watcher.poll()
+            except requests.RequestException as e:
+                logging.warning(f"Unable to poll {watcher.event_url}: {e}")
+                continue
+            if changes is None or not changes.any():
+                logging.info(f"No changes to {watcher.event_url}")
+                continue
+
+            results_file = output_file(watcher.event_info)
+            rankings = watcher.rankings
+            dump_rankings(
+                results_file,
+                order(rankings) if order is not None else rankings,
+                False,
+                output_format,
+            )
+            logging.info(
+                f"Updated {results_file}: {changes.new} new, {changes.changed} changed, "
+                f"{changes.updated} updated, {changes.removed} removed."
+            )
+    except KeyboardInterrupt:
+        logging.info("Stopped watching")
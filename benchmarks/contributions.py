@@ -0,0 +1,87 @@
+"""Benchmark for turning a raw indico export into `Contribution`s.
+
+Times the per-contribution overhead of the old path (validate each raw dict into
+an `IndicoContribution`, then build and validate a second `Contribution`)
+against the current one (validate each raw dict once, as a `Contribution`). Memory
+is the tracemalloc peak while 10k records are built, both kept in a list and
+consumed one at a time as the ranker does.
+
+    python benchmarks/contributions.py  (with the package installed)
+"""
+
+import json
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from abstract_ranker.data_model import Contribution
+from abstract_ranker.indico import IndicoContribution, indico_contributions
+
+N_CONTRIBUTIONS = 10_000
+
+
+def _old_contributions(raw: List[Dict[str, Any]]) -> List[Contribution]:
+    "Contributions as they were built (validated twice)"
+    result = []
+    for contrib in raw:
+        item = IndicoContribution(**contrib)
+        result.append(
+            Contribution(
+                title=item.title,
+                abstract=item.description,
+                type=item.type,
+                startDate=(
+                    item.startDate.get_datetime(None) if item.startDate else None
+                ),
+                endDate=item.endDate.get_datetime(None) if item.endDate else None,
+                roomFullname=item.roomFullname,
+                url=item.url,
+                id=str(item.id) if item.id is not None else None,
+            )
+        )
+    return result
+
+
+def _new_contributions(raw: List[Dict[str, Any]]) -> List[Contribution]:
+    return list(indico_contributions({"contributions": raw}, None))
+
+
+def _peak_mb(f: Callable[[], Any]) -> float:
+    "Peak traced memory, in MB, while `f` runs"
+    tracemalloc.start()
+    f()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024**2
+
+
+def _stream(raw: List[Dict[str, Any]]) -> None:
+    "Consume the contributions one at a time, keeping none of them"
+    for _ in indico_contributions({"contributions": raw}, None):
+        pass
+
+
+def main():
+    data_file = Path(__file__).parent.parent / "tests" / "data" / "1330797.json"
+    source = json.loads(data_file.read_text())["results"][0]["contributions"]
+    raw = [dict(source[i % len(source)], id=str(i)) for i in range(N_CONTRIBUTIONS)]
+
+    for name, f in [("old", _old_contributions), ("new", _new_contributions)]:
+        best = min(timeit.repeat(lambda: f(raw), number=1, repeat=5))
+        print(
+            f"{name:>6}: {best * 1e6 / len(raw):6.1f} us per contribution "
+            f"({best * 1000:.0f} ms for {len(raw)})"
+        )
+        print(
+            f"        {_peak_mb(lambda: f(raw)):6.1f} MB peak for {len(raw)} "
+            "records kept in a list (abstract text included)"
+        )
+    print(
+        f"stream: {_peak_mb(lambda: _stream(raw)):6.2f} MB peak for {len(raw)} "
+        "records consumed one at a time"
+    )
+
+
+if __name__ == "__main__":
+    main()
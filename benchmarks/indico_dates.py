@@ -0,0 +1,82 @@
+"""Micro-benchmark for converting the dates of a large indico event.
+
+The ACAT 2024 export in `tests/data` is replicated out to 2000 contributions,
+spread over a year so that the dates cross DST changes. The conversion used
+before the dates were memoized is timed alongside for comparison.
+
+    python benchmarks/indico_dates.py  (with the package installed)
+"""
+
+import copy
+import json
+import timeit
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytz
+
+from abstract_ranker.indico import IndicoDate, _convert_date, _timezone
+
+
+def _old_get_datetime(d: IndicoDate, tz_name: Optional[str]) -> datetime:
+    "The conversion as it was (today's offset, re-parsed with strptime)"
+    talk_timezone = pytz.timezone(d.tz)
+    now = datetime.now(talk_timezone)
+    timezone_offset = now.strftime("%z")
+    talk_time = datetime.strptime(
+        f"{d.date} {d.time} {timezone_offset}", "%Y-%m-%d %H:%M:%S %z"
+    )
+    if tz_name is None:
+        return talk_time
+    return talk_time.astimezone(pytz.timezone(tz_name))
+
+
+def _event_contributions(n: int) -> List[Dict[str, Any]]:
+    "`n` contributions, cycled from the ACAT 2024 export and spread over a year"
+    data_file = Path(__file__).parent.parent / "tests" / "data" / "1330797.json"
+    source = [
+        c
+        for c in json.loads(data_file.read_text())["results"][0]["contributions"]
+        if c["startDate"] is not None
+    ]
+    contributions = []
+    for i in range(n):
+        c = copy.deepcopy(source[i % len(source)])
+        shift = timedelta(days=(i // len(source)) * 30)
+        for k in ["startDate", "endDate"]:
+            day = date.fromisoformat(c[k]["date"]) + shift
+            c[k]["date"] = day.isoformat()
+        contributions.append(c)
+    return contributions
+
+
+def main():
+    contributions = _event_contributions(2000)
+    dates = [
+        IndicoDate(**c[k]) for c in contributions for k in ["startDate", "endDate"]
+    ]
+
+    def old():
+        for d in dates:
+            _old_get_datetime(d, "US/Eastern")
+
+    def new():
+        _convert_date.cache_clear()
+        _timezone.cache_clear()
+        for d in dates:
+            d.get_datetime("US/Eastern")
+
+    for name, f in [("old", old), ("memoized", new)]:
+        best = min(timeit.repeat(f, number=1, repeat=5))
+        print(f"{name:>9}: {best * 1000:7.2f} ms for {len(dates)} dates")
+
+    wrong = sum(
+        _old_get_datetime(d, "US/Eastern") != d.get_datetime("US/Eastern")
+        for d in dates
+    )
+    print(f"Dates the old conversion got wrong (DST): {wrong} of {len(dates)}")
+
+
+if __name__ == "__main__":
+    main()
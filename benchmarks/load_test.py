@@ -0,0 +1,407 @@
+"""Offline load test of the ranking pipeline against a fake OpenAI server.
+
+A local mock chat-completions server stands in for OpenAI. It has configurable
+latency, 429 (rate limit) and malformed-JSON rates and token counts. The real
+`query_gpt` is pointed at it with `OPENAI_BASE_URL`. `process_contributions`
+then ranks synthetic events of each size, with the LLM cache in a scratch
+directory, as `abstract_ranker` would. Throughput, per-contribution
+latency percentiles, failures and memory are reported for each size. Nothing
+is sent to OpenAI, so this costs nothing.
+
+    python benchmarks/load_test.py  (with the package installed)
+    python benchmarks/load_test.py --sizes 100 1000 10000 \\
+        --latency lognormal:200:0.5 --rate-limited 0.05 --malformed 0.01
+
+A 429 is retried by the OpenAI client (it honors the server's `retry-after-ms`).
+A malformed answer makes `query_gpt` raise, which ends `process_contributions`.
+The load test counts that contribution as failed and carries on ranking the rest.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional
+
+from abstract_ranker.data_model import Contribution
+from abstract_ranker.profiling import rss_bytes
+
+# Short model name to rank with - its dispatch goes through `query_gpt`.
+MODEL = "GPT4o-mini"
+
+_WORDS = (
+    "detector calorimeter tracking trigger jet flavour tagging neural network "
+    "simulation reconstruction analysis Higgs boson top quark muon electron photon "
+    "luminosity upgrade GPU FPGA heterogeneous computing workflow dataset grid "
+    "machine learning transformer graph anomaly detection inference performance "
+    "measurement cross section systematic uncertainty background signal"
+).split()
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Parse a latency distribution (milliseconds) from the command line.
+
+    Args:
+        spec (str): `fixed:MS`, `uniform:LOW:HIGH` or `lognormal:MEDIAN:SIGMA`
+
+    Returns:
+        Callable[[random.Random], float]: Draws a latency, in seconds.
+    """
+    kind, *values = spec.split(":")
+    try:
+        numbers = [float(v) for v in values]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Bad latency '{spec}'")
+    if kind == "fixed" and len(numbers) == 1:
+        return lambda _: numbers[0] / 1000
+    if kind == "uniform" and len(numbers) == 2:
+        return lambda rng: rng.uniform(numbers[0], numbers[1]) / 1000
+    if kind == "lognormal" and len(numbers) == 2:
+        return lambda rng: rng.lognormvariate(math.log(numbers[0]), numbers[1]) / 1000
+    raise argparse.ArgumentTypeError(
+        f"Bad latency '{spec}' - use fixed:MS, uniform:LOW:HIGH or "
+        "lognormal:MEDIAN:SIGMA"
+    )
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """An OpenAI-compatible `/v1/chat/completions` endpoint on localhost that
+    answers every query with a valid ranking, after a random delay. Some queries
+    can be answered with a 429 or with malformed JSON.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency: Callable[[random.Random], float],
+        rate_limited: float = 0.0,
+        malformed: float = 0.0,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: int = 150,
+        seed: int = 1,
+    ):
+        """Start listening (call `serve_forever` to answer).
+
+        Args:
+            latency (Callable[[random.Random], float]): Draws the delay (seconds)
+                before each answer.
+            rate_limited (float): Fraction of requests answered with a 429
+            malformed (float): Fraction of answers that are broken JSON
+            prompt_tokens (Optional[int]): Prompt tokens reported per request
+                (defaults to a quarter of the request's size).
+            completion_tokens (int): Completion tokens reported per answer, and
+                roughly the size of the answer.
+            seed (int): Seed for the random delays and failures
+        """
+        super().__init__(("127.0.0.1", 0), _MockOpenAIHandler)
+        self.latency = latency
+        self.rate_limited = rate_limited
+        self.malformed = malformed
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "rate limited": 0, "malformed": 0}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def draw(self):
+        "Pick the delay and outcome of the next request"
+        with self._lock:
+            self.counts["requests"] += 1
+            delay = self.latency(self._random)
+            outcome = self._random.random()
+            if outcome < self.rate_limited:
+                self.counts["rate limited"] += 1
+                return delay, "rate limited"
+            if outcome < self.rate_limited + self.malformed:
+                self.counts["malformed"] += 1
+                return delay, "malformed"
+            return delay, "ok"
+
+    def answer(self, model: str, prompt_size: int, malformed: bool) -> bytes:
+        "A chat completion holding a ranking (or the start of one)"
+        padding = " ".join(
+            _WORDS[i % len(_WORDS)] for i in range(self.completion_tokens)
+        )
+        content = json.dumps(
+            {
+                "summary": f"Synthetic summary. {padding}"[
+                    : 4 * self.completion_tokens
+                ],
+                "experiment": "ATLAS",
+                "keywords": ["tracking", "GPU"],
+                "interest": "medium",
+                "explanation": "Synthetic answer from the load-test server.",
+                "unknown_terms": [],
+                "confidence": 0.5,
+            }
+        )
+        if malformed:
+            content = content[: len(content) // 2]
+        prompt_tokens = (
+            self.prompt_tokens if self.prompt_tokens is not None else prompt_size // 4
+        )
+        return json.dumps(
+            {
+                "id": "chatcmpl-load-test",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": self.completion_tokens,
+                    "total_tokens": prompt_tokens + self.completion_tokens,
+                },
+            }
+        ).encode()
+
+
+class _MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockOpenAIServer
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.endswith("/chat/completions"):
+            self._reply(404, b'{"error": {"message": "Not found"}}')
+            return
+
+        delay, outcome = self.server.draw()
+        time.sleep(delay)
+        if outcome == "rate limited":
+            self._reply(
+                429,
+                b'{"error": {"message": "Rate limit reached", "type": "requests"}}',
+                {"retry-after-ms": "10"},
+            )
+            return
+        model = json.loads(body).get("model", "")
+        self._reply(200, self.server.answer(model, len(body), outcome == "malformed"))
+
+    def _reply(
+        self, status: int, data: bytes, headers: Optional[Dict[str, str]] = None
+    ):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def synthetic_event(n: int, seed: int = 1) -> List[Contribution]:
+    """Contributions for a made-up event, all with different abstracts (so none
+    are answered from the cache).
+
+    Args:
+        n (int): Number of contributions
+        seed (int): Seed for the words in the titles and abstracts
+
+    Returns:
+        List[Contribution]: The contributions.
+    """
+    rng = random.Random(seed)
+    return [
+        Contribution(
+            title=f"Talk {i}: " + " ".join(rng.choices(_WORDS, k=8)),
+            abstract=" ".join(rng.choices(_WORDS, k=rng.randint(80, 250))),
+            type="Talk",
+            startDate=None,
+            endDate=None,
+            roomFullname=None,
+            url=f"https://indico.example/event/1/contributions/{i}",
+            id=str(i),
+        )
+        for i in range(n)
+    ]
+
+
+def run_event(
+    contributions: List[Contribution], use_cache: bool
+) -> Dict[str, float | int]:
+    """Rank an event with `process_contributions`, timing each contribution.
+
+    Args:
+        contributions (List[Contribution]): The event
+        use_cache (bool): Rank through the LLM cache, as `abstract_ranker` does
+
+    Returns:
+        Dict[str, float | int]: What was measured.
+    """
+    from abstract_ranker.config import abstract_ranking_prompt
+    from abstract_ranker.driver import process_contributions
+
+    latencies: List[float] = []
+    failed = 0
+    remaining: Iterator[Contribution] = iter(contributions)
+    start = time.perf_counter()
+    last = start
+    while True:
+        try:
+            for _ in process_contributions(
+                remaining, abstract_ranking_prompt, MODEL, use_cache
+            ):
+                now = time.perf_counter()
+                latencies.append(now - last)
+                last = now
+            break
+        except Exception:
+            # The contribution that failed has been taken from `remaining`.
+            failed += 1
+            last = time.perf_counter()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        if len(latencies) == 0:
+            return math.nan
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return {
+        "elapsed": elapsed,
+        "ranked": len(latencies),
+        "failed": failed,
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 10_000],
+        help="Contributions in each synthetic event",
+    )
+    parser.add_argument(
+        "--latency",
+        type=parse_latency,
+        default=parse_latency("lognormal:5:0.5"),
+        help="Server latency in ms: fixed:MS, uniform:LOW:HIGH or "
+        "lognormal:MEDIAN:SIGMA (default lognormal:5:0.5)",
+    )
+    parser.add_argument(
+        "--rate-limited",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with a 429",
+    )
+    parser.add_argument(
+        "--malformed",
+        type=float,
+        default=0.0,
+        help="Fraction of answers that are malformed JSON",
+    )
+    parser.add_argument(
+        "--prompt-tokens",
+        type=int,
+        default=None,
+        help="Prompt tokens reported per request (default: request size / 4)",
+    )
+    parser.add_argument(
+        "--completion-tokens",
+        type=int,
+        default=150,
+        help="Completion tokens per answer",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Skip the LLM cache (like --ignore-cache)",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Also trace the peak Python memory with tracemalloc (slows the run)",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Each malformed answer is logged as an error - expected here.
+    logging.disable(logging.ERROR)
+
+    server = MockOpenAIServer(
+        args.latency,
+        args.rate_limited,
+        args.malformed,
+        args.prompt_tokens,
+        args.completion_tokens,
+        args.seed,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "load-test"
+
+    print(f"Mock OpenAI server at {server.base_url}, ranking with {MODEL}")
+    print(
+        f"{'size':>6} {'contrib/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'failed':>6} {'requests':>8} {'429s':>6} {'bad':>6} "
+        f"{'RSS MB':>8} {'change':>7}" + (f" {'peak MB':>8}" if args.memory else "")
+    )
+
+    # The cache and any lock files go in a scratch directory, not the real cache.
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            # First queries pay for imports and connections - keep them out.
+            run_event(synthetic_event(5, seed=0), not args.no_cache)
+            server.counts = dict.fromkeys(server.counts, 0)
+
+            for size in args.sizes:
+                event = synthetic_event(size, args.seed + size)
+                before_counts = dict(server.counts)
+                rss_before = rss_bytes()
+                if args.memory:
+                    tracemalloc.start()
+
+                result = run_event(event, not args.no_cache)
+
+                peak = tracemalloc.get_traced_memory()[1] if args.memory else 0
+                tracemalloc.stop()
+                rss = rss_bytes()
+                requests = server.counts["requests"] - before_counts["requests"]
+                limited = server.counts["rate limited"] - before_counts["rate limited"]
+                malformed = server.counts["malformed"] - before_counts["malformed"]
+                print(
+                    f"{size:6d} {result['ranked'] / result['elapsed']:10.1f} "
+                    f"{result['p50'] * 1000:8.1f} {result['p95'] * 1000:8.1f} "
+                    f"{result['p99'] * 1000:8.1f} {result['failed']:6d} "
+                    f"{requests:8d} {limited:6d} {malformed:6d} "
+                    f"{(rss or 0) / 1024**2:8.1f} "
+                    f"{((rss or 0) - (rss_before or 0)) / 1024**2:+7.1f}"
+                    + (f" {peak / 1024**2:8.1f}" if args.memory else "")
+                )
+        finally:
+            os.chdir(working_dir)
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
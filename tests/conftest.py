@@ -1,6 +1,10 @@
+from datetime import datetime
+from typing import Any, Optional
 from unittest.mock import patch
 import pytest
 
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+
 
 def pytest_configure(config):
     """Add custom markers to pytest.
@@ -46,8 +50,76 @@ def cache_dir(tmp_path):
 
 @pytest.fixture(autouse=True)
 def setup_before_test():
+    from abstract_ranker.llm_utils import reset as reset_llm_queries
+
+    reset_llm_queries()
+
     if is_torch_installed():
         "Reset state"
         from abstract_ranker.local_llms import reset
 
         reset()
+
+
+def _contribution(
+    title: str = "A talk", abstract: str = "", **fields: Any
+) -> Contribution:
+    return Contribution(
+        **{
+            "title": title,
+            "abstract": abstract,
+            "type": None,
+            "startDate": None,
+            "endDate": None,
+            "roomFullname": None,
+            "url": None,
+            **fields,
+        }
+    )
+
+
+def _answer(interest: str = "high", **fields: Any) -> AbstractLLMResponse:
+    return AbstractLLMResponse(
+        **{
+            "summary": "",
+            "experiment": "",
+            "keywords": [],
+            "interest": interest,
+            "explanation": "",
+            "confidence": 0.9,
+            "unknown_terms": [],
+            "source": "GPT4o",
+            **fields,
+        }
+    )
+
+
+def _ranking(
+    i: int,
+    interest: str = "medium",
+    confidence: float = 0.5,
+    start: Optional[datetime] = None,
+):
+    contrib = _contribution(f"Talk {i}", startDate=start, id=str(i))
+    return contrib, _answer(interest, confidence=confidence)
+
+
+@pytest.fixture
+def make_contribution():
+    """Build a `Contribution`: `make_contribution(title, abstract, **fields)`, with
+    any field not given left empty."""
+    return _contribution
+
+
+@pytest.fixture
+def make_answer():
+    """Build a `GPT4o` answer: `make_answer(interest, **fields)`, with any field not
+    given left empty (confidence 0.9)."""
+    return _answer
+
+
+@pytest.fixture
+def make_ranking():
+    """Build a ranked contribution `Talk {i}` with id `i`:
+    `make_ranking(i, interest, confidence, start)`."""
+    return _ranking
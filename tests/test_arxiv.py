@@ -3,56 +3,100 @@ import pickle
 
 import pytest
 from abstract_ranker.arxiv import (
+    ArxivStream,
     arxiv_contributions,
+    arxiv_ranked_filename,
     load_arxiv_abstract,
 )
-from unittest.mock import patch, MagicMock
+from abstract_ranker.arxiv_store import paper_from_result
+from unittest.mock import patch
+
+
+@pytest.fixture()
+def arxiv_data():
+    with open("tests/data/hep-ex-10.pkl", "rb") as file:
+        return pickle.load(file)
 
 
 @patch("abstract_ranker.arxiv.arxiv.Search")
 @patch("abstract_ranker.arxiv.arxiv.Client")
-def test_load_single_topic(MockClient, MockSearch):
-    import arxiv
-
+def test_load_single_topic(MockClient, MockSearch, arxiv_data):
     mock_client_instance = MockClient.return_value
-    mock_client_instance.results.return_value = [
-        MagicMock(spec=arxiv.Result) for _ in range(10)
-    ]
+    mock_client_instance.results.return_value = arxiv_data
 
     r = load_arxiv_abstract(["hep-ex"], datetime.now())
 
     assert len(r) == 10
     assert MockSearch.call_count == 1
     assert MockSearch.call_args[1]["query"].startswith("(cat:hep-ex) AND submittedDate")
+    assert MockSearch.call_args[1]["max_results"] is None
 
 
 @patch("abstract_ranker.arxiv.arxiv.Search")
 @patch("abstract_ranker.arxiv.arxiv.Client")
-def test_load_two_topics_topic(MockClient, MockSearch):
-    import arxiv
-
+def test_load_two_topics_topic(MockClient, MockSearch, arxiv_data):
     mock_client_instance = MockClient.return_value
-    mock_client_instance.results.return_value = [
-        MagicMock(spec=arxiv.Result) for _ in range(10)
-    ]
+    mock_client_instance.results.side_effect = [arxiv_data[:6], arxiv_data[4:]]
 
-    load_arxiv_abstract(["hep-ex", "hep-ph"], datetime.now())
+    r = load_arxiv_abstract(["hep-ex", "hep-ph"], datetime.now())
 
-    assert MockSearch.call_count == 1
-    assert MockSearch.call_args[1]["query"].startswith(
-        "(cat:hep-ex OR cat:hep-ph) AND submittedDate"
+    # One query per category, and cross-listed papers only show up once.
+    assert MockSearch.call_count == 2
+    assert MockSearch.call_args_list[0][1]["query"].startswith(
+        "(cat:hep-ex) AND submittedDate"
+    )
+    assert MockSearch.call_args_list[1][1]["query"].startswith(
+        "(cat:hep-ph) AND submittedDate"
     )
+    assert len(r) == 10
 
 
-@pytest.fixture()
-def arxiv_data():
-    with open("tests/data/hep-ex-10.pkl", "rb") as file:
-        return pickle.load(file)
+@patch("abstract_ranker.arxiv.arxiv.Search")
+@patch("abstract_ranker.arxiv.arxiv.Client")
+def test_load_days_reuses_shards(MockClient, MockSearch, arxiv_data, cache_dir):
+    "Overlapping date ranges only fetch the days not already cached"
+    mock_client_instance = MockClient.return_value
+    mock_client_instance.results.return_value = arxiv_data
+
+    load_arxiv_abstract(["hep-ex"], datetime(2024, 5, 1), datetime(2024, 5, 3))
+    assert MockSearch.call_count == 3
+
+    r = load_arxiv_abstract(["hep-ex"], datetime(2024, 5, 2), datetime(2024, 5, 4))
+    assert MockSearch.call_count == 4
+    assert "20240504" in MockSearch.call_args[1]["query"]
+    assert len(r) == 10
+
+    assert (cache_dir / "arxiv" / "shards" / "hep-ex" / "2024-05-04.json").exists()
+
+
+@patch("abstract_ranker.arxiv.arxiv.Search")
+@patch("abstract_ranker.arxiv.arxiv.Client")
+def test_load_recent_day_not_cached(MockClient, MockSearch, arxiv_data):
+    "Yesterday can still change, so it is fetched every time"
+    mock_client_instance = MockClient.return_value
+    mock_client_instance.results.return_value = arxiv_data
+
+    load_arxiv_abstract(["hep-ex"], datetime.now())
+    load_arxiv_abstract(["hep-ex"], datetime.now())
+    assert MockSearch.call_count == 2
+
+
+def test_filename_range():
+    assert (
+        arxiv_ranked_filename(datetime(2024, 5, 1), ["hep-ph", "hep-ex"]).name
+        == "arxiv-2024-05-01-hep-ex-hep-ph.csv"
+    )
+    assert (
+        arxiv_ranked_filename(
+            datetime(2024, 5, 1), ["hep-ex"], datetime(2024, 5, 7)
+        ).name
+        == "arxiv-2024-05-01-to-2024-05-07-hep-ex.csv"
+    )
 
 
 def test_contribution_conversion(arxiv_data):
     "Make sure we do the conversion correctly"
-    r = list(arxiv_contributions(arxiv_data))
+    r = list(arxiv_contributions(paper_from_result(p) for p in arxiv_data))
 
     assert len(r) == 10
     assert (
@@ -61,3 +105,89 @@ def test_contribution_conversion(arxiv_data):
     )
     assert r[0].url is not None
     assert r[0].url.startswith("http://arxiv.org/pdf")
+    assert r[0].id == "2408.15227"
+
+
+@patch("abstract_ranker.arxiv.arxiv.Search")
+@patch("abstract_ranker.arxiv.arxiv.Client")
+def test_stream_ranks_before_fetch_done(MockClient, MockSearch, arxiv_data):
+    "The first submission is handed on while later pages are still being fetched"
+    import threading
+
+    first_received = threading.Event()
+
+    def results(search):
+        yield arxiv_data[0]
+        assert first_received.wait(5)
+        yield from arxiv_data[1:]
+
+    MockClient.return_value.results.side_effect = results
+
+    stream = ArxivStream(["hep-ex"], datetime.now())
+    assert stream.estimated_total is None
+
+    received = []
+    for r in stream:
+        received.append(r)
+        first_received.set()
+
+    assert len(received) == 10
+    assert stream.estimated_total == 10
+
+
+@patch("abstract_ranker.arxiv.arxiv.Search")
+@patch("abstract_ranker.arxiv.arxiv.Client")
+def test_stream_estimates_from_cached_shards(MockClient, MockSearch, arxiv_data):
+    MockClient.return_value.results.return_value = arxiv_data
+    load_arxiv_abstract(["hep-ex"], datetime(2024, 5, 1))
+
+    stream = ArxivStream(["hep-ex"], datetime(2024, 5, 1), datetime(2024, 5, 3))
+    it = iter(stream)
+    next(it)
+
+    # 10 in the cached day, so about 10 in each of the other two.
+    assert stream.estimated_total == 30
+
+
+@patch("abstract_ranker.arxiv.arxiv.Search")
+@patch("abstract_ranker.arxiv.arxiv.Client")
+def test_stream_fetch_error(MockClient, MockSearch):
+    MockClient.return_value.results.side_effect = RuntimeError("arXiv is down")
+
+    with pytest.raises(RuntimeError):
+        list(ArxivStream(["hep-ex"], datetime.now()))
+
+
+def test_client_reports_first_page_total():
+    import arxiv
+
+    from abstract_ranker.arxiv import _arxiv_client
+
+    class header:
+        total_results = 42
+
+    class feed:
+        pass
+
+    feed.header = header  # type: ignore
+
+    totals = []
+    client = _arxiv_client(totals.append)
+    assert isinstance(client, arxiv.Client)
+    with patch.object(arxiv.Client, "_parse_feed", return_value=feed) as parse_feed:
+        client._parse_feed("http://export.arxiv.org/api/query", True)
+        client._parse_feed("http://export.arxiv.org/api/query", False)
+
+    assert totals == [42]
+    assert parse_feed.call_count == 2
+
+
+def test_client_unknown_arxiv_version():
+    "A client whose private method has changed is used as is"
+    from abstract_ranker.arxiv import _page_reporting_client
+
+    class NewClient:
+        def _parse_feed(self, request, *, page):
+            pass
+
+    assert _page_reporting_client(NewClient) is None
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+
+from abstract_ranker.arxiv_index import ArxivRankedIndex
+from abstract_ranker.arxiv_store import ArxivPaper
+
+
+@pytest.fixture
+def make_paper(make_contribution):
+    "Version `version` of one arXiv paper"
+
+    def make(version: int, abstract: str = "We measure the thing."):
+        return make_contribution(
+            "A measurement",
+            abstract,
+            startDate=datetime(2024, 5, 1),
+            endDate=datetime(2024, 5, 1),
+            url=f"http://arxiv.org/pdf/2405.01234v{version}",
+            id="2405.01234",
+        )
+
+    return make
+
+
+def test_new_version_same_abstract_carried(make_paper, make_answer):
+    index = ArxivRankedIndex()
+    assert index.lookup(make_paper(1)) is None
+    index.add(make_paper(1), make_answer())
+
+    carried = index.lookup(make_paper(2))
+    assert carried is not None
+    assert carried.interest == "high"
+    assert carried.source == "GPT4o (ranked as v1)"
+    assert (index.checked, index.seen) == (2, 1)
+
+
+def test_tracked_version_recorded(make_paper, make_answer):
+    "The version noted as the papers stream past is the one recorded"
+    contrib = make_paper(3)
+    paper = ArxivPaper(
+        id=contrib.id,
+        version=3,
+        title=contrib.title,
+        abstract=contrib.abstract,
+        published=datetime(2024, 5, 1),
+        updated=datetime(2024, 5, 1),
+        categories=["hep-ex"],
+        pdf_url=contrib.url,
+        abs_url="http://arxiv.org/abs/2405.01234v3",
+    )
+    index = ArxivRankedIndex()
+    assert list(index.track([paper])) == [paper]
+    index.add(contrib, make_answer())
+
+    carried = index.lookup(make_paper(4))
+    assert carried is not None
+    assert carried.source == "GPT4o (ranked as v3)"
+
+
+def test_new_version_changed_abstract_ranked(make_paper, make_answer):
+    index = ArxivRankedIndex()
+    index.add(make_paper(1), make_answer())
+
+    assert index.lookup(make_paper(2, "We measure the thing, and another.")) is None
+
+
+def test_index_persists(cache_dir, make_paper, make_answer):
+    index = ArxivRankedIndex.for_model("GPT4o", "prompt", ["topic"])
+    index.add(make_paper(1), make_answer())
+    index.save()
+
+    assert len(ArxivRankedIndex.for_model("GPT4o", "prompt", ["topic"])) == 1
+    assert len(ArxivRankedIndex.for_model("GPT4o", "prompt", ["other"])) == 0
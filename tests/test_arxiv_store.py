@@ -0,0 +1,90 @@
+import json
+import pickle
+from datetime import datetime
+
+import joblib
+import pytest
+
+from abstract_ranker.arxiv_store import (
+    convert_arxiv_cache,
+    paper_from_result,
+    read_shard,
+    shard_path,
+    split_arxiv_id,
+    write_shard,
+)
+
+
+@pytest.fixture()
+def arxiv_data():
+    with open("tests/data/hep-ex-10.pkl", "rb") as file:
+        return pickle.load(file)
+
+
+def test_paper_from_result(arxiv_data):
+    paper = paper_from_result(arxiv_data[0])
+
+    assert paper.id == "2408.15227"
+    assert paper.version == 1
+    assert paper.categories[0] == "hep-ex"
+    assert paper.pdf_url == "http://arxiv.org/pdf/2408.15227v1"
+
+
+def test_split_arxiv_id():
+    assert split_arxiv_id("2405.01234v2") == ("2405.01234", 2)
+    assert split_arxiv_id("2405.01234") == ("2405.01234", 1)
+    assert split_arxiv_id("hep-ex/0101001v1") == ("hep-ex/0101001", 1)
+
+
+def test_shard_round_trip(arxiv_data, tmp_path):
+    papers = [paper_from_result(r) for r in arxiv_data]
+    write_shard(tmp_path / "shard.json", papers)
+
+    assert read_shard(tmp_path / "shard.json") == papers
+    assert not (tmp_path / "shard.json.tmp").exists()
+
+
+def test_shard_other_format(tmp_path):
+    (tmp_path / "shard.json").write_text(json.dumps({"format": 0, "columns": {}}))
+    assert read_shard(tmp_path / "shard.json") is None
+    assert read_shard(tmp_path / "missing.json") is None
+
+
+def test_convert_pickle_shards(arxiv_data, cache_dir):
+    pkl = cache_dir / "arxiv" / "shards" / "hep-ex" / "2024-08-27.pkl"
+    pkl.parent.mkdir(parents=True)
+    joblib.dump(arxiv_data, pkl)
+
+    assert convert_arxiv_cache() == 1
+
+    assert not pkl.exists()
+    papers = read_shard(shard_path("hep-ex", datetime(2024, 8, 27)))
+    assert papers is not None
+    assert len(papers) == 10
+
+
+def test_convert_original_cache(arxiv_data, cache_dir):
+    entry = (
+        cache_dir / "arxiv" / "abstract_ranker" / "arxiv" / "load_arxiv_abstract" / "a"
+    )
+    entry.mkdir(parents=True)
+    joblib.dump(arxiv_data, entry / "output.pkl")
+    (entry / "metadata.json").write_text(
+        json.dumps(
+            {
+                "input_args": {
+                    "topic_list": "['hep-ex', 'hep-ph']",
+                    "what_day": "datetime.datetime(2024, 8, 27, 0, 0, 1)",
+                },
+                "time": datetime(2024, 9, 10).timestamp(),
+            }
+        )
+    )
+
+    assert convert_arxiv_cache() == 2
+
+    hep_ex = read_shard(shard_path("hep-ex", datetime(2024, 8, 27)))
+    hep_ph = read_shard(shard_path("hep-ph", datetime(2024, 8, 27)))
+    assert hep_ex is not None and hep_ph is not None
+    assert len(hep_ex) == len([r for r in arxiv_data if "hep-ex" in r.categories])
+    assert all("hep-ph" in p.categories for p in hep_ph)
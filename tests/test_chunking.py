@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+
+def _minutes(n_projects: int, paragraphs: int = 4) -> str:
+    sections = []
+    for p in range(n_projects):
+        body = "\n\n".join(
+            f"Project {p} paragraph {i}: " + " ".join(["discussion"] * 40)
+            for i in range(paragraphs)
+        )
+        sections.append(f"## Project {p}\n\n{body}")
+    return "# Annual Meeting\n\n" + "\n\n".join(sections)
+
+
+def test_split_short_text():
+    from abstract_ranker.chunking import split_text
+
+    assert split_text("Just one line.", 100) == ["Just one line."]
+
+
+def test_split_respects_size_and_keeps_everything():
+    from abstract_ranker.chunking import count_tokens, split_text
+
+    text = _minutes(6)
+    chunks = split_text(text, 400, overlap_tokens=0)
+    assert len(chunks) > 1
+    assert all(count_tokens(c) <= 400 for c in chunks)
+    assert "\n\n".join(chunks) == text
+
+
+def test_split_breaks_at_headings():
+    "Sections that fit in a chunk are not cut in two"
+    from abstract_ranker.chunking import split_text
+
+    chunks = split_text(_minutes(6, paragraphs=2), 400)
+    assert len(chunks) > 1
+    assert all(c.startswith("## Project") or c.startswith("# ") for c in chunks)
+
+
+def test_split_overlap():
+    from abstract_ranker.chunking import split_text
+
+    chunks = split_text(_minutes(1, paragraphs=20), 300, overlap_tokens=150)
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last_paragraph = previous.split("\n\n")[-1]
+        assert chunk.startswith(last_paragraph)
+
+
+def test_split_huge_paragraph():
+    from abstract_ranker.chunking import count_tokens, split_text
+
+    text = " ".join(["word"] * 5000)
+    chunks = split_text(text, 200)
+    assert all(count_tokens(c) <= 200 for c in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_map_reduce():
+    from abstract_ranker.chunking import map_reduce_summarize, split_text
+
+    with patch("abstract_ranker.chunking.summarize_llm") as mock_summarize:
+        mock_summarize.side_effect = lambda prompt, context, model, use_cache: (
+            f"{prompt}:{len(context['text'])}"
+        )
+        r = map_reduce_summarize(
+            _minutes(6), "map", "reduce", "GPT4o", True, max_tokens=400
+        )
+
+    prompts = [c.args[0] for c in mock_summarize.call_args_list]
+    assert prompts.count("reduce") == 1
+    assert prompts.count("map") == len(split_text(_minutes(6), 400, 200))
+    assert r.startswith("reduce:")
+
+
+def test_map_reduce_short_text_is_one_query():
+    from abstract_ranker.chunking import map_reduce_summarize
+
+    with patch("abstract_ranker.chunking.summarize_llm") as mock_summarize:
+        mock_summarize.return_value = "# Summary"
+        assert map_reduce_summarize("Short", "map", "reduce", "GPT4o", True) == (
+            "# Summary"
+        )
+    mock_summarize.assert_called_once_with("map", {"text": "Short"}, "GPT4o", True)
+
+
+def test_map_reduce_short_text_single_prompt():
+    "Text that fits in one chunk is summarized whole, not as a part"
+    from abstract_ranker.chunking import map_reduce_summarize
+
+    with patch("abstract_ranker.chunking.summarize_llm") as mock_summarize:
+        mock_summarize.return_value = "# Summary"
+        map_reduce_summarize(
+            "Short", "map", "reduce", "GPT4o", True, single_prompt="whole"
+        )
+    mock_summarize.assert_called_once_with("whole", {"text": "Short"}, "GPT4o", True)
+
+
+def test_chunks_are_cached(cache_dir):
+    "Re-running with one chunk changed only re-summarizes that chunk"
+    from abstract_ranker.chunking import map_reduce_summarize
+
+    text = _minutes(6) + " cache-test"
+    with patch("abstract_ranker.llm_utils.local_summarize_gpt") as mock_gpt:
+        mock_gpt.return_value = "## Project\n\n### Action Items\n- Item"
+        map_reduce_summarize(text, "map", "reduce", "GPT4o", True, max_tokens=400)
+        first_calls = mock_gpt.call_count
+
+        edited = text.replace("Project 5 paragraph 3", "Project 5 paragraph three")
+        map_reduce_summarize(edited, "map", "reduce", "GPT4o", True, max_tokens=400)
+
+    # The changed chunk, and nothing else (the merged partial summaries are the
+    # same, so even the reduce step comes from the cache).
+    assert mock_gpt.call_count - first_calls == 1
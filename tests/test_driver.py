@@ -0,0 +1,92 @@
+from unittest.mock import patch
+
+
+def test_simple_run(make_contribution, make_answer):
+    from abstract_ranker.driver import process_contributions
+
+    with patch("abstract_ranker.driver.query_llm") as mock_query:
+        mock_query.return_value = make_answer("high", confidence=0.9)
+
+        r = list(
+            process_contributions(
+                (make_contribution(t, f"The abstract for {t}") for t in ["one", "two"]),
+                "prompt",
+                "GPT4o",
+                True,
+            )
+        )
+
+        assert len(r) == 2
+        assert all(s.source == "GPT4o" for _, s in r)
+        assert mock_query.call_count == 2
+
+
+def test_cascade_escalation(make_contribution, make_answer):
+    "Only interesting or uncertain answers go to the expensive model"
+    from abstract_ranker.driver import ModelCascade, process_contributions
+
+    cheap_answers = {
+        "boring": make_answer("low", confidence=0.9),
+        "unsure": make_answer("low", confidence=0.2),
+        "interesting": make_answer("high", confidence=0.9),
+    }
+
+    def fake_query(prompt, context, model, use_cache):
+        if model == "GPT4o-mini":
+            return cheap_answers[context["title"]]
+        return make_answer("medium", confidence=0.8)
+
+    with patch("abstract_ranker.driver.query_llm", side_effect=fake_query) as mock_q:
+        cascade = ModelCascade("GPT4o-mini", "medium", 0.7)
+        r = list(
+            process_contributions(
+                (make_contribution(t, f"The abstract for {t}") for t in cheap_answers),
+                "prompt",
+                "GPT4o",
+                True,
+                cascade=cascade,
+            )
+        )
+
+        sources = {c.title: s.source for c, s in r}
+        assert sources["boring"] == "GPT4o-mini"
+        assert sources["unsure"] == "GPT4o (escalated from GPT4o-mini)"
+        assert sources["interesting"] == "GPT4o (escalated from GPT4o-mini)"
+        assert mock_q.call_count == 5
+
+        assert cascade.ranked == 3
+        assert cascade.escalated == 2
+        assert "escalated 2 of 3" in cascade.summary("GPT4o")
+        assert "cost saved $" in cascade.summary("GPT4o")
+
+
+def test_cascade_lexical_first(make_contribution, make_answer):
+    from abstract_ranker.driver import ModelCascade, process_contributions
+
+    with patch("abstract_ranker.driver.query_llm") as mock_query:
+        mock_query.return_value = make_answer("high", confidence=0.9)
+        cascade = ModelCascade("lexical", "high", 0.0)
+
+        r = list(
+            process_contributions(
+                (
+                    make_contribution(t, f"The abstract for {t}")
+                    for t in ["Lattice gauge theory", "Pizza"]
+                ),
+                "prompt",
+                "GPT4o",
+                True,
+                cascade=cascade,
+            )
+        )
+
+        assert len(r) == 2
+        assert mock_query.call_count == 0
+        assert all(s.source == "lexical" for _, s in r)
+
+
+def test_cascade_unknown_cost():
+    from abstract_ranker.driver import ModelCascade
+
+    cascade = ModelCascade("GPT4o-mini", "medium", 0.7)
+    assert "unknown" in cascade.summary("not-a-real-model")
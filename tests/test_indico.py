@@ -1,26 +1,110 @@
+import io
 import json
+import re
+from datetime import timedelta
 from pathlib import Path
-from unittest.mock import patch
+from typing import Any, Dict, List, Optional
+from unittest.mock import MagicMock, patch
 
-from abstract_ranker.indico import generate_ranking_csv_filename, indico_contributions
+import pytest
+import requests
 
 
-def test_good_load(cache_dir):
+class _RawStream(io.BytesIO):
+    "Stands in for `response.raw`"
+
+    decode_content = False
+
+
+def _response(
+    status_code: int = 200, data: bytes = b"", headers: Optional[Dict[str, str]] = None
+) -> MagicMock:
+    response = MagicMock()
+    response.status_code = status_code
+    response.raw = _RawStream(data)
+    response.headers = headers if headers is not None else {}
+    return response
+
+
+@pytest.fixture
+def mock_session():
+    "Replace the indico HTTP session, serving the ACAT 2024 export"
+    data = Path("tests/data/1330797.json").read_bytes()
+    with patch("abstract_ranker.indico._get_session") as mock_get_session:
+        session = mock_get_session.return_value
+        session.get.side_effect = lambda *args, **kwargs: _response(
+            200, data, {"ETag": '"acat-1"'}
+        )
+        yield session
+
+
+def test_good_load(cache_dir, mock_session):
     expected_url = (
         "https://indico.cern.ch/export/event/1330797.json?detail=contributions"
     )
-    text_json = Path("tests/data/1330797.json").read_text()
-    parsed_json = json.loads(text_json)
 
-    with patch("requests.get") as mock_get:
-        mock_get.return_value.json.return_value = parsed_json
+    from abstract_ranker.indico import load_indico_json
+
+    data = load_indico_json("https://indico.cern.ch/event/1330797")
+    assert mock_session.get.call_args[0][0] == expected_url
+    assert "timeout" in mock_session.get.call_args[1]
+
+    assert data["title"] == "ACAT 2024"
+
+
+def test_load_uses_fresh_cache(cache_dir, mock_session):
+    from abstract_ranker.indico import load_indico_json
+
+    load_indico_json("https://indico.cern.ch/event/1330797")
+    data = load_indico_json("https://indico.cern.ch/event/1330797")
+
+    assert data["title"] == "ACAT 2024"
+    assert mock_session.get.call_count == 1
+
+
+def test_load_revalidates_stale_cache(cache_dir, mock_session):
+    "An old cached copy is checked with the server, and a 304 costs no download"
+    from abstract_ranker.indico import load_indico_json
+
+    load_indico_json("https://indico.cern.ch/event/1330797")
+
+    mock_session.get.side_effect = lambda *args, **kwargs: _response(304)
+    data = load_indico_json("https://indico.cern.ch/event/1330797", timedelta(0))
+
+    assert data["title"] == "ACAT 2024"
+    assert mock_session.get.call_count == 2
+    assert mock_session.get.call_args[1]["headers"]["If-None-Match"] == '"acat-1"'
+
 
-        from abstract_ranker.indico import load_indico_json
+def test_load_refresh(cache_dir, mock_session):
+    "A refresh downloads again, with no conditional headers"
+    from abstract_ranker.indico import load_indico_json
 
-        data = load_indico_json("https://indico.cern.ch/event/1330797")
-        mock_get.assert_called_with(expected_url)
+    load_indico_json("https://indico.cern.ch/event/1330797")
+    load_indico_json("https://indico.cern.ch/event/1330797", refresh=True)
 
-        assert data["title"] == "ACAT 2024"
+    assert mock_session.get.call_count == 2
+    assert mock_session.get.call_args[1]["headers"] == {}
+
+
+def test_fetch_export(cache_dir, mock_session):
+    "The export is cached without parsing, and a 304 leaves the file alone"
+    from abstract_ranker.indico import fetch_indico_export, load_indico_json
+
+    path = fetch_indico_export("https://indico.cern.ch/event/1330797")
+    assert path.exists()
+    version = path.stat().st_mtime_ns
+
+    mock_session.get.side_effect = lambda *args, **kwargs: _response(304)
+    assert fetch_indico_export(
+        "https://indico.cern.ch/event/1330797", timedelta(0)
+    ) == (path)
+    assert path.stat().st_mtime_ns == version
+    assert mock_session.get.call_count == 2
+
+    data = load_indico_json("https://indico.cern.ch/event/1330797")
+    assert data["title"] == "ACAT 2024"
+    assert mock_session.get.call_count == 2
 
 
 def test_parse_straight_url():
@@ -42,26 +126,232 @@ def test_parse_with_slash():
 
 
 def test_filename():
+    from abstract_ranker.indico import generate_ranking_csv_filename
+
     event = {"startDate": {"date": "2024-06-24"}, "title": "ACAT 2024"}
 
     assert generate_ranking_csv_filename(event).name == "2024-06-24 - ACAT 2024.csv"
 
 
-def test_good_contributions_conversion(cache_dir):
-    text_json = Path("tests/data/1330797.json").read_text()
-    parsed_json = json.loads(text_json)
+def test_good_contributions_conversion(cache_dir, mock_session):
+    from abstract_ranker.indico import indico_contributions, load_indico_json
+
+    data = load_indico_json("https://indico.cern.ch/event/1330797")
+
+    contributions = list(indico_contributions(data, None))
+
+    assert len(contributions) == 179
+    assert any("Introduction of dynamic job" in c.title for c in contributions)
+
+    assert contributions[0].url is not None
+    assert contributions[0].url.startswith("https://indico.cern.ch/event")
+
+
+def test_contributions_validated_as_yielded():
+    from pydantic import ValidationError
+
+    from abstract_ranker.indico import indico_contributions
+
+    good = {
+        "title": "A talk",
+        "description": "About things",
+        "type": None,
+        "startDate": {"date": "2024-03-15", "time": "15:55:00", "tz": "Europe/Zurich"},
+        "endDate": None,
+        "roomFullname": None,
+        "url": None,
+        "id": 12,
+    }
+    bad_date = dict(good, startDate={"date": "2024-03-15"})
+    for bad in [bad_date, dict(good, title=None)]:
+        contributions = indico_contributions({"contributions": [good, bad]}, None)
+
+        # The first one comes out before the bad one is looked at.
+        first = next(contributions)
+        assert first.id == "12"
+        assert first.abstract == "About things"
+        assert first.startDate is not None and first.startDate.hour == 15
+
+        with pytest.raises(ValidationError):
+            next(contributions)
+
+
+def test_stream_contributions(cache_dir, mock_session):
+    from abstract_ranker.indico import (
+        convert_indico_contributions,
+        stream_indico_json,
+    )
+
+    info, raw_contributions = stream_indico_json("https://indico.cern.ch/event/1330797")
+    assert info["title"] == "ACAT 2024"
+    assert "contributions" not in info
+
+    contributions = list(convert_indico_contributions(raw_contributions, None))
+    assert len(contributions) == 179
+    assert mock_session.get.call_args[1]["stream"] is True
+
+    # The second time around it comes from the cache
+    info, raw_contributions = stream_indico_json("https://indico.cern.ch/event/1330797")
+    assert len(list(raw_contributions)) == 179
+    assert mock_session.get.call_count == 1
+
+
+def test_stream_interrupted_not_cached(cache_dir, mock_session):
+    from abstract_ranker.indico import stream_indico_json
+
+    _, raw_contributions = stream_indico_json("https://indico.cern.ch/event/1330797")
+    next(raw_contributions)
+    raw_contributions.close()
+
+    _, raw_contributions = stream_indico_json("https://indico.cern.ch/event/1330797")
+    assert len(list(raw_contributions)) == 179
+    assert mock_session.get.call_count == 2
+
+
+def test_stream_download_runs_ahead(cache_dir, mock_session):
+    "The download doesn't wait for the contributions to be consumed"
+    import time
+
+    from abstract_ranker.indico import indico_export_path, stream_indico_json
+
+    data = Path("tests/data/1330797.json").read_bytes()
+    response = _response(200, data)
+    mock_session.get.side_effect = None
+    mock_session.get.return_value = response
+
+    _, raw_contributions = stream_indico_json("https://indico.cern.ch/event/1330797")
+    next(raw_contributions)
+
+    deadline = time.monotonic() + 10
+    while response.raw.tell() < len(data) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert response.raw.tell() == len(data)
+
+    assert len(list(raw_contributions)) == 178
+    cached = indico_export_path("https://indico.cern.ch/event/1330797")
+    assert cached.read_bytes() == data
+
+
+def test_stream_download_error_not_cached(cache_dir, mock_session):
+    "A download that breaks off is reported, and not cached"
+    from abstract_ranker.indico import indico_export_path, stream_indico_json
+
+    data = Path("tests/data/1330797.json").read_bytes()
+
+    class _BrokenStream(_RawStream):
+        "Breaks off half way through the contributions"
+
+        def read(self, size=-1):
+            if self.tell() > len(data) // 2:
+                raise requests.ConnectionError("Connection reset")
+            return super().read(min(size, 1000))
+
+    response = _response(200)
+    response.raw = _BrokenStream(data)
+    mock_session.get.side_effect = None
+    mock_session.get.return_value = response
+
+    with pytest.raises(requests.ConnectionError):
+        _, raw_contributions = stream_indico_json(
+            "https://indico.cern.ch/event/1330797"
+        )
+        list(raw_contributions)
+    cached = indico_export_path("https://indico.cern.ch/event/1330797")
+    assert not cached.exists()
+    assert not cached.with_suffix(".partial").exists()
+
+
+@pytest.fixture
+def mock_split_session():
+    "Serve the ACAT 2024 export in pieces: info, timetable, and one per session"
+    event = json.loads(Path("tests/data/1330797.json").read_text())["results"][0]
+    contributions = event.pop("contributions")
+
+    session_ids: Dict[str, str] = {}
+    sessions: Dict[str, List[Dict[str, Any]]] = {}
+    timetable: Dict[str, Dict[str, Any]] = {}
+    for c in contributions:
+        if c["startDate"] is None:
+            # Not scheduled, so not on the timetable
+            continue
+        day = timetable.setdefault(c["startDate"]["date"].replace("-", ""), {})
+        if c["session"] is None:
+            day[f"c{c['id']}"] = {
+                "entryType": "Contribution",
+                "contributionId": c["id"],
+                "title": c["title"],
+                "description": c["description"],
+                "startDate": c["startDate"],
+                "endDate": c["endDate"],
+                "room": c["roomFullname"],
+                "url": c["url"],
+            }
+            continue
+        session_id = session_ids.setdefault(c["session"], str(len(session_ids) + 1))
+        sessions.setdefault(session_id, []).append(c)
+        day[f"s{session_id}"] = {"entryType": "Session", "sessionId": session_id}
+
+    # One contribution shows up in two sessions.
+    sessions["1"].append(sessions["2"][0])
+
+    def get(url, **kwargs):
+        m = re.search(r"/export/(.*)\.json", url)
+        assert m is not None
+        path = m.group(1)
+        if path == "event/1330797":
+            results: Any = [event]
+        elif path == "timetable/1330797":
+            results = {"1330797": timetable}
+        else:
+            session_id = path.split("/")[-1]
+            results = [{"id": session_id, "contributions": sessions[session_id]}]
+        return _response(200, json.dumps({"results": results}).encode())
+
+    with patch("abstract_ranker.indico._get_session") as mock_get_session:
+        session = mock_get_session.return_value
+        session.get.side_effect = get
+        yield session, len(session_ids)
+
+
+def test_split_load(cache_dir, mock_split_session):
+    from abstract_ranker.indico import indico_contributions, load_indico_json
+
+    session, n_sessions = mock_split_session
+    data = load_indico_json("https://indico.cern.ch/event/1330797", split=True)
+
+    assert data["title"] == "ACAT 2024"
+    assert session.get.call_count == 2 + n_sessions
+
+    contributions = list(indico_contributions(data, None))
+    # The 4 unscheduled contributions are not on the timetable
+    assert len(contributions) == 175
+    assert len({c.id for c in contributions}) == 175
+    starts = [c.startDate for c in contributions]
+    assert starts == sorted(starts)
+
+    # All the pieces are cached
+    load_indico_json("https://indico.cern.ch/event/1330797", split=True)
+    assert session.get.call_count == 2 + n_sessions
+
+
+def test_date_uses_offset_on_talk_date():
+    "The offset comes from the talk's date, not today's, so DST is handled"
+    from abstract_ranker.indico import IndicoDate
 
-    with patch("requests.get") as mock_get:
-        mock_get.return_value.json.return_value = parsed_json
+    winter = IndicoDate(date="2024-01-15", time="09:00:00", tz="Europe/Zurich")
+    summer = IndicoDate(date="2024-07-15", time="09:00:00", tz="Europe/Zurich")
 
-        from abstract_ranker.indico import load_indico_json
+    assert winter.get_datetime(None).isoformat() == "2024-01-15T09:00:00+01:00"
+    assert summer.get_datetime(None).isoformat() == "2024-07-15T09:00:00+02:00"
+    assert summer.get_datetime("UTC").isoformat() == "2024-07-15T07:00:00+00:00"
 
-        data = load_indico_json("https://indico.cern.ch/event/1330797")
 
-        contributions = list(indico_contributions(data, None))
+def test_date_across_dst_change():
+    "The week of the US DST change, in an event held in Zurich"
+    from abstract_ranker.indico import IndicoDate
 
-        assert len(contributions) == 179
-        assert any("Introduction of dynamic job" in c.title for c in contributions)
+    before = IndicoDate(date="2024-03-08", time="15:00:00", tz="Europe/Zurich")
+    after = IndicoDate(date="2024-03-11", time="15:00:00", tz="Europe/Zurich")
 
-        assert contributions[0].url is not None
-        assert contributions[0].url.startswith("https://indico.cern.ch/event")
+    assert before.get_datetime("US/Eastern").strftime("%H:%M") == "09:00"
+    assert after.get_datetime("US/Eastern").strftime("%H:%M") == "10:00"
@@ -0,0 +1,72 @@
+import json
+import time
+from pathlib import Path
+
+
+def test_scores_prefer_matching_topic():
+    from abstract_ranker.lexical import lexical_scores
+
+    similarity, _, _ = lexical_scores(
+        ["Differentiable programming for HEP analysis", "Lattice QCD on GPUs"],
+        ["Differentiable Programming", "Lattice Gauge Theory"],
+    )
+
+    assert similarity.shape == (2, 2)
+    assert similarity[0, 0] > similarity[0, 1]
+    assert similarity[1, 1] > similarity[1, 0]
+    assert (similarity >= 0).all() and (similarity <= 1.0 + 1e-9).all()
+
+
+def test_rank_levels(make_contribution):
+    from abstract_ranker.lexical import rank_lexical
+
+    contributions = [
+        make_contribution(
+            "ServiceX for columnar analysis",
+            "We describe the ServiceX data delivery tool used in ATLAS columnar "
+            "analysis with python.",
+        ),
+        make_contribution(
+            "Lattice gauge theory with quantum computing",
+            "Quantum computing algorithms for lattice gauge theory simulations.",
+        ),
+        make_contribution("Coffee break", ""),
+    ]
+
+    r = list(
+        rank_lexical(
+            contributions,
+            ["The ServiceX tool", "Columnar analysis"],
+            ["Quantum Computing", "Lattice Gauge Theory"],
+        )
+    )
+
+    assert [c.title for c, _ in r] == [c.title for c in contributions]
+    assert r[0][1].interest == "high"
+    assert r[0][1].experiment == "ATLAS"
+    assert r[0][1].source == "lexical"
+    assert "servicex" in r[0][1].keywords
+    assert r[1][1].interest == "low"
+    assert r[2][1].interest == "low"
+    assert r[2][1].summary == "Coffee break"
+
+
+def test_rank_empty():
+    from abstract_ranker.lexical import rank_lexical
+
+    assert list(rank_lexical([], ["a"], ["b"])) == []
+
+
+def test_rank_fast():
+    "A conference's worth of contributions should rank in well under a second"
+    from abstract_ranker.lexical import rank_lexical
+    from abstract_ranker.config import interested_topics, not_interested_topics
+    from abstract_ranker.indico import indico_contributions
+
+    data = json.loads(Path("tests/data/1330797.json").read_text())["results"][0]
+    contributions = list(indico_contributions(data, None)) * 3
+
+    start = time.time()
+    r = list(rank_lexical(contributions, interested_topics, not_interested_topics))
+    assert len(r) == len(contributions)
+    assert time.time() - start < 1.0
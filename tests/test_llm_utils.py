@@ -55,3 +55,200 @@ def test_cache(cache_dir):
         query_llm(prompt, context, "GPT4Turbo")
 
         assert mock_query_gpt.call_count == 1
+
+
+def test_single_flight_concurrent(cache_dir):
+    "Identical queries made at the same time should only go to the LLM once"
+    import threading
+    import time
+
+    calls = 0
+
+    def slow_query(prompt, context, model, name):
+        nonlocal calls
+        calls += 1
+        time.sleep(0.2)
+        return AbstractLLMResponse(
+            summary="slow",
+            experiment="",
+            keywords=[],
+            interest="low",
+            explanation="",
+            confidence=0.5,
+            unknown_terms=[],
+        )
+
+    with patch("abstract_ranker.llm_utils.local_query_gpt", side_effect=slow_query):
+        from abstract_ranker.llm_utils import AbstractLLMResponse, query_llm
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    query_llm("hi", {"title": "single-flight"}, "GPT4Turbo", False)
+                )
+            )
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert calls == 1
+        assert len(results) == 4
+        assert all(r.summary == "slow" for r in results)
+
+
+def test_single_flight_ignore_cache_not_shared(cache_dir):
+    "A query that skips the cache does not wait on a cached one for the same prompt"
+    import threading
+    import time
+
+    calls = []
+
+    def slow_query(prompt, context, model, name):
+        calls.append(model)
+        time.sleep(0.2)
+        return AbstractLLMResponse(
+            summary="slow",
+            experiment="",
+            keywords=[],
+            interest="low",
+            explanation="",
+            confidence=0.5,
+            unknown_terms=[],
+        )
+
+    with patch("abstract_ranker.llm_utils.local_query_gpt", side_effect=slow_query):
+        from abstract_ranker.llm_utils import AbstractLLMResponse, query_llm
+
+        threads = [
+            threading.Thread(
+                target=lambda use_cache=use_cache: query_llm(
+                    "hi", {"title": "mixed"}, "GPT4Turbo", use_cache
+                )
+            )
+            for use_cache in [True, False]
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 2
+
+
+def test_single_flight_forgets_finished(cache_dir):
+    "Finished queries are not kept in memory - a repeat comes from the cache"
+    with patch("abstract_ranker.llm_utils.local_query_gpt") as mock_query_gpt:
+        from abstract_ranker.llm_utils import AbstractLLMResponse, query_llm
+
+        mock_query_gpt.return_value = AbstractLLMResponse(
+            summary="once",
+            experiment="",
+            keywords=[],
+            interest="low",
+            explanation="",
+            confidence=0.5,
+            unknown_terms=[],
+        )
+
+        from abstract_ranker.llm_utils import _query_futures
+
+        query_llm("hi", {"title": "repeat"}, "GPT4Turbo", True)
+        query_llm("hi", {"title": "repeat"}, "GPT4Turbo", True)
+        assert mock_query_gpt.call_count == 1
+        assert len(_query_futures) == 0
+
+        # With the cache off, a repeat is asked again
+        query_llm("hi", {"title": "repeat-no-cache"}, "GPT4Turbo", False)
+        query_llm("hi", {"title": "repeat-no-cache"}, "GPT4Turbo", False)
+        assert mock_query_gpt.call_count == 3
+
+
+def test_single_flight_failure_retries(cache_dir):
+    "A failed query is not remembered - the next caller tries again"
+    import pytest
+
+    with patch("abstract_ranker.llm_utils.local_query_gpt") as mock_query_gpt:
+        from abstract_ranker.llm_utils import query_llm
+
+        mock_query_gpt.side_effect = RuntimeError("LLM is down")
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                query_llm("hi", {"title": "failing-query"}, "GPT4Turbo", False)
+
+        assert mock_query_gpt.call_count == 2
+
+
+def test_summarize_no_cache():
+    "Without the cache the summary model is called every time"
+    with patch("abstract_ranker.llm_utils.local_summarize_gpt") as mock_summarize:
+        mock_summarize.return_value = "# Summary"
+
+        from abstract_ranker.llm_utils import summarize_llm
+
+        for _ in range(2):
+            r = summarize_llm("prompt", {"text": "no-cache-text"}, "GPT4o", False)
+            assert r == "# Summary"
+
+        assert mock_summarize.call_count == 2
+        mock_summarize.assert_called_with("prompt", {"text": "no-cache-text"}, "gpt-4o")
+
+
+def test_summarize_stream_is_cached():
+    "A streamed summary is stored in the cache, and a cache hit comes back at once"
+    with (
+        patch("abstract_ranker.llm_utils.local_stream_summarize_gpt") as mock_stream,
+        patch("abstract_ranker.openai_utils.summarize_gpt") as mock_summarize,
+    ):
+        mock_stream.side_effect = lambda prompt, context, model: iter(["# Sum", "mary"])
+
+        from abstract_ranker.llm_utils import summarize_llm, summarize_llm_stream
+
+        context = {"text": "stream-cache-text"}
+        assert list(summarize_llm_stream("prompt", context, "GPT4o", True)) == [
+            "# Sum",
+            "mary",
+        ]
+        assert mock_stream.call_count == 1
+
+        # Now in the cache for both the streaming and the plain call
+        assert list(summarize_llm_stream("prompt", context, "GPT4o", True)) == [
+            "# Summary"
+        ]
+        assert summarize_llm("prompt", context, "GPT4o", True) == "# Summary"
+        assert mock_stream.call_count == 1
+        mock_summarize.assert_not_called()
+
+
+def test_summarize_stream_abandoned_not_cached():
+    "A summary that was not streamed to the end is not cached"
+    with patch("abstract_ranker.llm_utils.local_stream_summarize_gpt") as mock_stream:
+        mock_stream.side_effect = lambda prompt, context, model: iter(["# Sum", "mary"])
+
+        from abstract_ranker.llm_utils import summarize_llm_stream
+
+        context = {"text": "stream-abandoned-text"}
+        stream = summarize_llm_stream("prompt", context, "GPT4o", True)
+        assert next(stream) == "# Sum"
+        stream.close()
+
+        assert list(summarize_llm_stream("prompt", context, "GPT4o", True)) == [
+            "# Sum",
+            "mary",
+        ]
+        assert mock_stream.call_count == 2
+
+
+def test_lexical_not_a_summary_model():
+    from abstract_ranker.llm_utils import (
+        LEXICAL_MODEL,
+        get_llm_models,
+        get_ranking_models,
+    )
+
+    assert LEXICAL_MODEL not in get_llm_models()
+    assert LEXICAL_MODEL in get_ranking_models()
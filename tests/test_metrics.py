@@ -0,0 +1,132 @@
+import logging
+import sys
+from unittest.mock import patch
+
+import pytest
+from rich.console import Console
+
+
+def test_counts(make_answer):
+    from abstract_ranker.metrics import RunMetrics
+
+    metrics = RunMetrics("GPT4o", total=4)
+
+    # Two contributions that needed a request, one that did not
+    for latency in [1.0, 2.0]:
+        metrics.request_started()
+        metrics.request_finished(latency, True)
+        metrics.add_tokens(1000, 150)
+        metrics.ranked(make_answer("high"))
+    metrics.ranked(make_answer("low"))
+
+    assert metrics.completed == 3
+    assert metrics.reused == 1
+    assert metrics.in_flight == 0
+    assert metrics.p95_latency() == 2.0
+    assert metrics.cost() == pytest.approx(0.008)
+    assert metrics.interest["high"] == 2
+    assert metrics.eta() is not None
+
+    # It draws
+    console = Console(file=None, width=100, record=True)
+    console.print(metrics.render())
+    text = console.export_text()
+    assert "3 of 4" in text
+    assert "1 cached or re-used" in text
+    assert "p95 2.00s" in text
+
+
+def test_cost_by_model(make_ranking):
+    "Each request is priced at the model that made it (a cascade uses two)"
+    from abstract_ranker.metrics import live_dashboard, llm_request
+
+    def cascade():
+        for model in ["GPT4o-mini", "GPT4o-mini", "GPT4o-mini", "GPT4o"]:
+            with llm_request(model):
+                pass
+        yield make_ranking(0, "high")
+
+    seen = []
+    with patch(
+        "abstract_ranker.metrics.RunMetrics.ranked",
+        autospec=True,
+        side_effect=lambda self, summary: seen.append(self),
+    ):
+        list(live_dashboard(cascade(), "GPT4o"))
+    assert seen[0].cost() == pytest.approx(3 * 0.00025 + 0.004)
+
+    # A model we can't price makes the whole cost unknown
+    seen[0].request_finished(1.0, True, "not-a-model")
+    assert seen[0].cost() is None
+
+
+def test_unknown_cost_and_total():
+    from abstract_ranker.metrics import RunMetrics
+
+    metrics = RunMetrics("not-a-model")
+    assert metrics.cost() is None
+    assert metrics.eta() is None
+
+
+def test_hooks_do_nothing_without_a_run():
+    from abstract_ranker.metrics import llm_request, record_tokens
+
+    with llm_request():
+        pass
+    record_tokens(10, 10)
+
+
+def test_live_dashboard_passes_through(make_ranking):
+    from abstract_ranker.metrics import live_dashboard, llm_request, record_tokens
+
+    rankings = [make_ranking(i, "medium") for i in range(5)]
+
+    def ranked_with_requests():
+        for i, r in enumerate(rankings):
+            if i % 2 == 0:
+                with llm_request():
+                    record_tokens(100, 10)
+            yield r
+
+    with patch("abstract_ranker.metrics.RunMetrics.render", return_value=""):
+        out = list(live_dashboard(ranked_with_requests(), "GPT4o", len(rankings)))
+    assert out == rankings
+
+    # The hooks are only live while the dashboard is
+    import abstract_ranker.metrics as metrics
+
+    assert metrics._active is None
+
+
+def test_live_dashboard_failed_request(make_ranking):
+    from abstract_ranker.metrics import live_dashboard, llm_request
+
+    def failing():
+        yield make_ranking(0, "low")
+        with llm_request():
+            raise RuntimeError("LLM is down")
+
+    seen = []
+    with patch(
+        "abstract_ranker.metrics.RunMetrics.ranked",
+        autospec=True,
+        side_effect=lambda self, summary: seen.append(self),
+    ):
+        with pytest.raises(RuntimeError):
+            list(live_dashboard(failing(), "GPT4o"))
+    assert seen[0].requests_failed == 1
+    assert seen[0].in_flight == 0
+
+
+def test_live_dashboard_logging(make_ranking):
+    "Log handlers on the terminal are put back as they were"
+    from abstract_ranker.metrics import live_dashboard
+
+    handler = logging.StreamHandler(sys.__stderr__)
+    logging.getLogger().addHandler(handler)
+    try:
+        with patch("abstract_ranker.metrics.RunMetrics.render", return_value=""):
+            list(live_dashboard([make_ranking(0, "low")], "GPT4o"))
+        assert handler.stream is sys.__stderr__
+    finally:
+        logging.getLogger().removeHandler(handler)
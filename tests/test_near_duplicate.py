@@ -0,0 +1,101 @@
+import pickle
+
+from abstract_ranker.data_model import AbstractLLMResponse
+from abstract_ranker.near_duplicate import (
+    NearDuplicateIndex,
+    estimated_similarity,
+    minhash_signature,
+)
+
+_abstract = (
+    "We present a search for long-lived particles decaying in the ATLAS muon "
+    "spectrometer using the full Run 2 dataset. Displaced vertices are reconstructed "
+    "with a dedicated tracking algorithm and no excess over the expected background "
+    "is observed. Limits are set on the branching ratio of the Higgs boson to a pair "
+    "of long-lived scalars for a range of proper decay lengths."
+)
+
+
+def test_signature_similarity():
+    sig_1 = minhash_signature(_abstract)
+    sig_2 = minhash_signature(_abstract.replace("pair", "pairs"))
+    sig_3 = minhash_signature("Quantum computing for lattice gauge theory on a chip.")
+
+    assert estimated_similarity(sig_1, sig_1) == 1.0
+    assert estimated_similarity(sig_1, sig_2) > 0.8
+    assert estimated_similarity(sig_1, sig_3) < 0.2
+
+
+def test_near_duplicate_reused(make_contribution, make_answer):
+    index = NearDuplicateIndex(0.8)
+    index.add(make_contribution("LLP search", _abstract), make_answer(summary="first"))
+
+    r = index.lookup(
+        make_contribution("LLP search", _abstract.replace("pair", "pairs"))
+    )
+
+    assert r is not None
+    assert r.summary == "first"
+    assert r.source.startswith("GPT4o near-duplicate")
+    assert index.reused == 1
+
+
+def test_unrelated_not_reused(make_contribution, make_answer):
+    index = NearDuplicateIndex(0.8)
+    index.add(make_contribution("LLP search", _abstract), make_answer(summary="first"))
+
+    assert (
+        index.lookup(
+            make_contribution(
+                "Lattice", "Quantum computing for lattice gauge theory on a chip."
+            )
+        )
+        is None
+    )
+    assert index.reused == 0
+
+
+def test_exact_match_left_to_cache(make_contribution, make_answer):
+    index = NearDuplicateIndex(0.8)
+    index.add(make_contribution("LLP search", _abstract), make_answer(summary="first"))
+
+    assert index.lookup(make_contribution("LLP search", _abstract)) is None
+
+
+def test_short_abstract_never_reused(make_contribution, make_answer):
+    index = NearDuplicateIndex(0.5)
+    index.add(make_contribution("Coffee", ""), make_answer(summary="first"))
+    index.add(make_contribution("LLP search", _abstract), make_answer(summary="second"))
+
+    assert len(index) == 1
+    assert index.lookup(make_contribution("Coffee", "")) is None
+
+
+def test_save_and_load(cache_dir, make_contribution, make_answer):
+    index = NearDuplicateIndex.for_model("GPT4o", "prompt", ["topic"], 0.8)
+    index.add(make_contribution("LLP search", _abstract), make_answer(summary="first"))
+    index.save()
+
+    reloaded = NearDuplicateIndex.for_model("GPT4o", "prompt", ["topic"], 0.8)
+    assert len(reloaded) == 1
+    assert (
+        reloaded.lookup(
+            make_contribution("LLP search", _abstract.replace("pair", "pairs"))
+        )
+        is not None
+    )
+
+    other_model = NearDuplicateIndex.for_model("GPT4o-mini", "prompt", ["topic"], 0.8)
+    assert len(other_model) == 0
+
+
+def test_old_cached_response_has_source(make_answer):
+    "Responses pickled before `source` existed must still load"
+    r = make_answer(summary="old")
+    state = r.__getstate__()
+    del state["__dict__"]["source"]
+
+    old = AbstractLLMResponse.__new__(AbstractLLMResponse)
+    old.__setstate__(state)
+    assert old.source == ""
+    assert pickle.loads(pickle.dumps(old)).summary == "old"
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 from unittest.mock import patch
 
 from pydantic import ValidationError
@@ -21,6 +21,21 @@ class response:
     choices: List[choice]
 
 
+@dataclass
+class delta:
+    content: Optional[str]
+
+
+@dataclass
+class stream_choice:
+    delta: delta
+
+
+@dataclass
+class chunk:
+    choices: List[stream_choice]
+
+
 def test_openai_simple_call():
     with patch("openai.OpenAI") as mock_openai:
         with patch("abstract_ranker.openai_utils.get_key") as mock_get_key:
@@ -210,3 +225,53 @@ def test_openai_summarize():
                 mock_openai.return_value.chat.completions.create.call_args[1]["model"]
                 == "gpt-4-turbo-bogus"
             )
+
+
+def test_openai_stream_summarize():
+    with patch("openai.OpenAI") as mock_openai:
+        with patch("abstract_ranker.openai_utils.get_key") as mock_get_key:
+            mock_get_key.return_value = "bogus_key"
+
+            mock_openai.return_value.chat.completions.create.return_value = iter(
+                [
+                    chunk(choices=[stream_choice(delta=delta(content="# Title"))]),
+                    chunk(choices=[stream_choice(delta=delta(content=None))]),
+                    chunk(choices=[]),
+                    chunk(choices=[stream_choice(delta=delta(content="\n- Item"))]),
+                ]
+            )
+
+            from abstract_ranker.openai_utils import stream_summarize_gpt
+
+            r = list(stream_summarize_gpt("hi", {"text": "This is the text"}, "gpt-4o"))
+            assert r == ["# Title", "\n- Item"]
+
+            call_args = mock_openai.return_value.chat.completions.create.call_args[1]
+            assert call_args["stream"] is True
+            assert call_args["model"] == "gpt-4o"
+
+
+def test_get_key_file(tmp_path, monkeypatch):
+    from abstract_ranker.openai_utils import get_key
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "env_key")
+    (tmp_path / ".openai_key").write_text("file_key\n")
+    assert get_key() == "file_key"
+
+
+def test_get_key_environment(tmp_path, monkeypatch):
+    from abstract_ranker.openai_utils import get_key
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "env_key")
+    assert get_key() == "env_key"
+
+
+def test_get_key_missing(tmp_path, monkeypatch):
+    from abstract_ranker.openai_utils import get_key
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(FileNotFoundError):
+        get_key()
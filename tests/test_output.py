@@ -0,0 +1,85 @@
+import csv
+import json
+from datetime import datetime
+
+import pytest
+import pytz
+
+from abstract_ranker.output import dump_rankings
+
+
+@pytest.fixture
+def rankings(make_contribution, make_answer):
+    contrib = make_contribution(
+        "Fast tracking",
+        "We track fast.",
+        type="Talk",
+        startDate=pytz.timezone("Europe/Zurich").localize(datetime(2024, 3, 11, 9)),
+        roomFullname="Theatre",
+        url="https://indico.cern.ch/event/1/contributions/2/",
+        id="2",
+    )
+    answer = make_answer(
+        "high",
+        summary="Tracking, but faster",
+        experiment="ATLAS",
+        keywords=["tracking", "GPU"],
+        confidence=0.8,
+        unknown_terms=["ACTS"],
+    )
+    return [(contrib, answer), (contrib.model_copy(update={"id": "3"}), answer)]
+
+
+def test_csv(rankings, tmp_path):
+    dump_rankings(tmp_path / "out.csv", iter(rankings), False, "csv")
+
+    with (tmp_path / "out.csv").open(newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 2
+    assert rows[0]["Interest"] == "3"
+    assert not (tmp_path / "out.csv.tmp").exists()
+
+
+def test_jsonl(rankings, tmp_path):
+    dump_rankings(tmp_path / "out.jsonl", iter(rankings), False, "jsonl")
+
+    rows = [
+        json.loads(line)
+        for line in (tmp_path / "out.jsonl").read_text(encoding="utf-8").splitlines()
+    ]
+    assert [r["id"] for r in rows] == ["2", "3"]
+    assert rows[0]["keywords"] == ["tracking", "GPU"]
+    assert rows[0]["unknown_terms"] == ["ACTS"]
+    assert rows[0]["start"] == "2024-03-11T09:00:00+01:00"
+    assert rows[0]["end"] is None
+
+
+def test_jsonl_replaced_atomically(rankings, tmp_path):
+    "While a new file is written the old one stays whole, as --watch relies on"
+    output = tmp_path / "out.jsonl"
+    output.write_text("old\n", encoding="utf-8")
+
+    def results():
+        for ranking in rankings:
+            assert output.read_text(encoding="utf-8") == "old\n"
+            yield ranking
+        assert (tmp_path / "out.jsonl.tmp").exists()
+
+    dump_rankings(output, results(), False, "jsonl")
+
+    assert len(output.read_text(encoding="utf-8").splitlines()) == 2
+    assert not (tmp_path / "out.jsonl.tmp").exists()
+
+
+def test_parquet(rankings, tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr("abstract_ranker.output.PARQUET_ROW_GROUP_SIZE", 1)
+
+    dump_rankings(tmp_path / "out.parquet", iter(rankings), False, "parquet")
+
+    parquet_file = pq.ParquetFile(tmp_path / "out.parquet")
+    assert parquet_file.num_row_groups == 2
+    table = parquet_file.read()
+    assert table.column("keywords").to_pylist()[0] == ["tracking", "GPU"]
+    assert table.column("interest").to_pylist() == [3, 3]
+    assert table.column("start").to_pylist()[0].hour == 8
@@ -0,0 +1,78 @@
+import json
+from pathlib import Path
+
+from abstract_ranker.config import prefilter_rules
+from abstract_ranker.prefilter import Prefilter, PrefilterRule
+
+
+def test_rule_all_criteria_must_match(make_contribution):
+    rule = PrefilterRule(name="posters", type="poster", max_abstract_length=10)
+
+    assert rule.matches(make_contribution("A poster", "", type="Poster"))
+    assert not rule.matches(
+        make_contribution("A poster", "A long abstract", type="Poster")
+    )
+    assert not rule.matches(make_contribution("A talk", "", type="Oral"))
+
+
+def test_rule_room_and_keywords(make_contribution):
+    rule = PrefilterRule(name="np", room="annex", keywords=["neutrino", "lattice"])
+
+    assert rule.matches(make_contribution("Neutrino mixing", roomFullname="Annex B"))
+    assert not rule.matches(
+        make_contribution("Neutrino mixing", roomFullname="Main hall")
+    )
+    assert not rule.matches(make_contribution("Neutrinos", roomFullname="Annex B"))
+
+
+def test_filtered_answer(make_contribution):
+    f = Prefilter([{"name": "breaks", "title": r"^coffee"}])
+
+    r = f.check(make_contribution("Coffee break"))
+    assert r is not None
+    assert r.interest == "low"
+    assert r.explanation == "Filtered by rule 'breaks'"
+    assert r.source == "filter: breaks"
+    assert f.check(make_contribution("ServiceX")) is None
+    assert f.hits["breaks"] == 1
+    assert "breaks: 1" in f.summary()
+
+
+def test_default_rules_on_acat():
+    from abstract_ranker.indico import indico_contributions
+
+    data = json.loads(Path("tests/data/1330797.json").read_text())["results"][0]
+    f = Prefilter(prefilter_rules)
+
+    filtered = [c.title for c in indico_contributions(data, None) if f.check(c)]
+
+    assert "Welcome to ACAT 2024 in Stony Brook" in filtered
+    assert "Updates from the organizers" in filtered
+    assert "Differentiable Programming in HEP" not in filtered
+
+
+def test_driver_skips_filtered(make_contribution, make_answer):
+    from unittest.mock import patch
+
+    from abstract_ranker.driver import process_contributions
+
+    with patch("abstract_ranker.driver.query_llm") as mock_query:
+        mock_query.return_value = make_answer("high")
+        contributions = [
+            make_contribution("Coffee break"),
+            make_contribution("ServiceX", "ServiceX delivers data"),
+            make_contribution("Lunch"),
+        ]
+
+        r = list(
+            process_contributions(
+                (c for c in contributions),
+                "prompt",
+                "GPT4o",
+                True,
+                prefilter=Prefilter([{"name": "breaks", "title": "coffee|lunch"}]),
+            )
+        )
+
+        assert sorted(c.title for c, _ in r) == ["Coffee break", "Lunch", "ServiceX"]
+        assert mock_query.call_count == 1
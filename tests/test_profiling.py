@@ -0,0 +1,79 @@
+import time
+
+from abstract_ranker.profiling import (
+    Profiler,
+    checkpoint,
+    rss_bytes,
+    start_profiling,
+    stop_profiling,
+)
+
+
+def _busy_allocating_workload():
+    "Burn some CPU, and hold on to a few MB"
+    kept = [bytearray(1024) for _ in range(4000)]
+    end = time.perf_counter() + 0.2
+    while time.perf_counter() < end:
+        sum(range(1000))
+    return kept
+
+
+def test_profile_off(tmp_path):
+    "No profiler running, checkpoints and stopping do nothing"
+    checkpoint("nothing")
+    assert stop_profiling(tmp_path / "profile.txt") is None
+    assert not (tmp_path / "profile.txt").exists()
+
+
+def test_rss_bytes():
+    rss = rss_bytes()
+    assert rss is not None and rss > 1024**2
+
+
+def test_profile_report(tmp_path):
+    start_profiling()
+    kept = _busy_allocating_workload()
+    checkpoint("workload")
+    del kept
+    checkpoint("released")
+    profiler = stop_profiling(tmp_path / "profile.txt")
+
+    assert profiler is not None
+    assert [s[0] for s in profiler.stages] == ["start", "workload", "released", "end"]
+
+    report = (tmp_path / "profile.txt").read_text()
+    assert "Hot functions" in report
+    assert "_busy_allocating_workload" in report
+    assert "Memory by stage (MB)" in report
+    assert "at the checkpoint holding the most (after 'workload'" in report
+    assert "test_profiling.py" in report.split("allocation site")[1]
+    assert "Growth by stage" in report
+
+
+def test_profile_peak_not_held():
+    "A stage that only briefly used a lot isn't reported as holding it"
+    profiler = Profiler(interval=0.01)
+    profiler.start()
+    spike = bytearray(20 * 1024**2)
+    del spike
+    profiler.checkpoint("spike")
+    kept = [bytearray(1024) for _ in range(4000)]
+    profiler.checkpoint("hold")
+    del kept
+    profiler.stop()
+
+    report = profiler.report()
+    assert "at the checkpoint holding the most (after 'hold'" in report
+
+
+def test_profile_top():
+    profiler = Profiler(interval=0.001, top=2)
+    profiler.start()
+    _busy_allocating_workload()
+    profiler.stop()
+
+    report = profiler.report()
+    hot = report.split("\n\n")[0].splitlines()
+    assert 2 < len(hot) <= 2 + 2
+    assert profiler._sampler.samples > 0
+    assert all(len(stage[5]) <= 2 for stage in profiler.stages)
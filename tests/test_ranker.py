@@ -3,3 +3,158 @@ def test_import():
     import abstract_ranker  # noqa
 
     assert True
+
+
+def test_rank_new_papers_carry_and_skip(make_contribution, make_answer):
+    "Papers already in the index are carried forward or skipped, never re-ranked"
+    from argparse import Namespace
+    from unittest.mock import patch
+
+    from abstract_ranker.arxiv_index import ArxivRankedIndex
+    from abstract_ranker.ranker import _rank_new_papers
+
+    def paper(id: str):
+        return make_contribution("A measurement", "We measure the thing.", id=id)
+
+    index = ArxivRankedIndex()
+    index.add(paper("2405.01234"), make_answer())
+    new_paper = paper("2405.99999")
+
+    def rank(args, contributions):
+        for c in contributions:
+            yield c, make_answer()
+
+    with patch("abstract_ranker.ranker._rank_contributions", side_effect=rank) as r:
+        carried = list(
+            _rank_new_papers(
+                Namespace(seen="carry", model="GPT4o"),
+                [paper("2405.01234"), new_paper],
+                index,
+            )
+        )
+        skipped = list(
+            _rank_new_papers(
+                Namespace(seen="skip", model="GPT4o"),
+                [paper("2405.01234"), new_paper],
+                index,
+            )
+        )
+
+    assert [c.id for c, _ in carried] == ["2405.01234", "2405.99999"]
+    assert carried[0][1].source == "GPT4o (ranked as v1)"
+    assert [c.id for c, _ in skipped] == []
+    assert r.call_count == 2
+
+
+def test_rank_new_papers_stores_only_model_answers(make_contribution, make_answer):
+    "Cheap-tier and pre-filter answers are not stored as the model's"
+    from argparse import Namespace
+    from unittest.mock import patch
+
+    from abstract_ranker.arxiv_index import ArxivRankedIndex
+    from abstract_ranker.ranker import _rank_new_papers
+
+    papers = [make_contribution(f"Paper {i}", id=f"2405.0000{i}") for i in range(4)]
+    sources = [
+        "GPT4o",
+        "GPT4o (escalated from GPT4o-mini)",
+        "GPT4o-mini",
+        "filter: experiment reviews",
+    ]
+
+    def rank(args, contributions):
+        for c, source in zip(contributions, sources):
+            yield c, make_answer(source=source)
+
+    index = ArxivRankedIndex()
+    with patch("abstract_ranker.ranker._rank_contributions", side_effect=rank):
+        ranked = list(
+            _rank_new_papers(Namespace(seen="carry", model="GPT4o"), papers, index)
+        )
+
+    assert len(ranked) == 4
+    assert [index.lookup(p) is not None for p in papers] == [True, True, False, False]
+
+
+def test_lexical_not_cascade_expensive_tier():
+    "The lexical ranker can't re-rank what a cascade escalates"
+    import sys
+    from unittest.mock import patch
+
+    import pytest
+
+    from abstract_ranker.ranker import main
+
+    argv = ["abstract_ranker", "--model", "lexical", "--cascade", "GPT4o-mini"]
+    with patch.object(sys, "argv", argv + ["rank_indico", "https://indico.example"]):
+        with pytest.raises(SystemExit):
+            main()
+
+
+def test_query_since_includes_midnight(tmp_path, make_contribution, make_answer):
+    "A talk starting at 00:00 on the --since day is found"
+    from datetime import datetime, timezone
+    from unittest.mock import patch
+
+    from abstract_ranker.ranker import _parse_day
+    from abstract_ranker.results_db import (
+        open_results_db,
+        query_rankings,
+        upsert_ranking,
+    )
+
+    talk = make_contribution(
+        "Midnight talk", id="1", startDate=datetime(2024, 5, 1, tzinfo=timezone.utc)
+    )
+    conn = open_results_db(tmp_path / "results.sqlite")
+    upsert_ranking(conn, "indico", "ACAT", "GPT4o", talk, make_answer())
+
+    with patch("tzlocal.get_localzone", return_value=timezone.utc):
+        assert len(query_rankings(conn, since=_parse_day("2024-05-01"))) == 1
+        assert len(query_rankings(conn, until=_parse_day("2024-05-01"))) == 0
+    conn.close()
+
+
+def test_query_days_are_local(tmp_path, make_contribution, make_answer):
+    "--since and --until are days in local time, while starts are stored in UTC"
+    from datetime import datetime
+    from unittest.mock import patch
+    from zoneinfo import ZoneInfo
+
+    from abstract_ranker.ranker import _parse_day
+    from abstract_ranker.results_db import (
+        open_results_db,
+        query_rankings,
+        upsert_ranking,
+    )
+
+    # 22:00 on April 30th in New York is already May 1st in UTC.
+    new_york = ZoneInfo("America/New_York")
+    talk = make_contribution(
+        "Late talk", id="1", startDate=datetime(2024, 4, 30, 22, tzinfo=new_york)
+    )
+    conn = open_results_db(tmp_path / "results.sqlite")
+    upsert_ranking(conn, "indico", "ACAT", "GPT4o", talk, make_answer())
+
+    with patch("tzlocal.get_localzone", return_value=new_york):
+        assert len(query_rankings(conn, since=_parse_day("2024-05-01"))) == 0
+        assert len(query_rankings(conn, until=_parse_day("2024-05-01"))) == 1
+    conn.close()
+
+
+def test_query_bad_text_is_usage_error(tmp_path):
+    import sys
+    from unittest.mock import patch
+
+    import pytest
+
+    from abstract_ranker.ranker import main
+
+    argv = ["abstract_ranker", "query", '"unbalanced']
+    with (
+        patch.object(sys, "argv", argv),
+        patch("abstract_ranker.config.results_db", tmp_path / "results.sqlite"),
+    ):
+        with pytest.raises(SystemExit) as e:
+            main()
+    assert "full-text query" in str(e.value)
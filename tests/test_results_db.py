@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from abstract_ranker.results_db import (
+    open_results_db,
+    query_rankings,
+    record_rankings,
+    upsert_ranking,
+)
+
+_zurich = pytz.timezone("Europe/Zurich")
+
+
+@pytest.fixture
+def db(tmp_path):
+    conn = open_results_db(tmp_path / "results.sqlite")
+    yield conn
+    conn.close()
+
+
+def test_upsert_replaces(db, make_contribution, make_answer):
+    contrib = make_contribution(
+        "LLP search", id="1", startDate=_zurich.localize(datetime(2024, 3, 11, 9))
+    )
+    upsert_ranking(
+        db, "indico", "ACAT", "GPT4o", contrib, make_answer("low", summary="first")
+    )
+    upsert_ranking(
+        db, "indico", "ACAT", "GPT4o", contrib, make_answer("high", summary="second")
+    )
+
+    rows = query_rankings(db)
+    assert len(rows) == 1
+    assert rows[0]["summary"] == "second"
+    assert rows[0]["interest"] == 3
+    assert rows[0]["start"] == "2024-03-11 08:00:00"
+
+    # The text index follows the update
+    assert len(query_rankings(db, text="second")) == 1
+    assert len(query_rankings(db, text="first")) == 0
+
+    # A different model is a separate ranking
+    upsert_ranking(
+        db, "indico", "ACAT", "GPT4o-mini", contrib, make_answer("low", summary="x")
+    )
+    assert len(query_rankings(db)) == 2
+
+
+def test_query_filters(db, make_contribution, make_answer):
+    rows = [
+        ("1", "LLP search with displaced jets", datetime(2023, 5, 1, 9), "high"),
+        ("2", "Long-lived particle triggers", datetime(2024, 5, 1, 9), "high"),
+        ("3", "LLP reinterpretation", datetime(2024, 6, 1, 9), "low"),
+        ("4", "Calorimeter calibration", datetime(2024, 7, 1, 9), "high"),
+    ]
+    for id, title, start, interest in rows:
+        upsert_ranking(
+            db,
+            "indico",
+            "LHCP 2024",
+            "GPT4o",
+            make_contribution(title, id=id, startDate=_zurich.localize(start)),
+            make_answer(interest, summary=title),
+        )
+
+    found = query_rankings(
+        db, text="LLP", since=datetime(2024, 1, 1), min_interest="high"
+    )
+    assert [r["contribution_id"] for r in found] == []
+
+    found = query_rankings(
+        db,
+        text='LLP OR "long lived"',
+        since=datetime(2024, 1, 1),
+        min_interest="high",
+    )
+    assert [r["contribution_id"] for r in found] == ["2"]
+
+    assert len(query_rankings(db, event="LHCP")) == 4
+    assert len(query_rankings(db, source="arxiv")) == 0
+    assert len(query_rankings(db, limit=2)) == 2
+
+
+def test_query_bad_text(db, make_contribution, make_answer):
+    upsert_ranking(db, "indico", "ACAT", "GPT4o", make_contribution(), make_answer())
+
+    with pytest.raises(ValueError, match="full-text query"):
+        query_rankings(db, text='"unbalanced')
+
+
+def test_record_rankings_passes_through(tmp_path, make_contribution, make_answer):
+    rankings = [
+        (
+            make_contribution(f"Talk {i}", id=str(i)),
+            make_answer("medium", summary="ok"),
+        )
+        for i in range(3)
+    ]
+
+    out = list(
+        record_rankings(
+            iter(rankings), "indico", "ACAT", "GPT4o", tmp_path / "results.sqlite"
+        )
+    )
+    assert out == rankings
+
+    conn = open_results_db(tmp_path / "results.sqlite")
+    assert len(query_rankings(conn)) == 3
+    conn.close()
+
+
+def test_record_rankings_answering_model(tmp_path, make_contribution, make_answer):
+    "Each ranking is recorded under the model that answered it"
+    talks = [make_contribution(f"Talk {i}", id=str(i)) for i in range(3)]
+    answers = [
+        make_answer("low", summary="cheap", source="GPT4o-mini"),
+        make_answer(
+            "high", summary="escalated", source="GPT4o (escalated from GPT4o-mini)"
+        ),
+        make_answer("low", summary="filtered", source="filter: posters"),
+    ]
+
+    list(
+        record_rankings(
+            zip(talks, answers), "indico", "ACAT", "GPT4o", tmp_path / "results.sqlite"
+        )
+    )
+
+    conn = open_results_db(tmp_path / "results.sqlite")
+    found = {r["summary"]: r["model"] for r in query_rankings(conn)}
+    assert found == {"cheap": "GPT4o-mini", "escalated": "GPT4o", "filtered": "filter"}
+    conn.close()
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from abstract_ranker.sorting import (
+    order_rankings,
+    parse_sort_keys,
+    sort_rankings,
+    top_rankings,
+)
+
+
+@pytest.fixture
+def rankings(make_ranking):
+    interests = ["low", "medium", "high"]
+    zurich = pytz.timezone("Europe/Zurich")
+    return [
+        make_ranking(
+            i,
+            interests[(i * 7) % 3],
+            ((i * 13) % 10) / 10,
+            zurich.localize(datetime(2024, 3, 11, 8 + i % 10)),
+        )
+        for i in range(100)
+    ]
+
+
+def _expected(rankings, keys):
+    "What a plain in-memory sort gives"
+    from abstract_ranker.sorting import SORT_KEYS
+
+    return sorted(rankings, key=lambda r: tuple(SORT_KEYS[k](*r) for k in keys))
+
+
+def test_parse_sort_keys():
+    assert parse_sort_keys("interest, confidence") == ["interest", "confidence"]
+    with pytest.raises(ValueError):
+        parse_sort_keys("interest,bogus")
+    with pytest.raises(ValueError):
+        parse_sort_keys("")
+
+
+def test_sort_in_memory(rankings):
+    keys = ["interest", "confidence"]
+    result = list(sort_rankings(iter(rankings), keys, memory_rows=1000))
+    assert result == _expected(rankings, keys)
+    assert result[0][1].interest == "high"
+
+
+def test_sort_spills_and_merges(rankings):
+    "Several spilled runs, plus a partial block, merge back in order (stable)"
+    keys = ["start", "interest"]
+    result = list(sort_rankings(iter(rankings), keys, memory_rows=7))
+    assert [c.id for c, _ in result] == [c.id for c, _ in _expected(rankings, keys)]
+
+
+def test_top(rankings):
+    keys = ["interest", "confidence"]
+    top = top_rankings(iter(rankings), keys, 5)
+    assert top == _expected(rankings, keys)[:5]
+
+
+def test_order_rankings(rankings):
+    data = iter(rankings)
+    assert order_rankings(data) is data
+
+    top = order_rankings(iter(rankings), top=3)
+    assert [r[1].interest for r in top] == ["high"] * 3
+    assert top[0][1].confidence >= top[2][1].confidence
@@ -0,0 +1,96 @@
+import json
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture
+def minutes(tmp_path) -> Path:
+    source = tmp_path / "minutes"
+    for week in ["week1", "week2"]:
+        (source / week).mkdir(parents=True)
+        (source / week / "minutes.txt").write_text(f"Minutes for {week}")
+    (source / "week1" / "extra.txt").write_text("Extra minutes")
+    return source
+
+
+def test_summarize_glob(minutes, tmp_path):
+    from abstract_ranker.summarize import summarize_files
+
+    summarize = MagicMock(side_effect=lambda text: f"# Summary of {text}")
+    output = tmp_path / "out"
+
+    status = summarize_files([str(minutes / "*" / "*.txt")], output, summarize, "m")
+
+    assert sorted(status.values()) == ["summarized"] * 3
+    assert summarize.call_count == 3
+
+    # The two minutes.txt files don't write over each other
+    summaries = sorted(p.name for p in output.glob("*.md") if p.name != "index.md")
+    assert len(summaries) == 3
+    assert "extra.md" in summaries
+    texts = {(output / s).read_text() for s in summaries}
+    assert "# Summary of Minutes for week2" in texts
+
+    index = (output / "index.md").read_text()
+    assert index.count("- [") == 3
+
+
+def test_summarize_skips_unchanged(minutes, tmp_path):
+    from abstract_ranker.summarize import summarize_files
+
+    summarize = MagicMock(side_effect=lambda text: f"# Summary of {text}")
+    output = tmp_path / "out"
+    urls = [str(minutes / "week1" / "minutes.txt"), str(minutes / "week2" / "*.txt")]
+
+    summarize_files(urls, output, summarize, "m")
+    (minutes / "week2" / "minutes.txt").write_text("Corrected minutes for week2")
+    status = summarize_files(urls, output, summarize, "m")
+
+    assert sorted(status.values()) == ["summarized", "unchanged"]
+    assert summarize.call_count == 3
+
+    # --ignore-cache, or different settings, re-summarize everything
+    status = summarize_files(urls, output, summarize, "m", ignore_previous=True)
+    assert set(status.values()) == {"summarized"}
+    status = summarize_files(urls, output, summarize, "other model")
+    assert sorted(status.values()) == ["summarized", "summarized"]
+
+    state = json.loads((output / ".summaries.json").read_text())
+    assert len(state) == 2
+
+
+def test_summarize_one_failure(minutes, tmp_path):
+    from abstract_ranker.summarize import summarize_files
+
+    def summarize(text):
+        if "week1" in text:
+            raise RuntimeError("LLM is down")
+        return "# Summary"
+
+    status = summarize_files(
+        [str(minutes / "*" / "minutes.txt")], tmp_path / "out", summarize, "m"
+    )
+    assert sorted(status.values()) == ["failed", "summarized"]
+
+
+def test_summarize_no_match(tmp_path):
+    from abstract_ranker.summarize import summarize_files
+
+    with pytest.raises(ValueError):
+        summarize_files([str(tmp_path / "*.txt")], tmp_path / "out", str, "m")
+
+
+def test_chunked_short_minutes_use_full_prompt():
+    "Minutes that fit in one chunk are asked about as whole minutes"
+    from argparse import Namespace
+    from unittest.mock import patch
+
+    from abstract_ranker.summarize import _summarize_text, minutes_prompt
+
+    args = Namespace(chunked=True, chunk_tokens=1000, model="m", ignore_cache=False)
+    with patch("abstract_ranker.chunking.summarize_llm") as mock_summarize:
+        mock_summarize.return_value = "# Summary"
+        assert _summarize_text(args, "Short minutes") == "# Summary"
+    assert mock_summarize.call_args[0][0] == minutes_prompt
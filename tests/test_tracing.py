@@ -0,0 +1,92 @@
+import json
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from abstract_ranker.tracing import span, start_tracing, stop_tracing
+
+
+@pytest.fixture
+def tracer():
+    tracer = start_tracing()
+    yield tracer
+    stop_tracing()
+
+
+def test_span_off():
+    "Tracing off, spans are the same do-nothing object"
+    assert span("a") is span("b", x=1)
+    with span("a"):
+        pass
+
+
+def test_nested_spans(tracer):
+    with span("outer", title="Talk"):
+        with span("inner"):
+            pass
+
+    spans = {s[0]: s for s in tracer.spans}
+    assert spans["inner"][3] == spans["outer"][2]
+    assert spans["outer"][3] is None
+    assert spans["outer"][6] == {"title": "Talk"}
+    assert spans["outer"][4] <= spans["inner"][4] <= spans["inner"][5]
+
+
+def test_span_records_error(tracer):
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("bad")
+    assert tracer.spans[0][6]["error"] == "ValueError"
+
+
+def test_chrome_trace(tracer, tmp_path):
+    def request():
+        with span("llm.request", model="GPT4o"):
+            pass
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stop_tracing(tmp_path / "trace.json", tmp_path / "trace.otlp.json")
+
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    complete = [e for e in events if e["ph"] == "X"]
+    assert len(complete) == 3
+    assert complete[0]["args"] == {"model": "GPT4o"}
+    counters = [e for e in events if e["ph"] == "C"]
+    assert len(counters) == 6
+    assert counters[-1]["args"]["open"] == 0
+    assert max(c["args"]["open"] for c in counters) >= 1
+
+    otlp = json.loads((tmp_path / "trace.otlp.json").read_text())
+    spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(spans) == 3
+    assert int(spans[0]["endTimeUnixNano"]) >= int(spans[0]["startTimeUnixNano"])
+    assert {"key": "model", "value": {"stringValue": "GPT4o"}} in spans[0]["attributes"]
+
+
+def test_stages_traced(tracer, make_contribution, make_answer):
+    "A ranked contribution shows its stages, nested"
+    from abstract_ranker.driver import process_contributions
+
+    answer = make_answer("low", confidence=0.5, source="")
+    contrib = make_contribution("Tracing talk")
+    with (
+        patch("abstract_ranker.openai_utils.get_key", return_value="key"),
+        patch("openai.OpenAI") as mock_openai,
+    ):
+        mock_openai.return_value.chat.completions.create.return_value.choices[
+            0
+        ].message.content = answer.model_dump_json()
+        list(process_contributions(iter([contrib]), "tracing", "GPT4o", False))
+
+    spans = {s[0]: s for s in tracer.spans}
+    assert spans["driver.rank"][6]["contribution"] == "Tracing talk"
+    assert spans["llm.query"][3] == spans["driver.rank"][2]
+    assert spans["llm.request"][3] == spans["llm.query"][2]
+    assert spans["openai.round_trip"][3] == spans["llm.request"][2]
+    assert spans["openai.parse"][3] == spans["llm.request"][2]
@@ -0,0 +1,158 @@
+import copy
+import json
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterable, List
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from abstract_ranker.data_model import AbstractLLMResponse, Contribution
+from abstract_ranker.watch import IndicoWatcher, watch_indico
+
+
+@pytest.fixture
+def event_data():
+    return json.loads(Path("tests/data/1330797.json").read_text())["results"][0]
+
+
+class _Ranker:
+    "Counts what it is asked to rank"
+
+    def __init__(self):
+        self.ranked: List[str] = []
+
+    def __call__(self, contributions: Iterable[Contribution]):
+        for c in contributions:
+            self.ranked.append(c.title)
+            yield c, AbstractLLMResponse(
+                summary=c.title,
+                experiment="",
+                keywords=[],
+                interest="low",
+                explanation="",
+                confidence=0.5,
+                unknown_terms=[],
+            )
+
+
+def test_first_update_ranks_everything(event_data):
+    ranker = _Ranker()
+    watcher = IndicoWatcher("https://indico.cern.ch/event/1330797", None, ranker)
+
+    changes = watcher.update(event_data["contributions"])
+
+    assert changes.new == 179
+    assert len(ranker.ranked) == 179
+    assert len(watcher.rankings) == 179
+    assert watcher.rankings[0][0].id == "198"
+
+
+def test_update_only_ranks_changes(event_data):
+    ranker = _Ranker()
+    watcher = IndicoWatcher("https://indico.cern.ch/event/1330797", None, ranker)
+    watcher.update(event_data["contributions"])
+    ranker.ranked.clear()
+
+    contributions = copy.deepcopy(event_data["contributions"])
+    contributions[1]["description"] = "A completely new abstract"
+    contributions[2]["roomFullname"] = "The broom closet"
+    removed = contributions.pop(3)
+    contributions.append(dict(contributions[5], id="new-one", title="Brand new"))
+
+    changes = watcher.update(contributions)
+
+    assert changes.new == 1
+    assert changes.changed == 1
+    assert changes.updated == 1
+    assert changes.removed == 1
+    assert sorted(ranker.ranked) == sorted(["Brand new", contributions[1]["title"]])
+
+    rankings = watcher.rankings
+    assert len(rankings) == 179
+    assert rankings[2][0].roomFullname == "The broom closet"
+    assert all(
+        c.title != removed["title"] or c.id != removed["id"] for c, _ in rankings
+    )
+    assert rankings[-1][0].title == "Brand new"
+
+
+def test_watch_rewrites_only_on_change(event_data, tmp_path):
+    ranker = _Ranker()
+    watcher = IndicoWatcher("https://indico.cern.ch/event/1330797", None, ranker)
+    export = tmp_path / "export.json"
+    export.write_text("{}")
+
+    with (
+        patch("abstract_ranker.watch.load_indico_json") as mock_load,
+        patch("abstract_ranker.watch.fetch_indico_export") as mock_fetch,
+        patch("abstract_ranker.output.dump_rankings") as mock_dump,
+    ):
+        mock_load.return_value = event_data
+        mock_fetch.return_value = export
+
+        watch_indico(watcher, lambda info: tmp_path / "out.csv", timedelta(0), 3)
+
+        # An unchanged export isn't even parsed
+        assert mock_fetch.call_count == 3
+        assert mock_load.call_count == 1
+        assert mock_dump.call_count == 1
+        assert len(ranker.ranked) == 179
+
+
+def test_update_ranker_copies_contributions(event_data):
+    "The ranking pipeline may hand back copies of the contributions"
+
+    def ranker(contributions: Iterable[Contribution]):
+        for c, answer in _Ranker()(contributions):
+            yield c.model_copy(), answer
+
+    watcher = IndicoWatcher("https://indico.cern.ch/event/1330797", None, ranker)
+    changes = watcher.update(event_data["contributions"])
+
+    assert changes.new == 179
+    assert len(watcher.rankings) == 179
+
+
+def test_watch_refresh_first_poll(event_data, tmp_path):
+    "--ignore-cache downloads the event again once, then polls re-validate"
+    watcher = IndicoWatcher(
+        "https://indico.cern.ch/event/1330797", None, _Ranker(), refresh=True
+    )
+    export = tmp_path / "export.json"
+    export.write_text("{}")
+
+    with (
+        patch("abstract_ranker.watch.load_indico_json") as mock_load,
+        patch("abstract_ranker.watch.fetch_indico_export") as mock_fetch,
+        patch("abstract_ranker.output.dump_rankings"),
+    ):
+        mock_load.return_value = event_data
+        mock_fetch.return_value = export
+
+        watch_indico(watcher, lambda info: tmp_path / "out.csv", timedelta(0), 2)
+
+        assert [c.args[2] for c in mock_fetch.call_args_list] == [True, False]
+
+
+def test_watch_survives_network_errors(event_data, tmp_path):
+    "A poll that can't reach indico is tried again on the next cycle"
+    ranker = _Ranker()
+    watcher = IndicoWatcher("https://indico.cern.ch/event/1330797", None, ranker)
+    export = tmp_path / "export.json"
+    export.write_text("{}")
+
+    with (
+        patch("abstract_ranker.watch.load_indico_json") as mock_load,
+        patch("abstract_ranker.watch.fetch_indico_export") as mock_fetch,
+        patch("abstract_ranker.output.dump_rankings") as mock_dump,
+    ):
+        mock_load.return_value = event_data
+        mock_fetch.side_effect = [requests.ConnectionError("down"), export]
+
+        watch_indico(watcher, lambda info: tmp_path / "out.csv", timedelta(0), 2)
+
+        assert mock_fetch.call_count == 2
+        assert mock_dump.call_count == 1
+        assert len(ranker.ranked) == 179